@@ -0,0 +1,330 @@
+import math
+import logging
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "ivf_sq8", "hnsw", "sq8", "fp16")
+# Types whose distances are computed on compressed codes, and so benefit from exact re-ranking
+LOSSY_TYPES = ("ivf_pq", "ivf_sq8", "sq8", "fp16")
+
+# Below this many vectors brute force is fast enough and exact
+FLAT_MAX_VECTORS = 50_000
+HNSW_M = 32
+# Vectors used to train IVF centroids / quantizers
+TRAIN_SAMPLE_PER_LIST = 64
+# Training needs at least this many vectors per IVF list, and one per PQ code (8-bit codes)
+MIN_TRAIN_PER_LIST = 39
+MIN_PQ_TRAIN = 256
+# Untrained type built instead of an IVF type when there are too few vectors to train it
+UNTRAINED_FALLBACK = {"ivf_flat": "flat", "ivf_sq8": "sq8", "ivf_pq": "sq8"}
+MAX_TRAIN_SAMPLE = 256_000
+# Candidates fetched per requested result when re-ranking with exact distances
+RERANK_FACTOR = 4
+# Query rows re-ranked at once, bounding the gathered candidate vectors
+RERANK_BLOCK_ROWS = 256
+# Distance FAISS reports for a missing hit
+MISSING_DISTANCE = np.finfo(np.float32).max
+# Filters matching at most this many vectors are searched exactly over their stored originals
+EXACT_FILTER_MAX_IDS = 20_000
+
+
+def ivf_nlist(n_vectors: int) -> int:
+    """Number of IVF lists, ~4*sqrt(N), clamped so every list gets enough training points."""
+    nlist = min(65536, max(16, int(4 * math.sqrt(n_vectors))))
+    return max(1, min(nlist, n_vectors // 39))
+
+
+def pq_subquantizers(dim: int) -> int:
+    """Largest divisor of dim giving sub-vectors of at least 8 dimensions, capped at 96 bytes per code."""
+    for m in range(min(96, dim // 8), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def estimated_bytes(index_type: str, n_vectors: int, dim: int) -> int:
+    """Rough resident size of an index, used by select_index_type."""
+    ids = 8 * n_vectors
+    if index_type in ("flat", "ivf_flat"):
+        return 4 * dim * n_vectors + ids
+    if index_type == "hnsw":
+        return (4 * dim + 2 * HNSW_M * 4) * n_vectors + ids
+    if index_type == "fp16":
+        return 2 * dim * n_vectors + ids
+    if index_type in ("sq8", "ivf_sq8"):
+        return dim * n_vectors + ids
+    if index_type == "ivf_pq":
+        return pq_subquantizers(dim) * n_vectors + ids
+    raise ValueError(f"Unknown index type: {index_type}")
+
+
+def select_index_type(n_vectors: int, dim: int, memory_budget_bytes: int = None) -> str:
+    """
+    Pick an index type for the corpus size and memory budget.
+
+    Small corpora stay exact (flat), larger ones use IVF. Within the budget
+    the most accurate candidate wins; quantized variants are used only when
+    needed, and their ranking loss is recovered by re-ranking against the
+    float32 originals when a VectorStore is kept next to the index. HNSW is
+    never picked automatically: it cannot delete vectors in place, so every
+    changed PDF would force a full graph rebuild.
+    """
+    if n_vectors <= FLAT_MAX_VECTORS:
+        candidates = ["flat", "fp16", "sq8"]
+    else:
+        candidates = ["ivf_flat", "ivf_sq8", "ivf_pq"]
+
+    if memory_budget_bytes:
+        for index_type in candidates:
+            if estimated_bytes(index_type, n_vectors, dim) <= memory_budget_bytes:
+                return index_type
+        return "ivf_pq"
+    return candidates[0]
+
+
+def trainable_type(index_type: str, n_vectors: int) -> str:
+    """index_type, or its untrained fallback when n_vectors are too few to train it."""
+    if index_type not in UNTRAINED_FALLBACK:
+        return index_type
+    min_train = MIN_TRAIN_PER_LIST * ivf_nlist(n_vectors)
+    if index_type == "ivf_pq":
+        min_train = max(min_train, MIN_PQ_TRAIN)
+    if n_vectors >= min_train:
+        return index_type
+    fallback = UNTRAINED_FALLBACK[index_type]
+    logger.warning(f"{n_vectors} vectors are too few to train {index_type} (needs {min_train}), using {fallback}")
+    return fallback
+
+
+def factory_string(index_type: str, n_vectors: int, dim: int) -> str:
+    nlist = ivf_nlist(n_vectors)
+    return {
+        "flat": "Flat",
+        "ivf_flat": f"IVF{nlist},Flat",
+        "ivf_pq": f"IVF{nlist},PQ{pq_subquantizers(dim)}x8",
+        "ivf_sq8": f"IVF{nlist},SQ8",
+        "hnsw": f"HNSW{HNSW_M},Flat",
+        "sq8": "SQ8",
+        "fp16": "SQfp16",
+    }[index_type]
+
+
+def index_type_of(index) -> str:
+    """Inverse of factory_string for an id-mapped index built by build_index."""
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else faiss.downcast_index(index)
+    if isinstance(inner, faiss.IndexFlat):
+        return "flat"
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(inner, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(inner, faiss.IndexIVFScalarQuantizer):
+        return "ivf_sq8"
+    if isinstance(inner, faiss.IndexIVFFlat):
+        return "ivf_flat"
+    if isinstance(inner, faiss.IndexScalarQuantizer):
+        return "fp16" if inner.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    return type(inner).__name__
+
+
+def train_sample(vectors: np.ndarray, n_lists: int, seed: int = 0) -> np.ndarray:
+    size = min(len(vectors), MAX_TRAIN_SAMPLE, max(n_lists * TRAIN_SAMPLE_PER_LIST, 10_000))
+    if size == len(vectors):
+        return vectors
+    rng = np.random.default_rng(seed)
+    return vectors[np.sort(rng.choice(len(vectors), size, replace=False))]
+
+
+def build_index(index_type: str, vectors: np.ndarray, ids: np.ndarray):
+    """
+    Build an id-mapped index of the given type, training it on a sample of the vectors.
+
+    An IVF type with too few vectors to train is built as its untrained
+    fallback instead (see trainable_type).
+    """
+    n_vectors, dim = vectors.shape
+    index_type = trainable_type(index_type, n_vectors)
+    description = factory_string(index_type, n_vectors, dim)
+    index = faiss.IndexIDMap(faiss.index_factory(dim, description))
+    if not index.is_trained:
+        sample = train_sample(vectors, ivf_nlist(n_vectors))
+        logger.info(f"Training {description} on {len(sample)} vectors")
+        index.train(sample)
+    index.add_with_ids(vectors, ids)
+    return index
+
+
+def extract_vectors(index):
+    """Return (vectors, ids) stored in an id-mapped index, reconstructing quantized codes where needed."""
+    inner = faiss.downcast_index(index.index)
+    ivf = faiss.try_extract_index_ivf(inner)
+    if ivf is not None:
+        ivf.make_direct_map()
+    vectors = inner.reconstruct_n(0, inner.ntotal) if inner.ntotal else np.zeros((0, index.d), dtype=np.float32)
+    if ivf is not None:
+        ivf.set_direct_map_type(faiss.DirectMap.NoMap)
+    return vectors, faiss.vector_to_array(index.id_map)
+
+
+def source_vectors(index, vector_store=None):
+    """
+    Return (vectors, ids) to rebuild an index from.
+
+    The float32 originals in vector_store are used when it holds every vector of
+    the index, so rebuilding a quantized index does not compound its error;
+    otherwise the vectors are reconstructed from the index itself.
+    """
+    if vector_store is not None and len(vector_store) >= index.ntotal:
+        ids = faiss.vector_to_array(index.id_map)
+        vectors, found = vector_store.get(ids)
+        if found.all():
+            return vectors, ids
+    return extract_vectors(index)
+
+
+def rebuild_index(index, index_type: str, vector_store=None):
+    """Rebuild an index as another type from the vectors it holds (or their originals in vector_store)."""
+    vectors, ids = source_vectors(index, vector_store)
+    logger.info(f"Rebuilding {index_type_of(index)} index with {len(ids)} vectors as {index_type}")
+    return build_index(index_type, vectors, ids)
+
+
+def maybe_rebuild(index, index_type: str = "auto", memory_budget_bytes: int = None, vector_store=None):
+    """Rebuild the index when the configured (or, in auto mode, selected) type differs from its current type."""
+    if index is None or index.ntotal == 0:
+        return index
+    if index_type == "auto":
+        index_type = select_index_type(index.ntotal, index.d, memory_budget_bytes)
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type}, expected 'auto' or one of {INDEX_TYPES}")
+    index_type = trainable_type(index_type, index.ntotal)
+    if index_type_of(index) == index_type:
+        return index
+    return rebuild_index(index, index_type, vector_store)
+
+
+def remove_ids(index, vector_ids, vector_store=None):
+    """
+    Remove vectors by id. Returns (index, number removed).
+
+    HNSW graphs do not support removal, so those are rebuilt from the remaining vectors.
+    """
+    selector = np.asarray(vector_ids, dtype="int64")
+    try:
+        return index, index.remove_ids(selector)
+    except RuntimeError:
+        vectors, ids = source_vectors(index, vector_store)
+        keep = ~np.isin(ids, selector)
+        logger.info(f"{index_type_of(index)} does not support removal, rebuilding without {int((~keep).sum())} vectors")
+        if keep.any():
+            rebuilt = build_index(index_type_of(index), vectors[keep], ids[keep])
+        else:
+            rebuilt = faiss.IndexIDMap(faiss.index_factory(index.d, factory_string(index_type_of(index), 0, index.d)))
+        return rebuilt, int((~keep).sum())
+
+
+def search_parameters(index, nprobe: int = None, ef_search: int = None, selector=None):
+    """
+    Per-query search parameters, so concurrent queries can use different settings on a shared index.
+
+    selector (a faiss.IDSelector over vector ids) restricts the search to those
+    ids; the caller must keep it alive until the search returns.
+    """
+    index_type = index_type_of(index)
+    options = {"sel": selector} if selector is not None else {}
+    if index_type.startswith("ivf") and nprobe:
+        return faiss.SearchParametersIVF(nprobe=nprobe, **options)
+    if index_type == "hnsw" and ef_search:
+        return faiss.SearchParametersHNSW(efSearch=ef_search, **options)
+    return faiss.SearchParameters(**options) if options else None
+
+
+def id_selector(vector_ids):
+    """A selector admitting the given vector ids, for search_parameters."""
+    return faiss.IDSelectorBatch(np.ascontiguousarray(vector_ids, dtype="int64"))
+
+
+def rerank(query_matrix: np.ndarray, distances: np.ndarray, vector_ids: np.ndarray, vector_store, top_k: int):
+    """
+    Re-rank candidate hits by their exact L2 distance to the float32 originals in vector_store.
+
+    distances and vector_ids are (n_queries, n_candidates) arrays from an index
+    search. Candidates the store does not hold keep their approximate distance.
+    Returns the best top_k (distances, vector_ids) per query.
+    """
+    exact = distances.copy()
+    for start in range(0, len(query_matrix), RERANK_BLOCK_ROWS):
+        block = slice(start, start + RERANK_BLOCK_ROWS)
+        rows, columns = np.nonzero(vector_ids[block] >= 0)
+        if not len(rows):
+            continue
+        vectors, found = vector_store.get(vector_ids[block][rows, columns])
+        squared = np.einsum("ij,ij->i", vectors - query_matrix[block][rows], vectors - query_matrix[block][rows])
+        exact[block][rows[found], columns[found]] = squared[found]
+    exact[vector_ids < 0] = MISSING_DISTANCE
+    order = np.argsort(exact, axis=1, kind="stable")[:, :top_k]
+    return np.take_along_axis(exact, order, axis=1), np.take_along_axis(vector_ids, order, axis=1)
+
+
+def exact_search(query_matrix: np.ndarray, vector_ids, vector_store, top_k: int):
+    """Brute-force top_k over the originals of vector_ids; ids the store does not hold are skipped."""
+    vectors, found = vector_store.get(vector_ids)
+    vector_ids = np.asarray(vector_ids, dtype="int64")[found]
+    vectors = vectors[found]
+    distances = np.full((len(query_matrix), top_k), MISSING_DISTANCE, dtype=np.float32)
+    labels = np.full((len(query_matrix), top_k), -1, dtype="int64")
+    if len(vector_ids):
+        found_distances, positions = faiss.knn(query_matrix, vectors, min(top_k, len(vector_ids)))
+        distances[:, :positions.shape[1]] = found_distances
+        labels[:, :positions.shape[1]] = vector_ids[positions]
+    return distances, labels
+
+
+def search(index, query_matrix: np.ndarray, top_k: int, params=None, vector_store=None, rerank_factor: int = RERANK_FACTOR,
+           allowed_ids=None):
+    """
+    Search the index, re-ranking with exact distances when it is quantized and vector_store is given.
+
+    A quantized index is asked for rerank_factor * top_k candidates, which are
+    re-scored against their originals; distances are squared L2 either way.
+
+    allowed_ids are the vector ids a metadata filter admits. When there are few
+    of them and vector_store covers the index, they are scored exactly from
+    their originals, which a graph or IVF search restricted to a small id set
+    would mostly miss; otherwise params should carry an id_selector for them.
+    """
+    if (allowed_ids is not None and vector_store is not None and len(allowed_ids) <= EXACT_FILTER_MAX_IDS
+            and len(vector_store) >= index.ntotal):
+        return exact_search(query_matrix, allowed_ids, vector_store, top_k)
+    if vector_store is None or not len(vector_store) or rerank_factor <= 1 or index_type_of(index) not in LOSSY_TYPES:
+        return index.search(query_matrix, top_k, params=params)
+    distances, vector_ids = index.search(query_matrix, top_k * rerank_factor, params=params)
+    return rerank(query_matrix, distances, vector_ids, vector_store, top_k)
+
+
+def mmr(query_vector: np.ndarray, vectors: np.ndarray, top_k: int, lambda_mult: float = 0.5):
+    """
+    Positions of the top_k rows of vectors picked by maximal marginal relevance.
+
+    Each step picks the row maximizing lambda_mult * sim(query, row) -
+    (1 - lambda_mult) * max sim(row, picked), with cosine similarity, so
+    near-duplicates of chunks already picked are pushed down.
+    """
+    if not len(vectors):
+        return []
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    unit = vectors / np.where(norms > 0, norms, 1)
+    query = np.asarray(query_vector, dtype=np.float32).ravel()
+    relevance = unit @ (query / (np.linalg.norm(query) or 1))
+    redundancy = np.zeros(len(vectors), dtype=np.float32)
+    picked = []
+    for _ in range(min(top_k, len(vectors))):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[picked] = -np.inf
+        best = int(np.argmax(scores))
+        picked.append(best)
+        redundancy = np.maximum(redundancy, unit @ unit[best])
+    return picked
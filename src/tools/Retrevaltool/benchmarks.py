@@ -0,0 +1,532 @@
+"""
+Offline benchmarks for the retrieval tool.
+
+Everything here runs against local fakes, so no API key or network is needed:
+
+    python benchmarks.py embedding --chunks 2000 --latency 0.2 --concurrency 8
+    python benchmarks.py parsing --small 40 --large 4
+    python benchmarks.py ann --vectors 200000 --dim 256
+    python benchmarks.py quantization --vectors 200000 --dim 768
+    python benchmarks.py shards --vectors 500000 --shards 1 2 4 8
+    python benchmarks.py lexical --chunks 100000
+    python benchmarks.py load --queries 2000 --concurrency 200
+    python benchmarks.py local-embedding --quantize "" int8   (needs torch and the model files)
+"""
+import os
+import time
+import asyncio
+import random
+import hashlib
+import argparse
+import tempfile
+import threading
+from multiprocessing import Pool, cpu_count
+
+import numpy as np
+
+
+class RateLimitError(Exception):
+    """Stand-in for openai.RateLimitError, recognized by embedding_pipeline.is_rate_limit_error."""
+
+
+class FakeEmbeddingFunction:
+    """
+    Deterministic embed_documents replacement with injected latency.
+
+    Each call sleeps latency + per_item_latency * len(texts). When max_concurrency
+    is set, calls beyond that many in flight fail with a RateLimitError, which
+    mimics a provider enforcing a concurrent-request limit.
+    """
+
+    def __init__(self, dim: int = 1536, latency: float = 0.2, per_item_latency: float = 0.0005, max_concurrency: int = None):
+        self.dim = dim
+        self.latency = latency
+        self.per_item_latency = per_item_latency
+        self.max_concurrency = max_concurrency
+        self.calls = 0
+        self.rejected = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def vector(self, text: str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        return np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.calls += 1
+            if self.max_concurrency and self._in_flight >= self.max_concurrency:
+                self.rejected += 1
+                raise RateLimitError("429 Too Many Requests")
+            self._in_flight += 1
+        try:
+            time.sleep(self.latency + self.per_item_latency * len(texts))
+            return [self.vector(text) for text in texts]
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    async def aembed_query(self, text):
+        await asyncio.sleep(self.latency)
+        return self.vector(text)
+
+    __call__ = embed_documents
+
+
+class FakeMessage:
+    def __init__(self, content: str):
+        self.content = content
+
+
+class FakeChatChain:
+    """Stand-in for the citation chain (prompt | ChatOpenAI) answering after a fixed latency."""
+
+    def __init__(self, latency: float = 1.0):
+        self.latency = latency
+
+    def invoke(self, inputs):
+        time.sleep(self.latency)
+        return FakeMessage(f"Answer to {inputs['query']}")
+
+    async def ainvoke(self, inputs):
+        await asyncio.sleep(self.latency)
+        return FakeMessage(f"Answer to {inputs['query']}")
+
+
+def synthetic_chunks(num_chunks: int, words_per_chunk: int = 150, seed: int = 0):
+    rng = random.Random(seed)
+    vocabulary = [f"term{i}" for i in range(5000)]
+    return [" ".join(rng.choices(vocabulary, k=words_per_chunk)) for _ in range(num_chunks)]
+
+
+def benchmark_embedding(num_chunks: int = 2000, latency: float = 0.2, concurrency: int = 8, provider_limit: int = None):
+    """Compare the old sequential BATCH_SIZE=20 loop with the concurrent token-packed pipeline."""
+    from embedding_pipeline import EmbeddingPipeline
+
+    chunks = synthetic_chunks(num_chunks)
+
+    fake = FakeEmbeddingFunction(latency=latency)
+    start = time.perf_counter()
+    for i in range(0, len(chunks), 20):
+        fake.embed_documents(chunks[i:i + 20])
+    sequential = time.perf_counter() - start
+    print(f"sequential  BATCH_SIZE=20: {num_chunks / sequential:8.1f} chunks/sec ({fake.calls} requests)")
+
+    fake = FakeEmbeddingFunction(latency=latency, max_concurrency=provider_limit)
+    pipeline = EmbeddingPipeline(fake, max_in_flight=concurrency, base_delay=latency)
+    received = sum(len(payloads) for payloads, _ in pipeline.run((chunk, i) for i, chunk in enumerate(chunks)))
+    assert received == num_chunks
+    print(f"pipeline    in_flight={concurrency}: {pipeline.chunks_per_sec:8.1f} chunks/sec "
+          f"({pipeline.batches} batches, {fake.rejected} rate-limited requests)")
+
+
+def write_synthetic_pdf(path: str, num_pages: int, heavy_pages=(), seed: int = 0):
+    """Write a text PDF; heavy pages carry ~10x more text than normal ones."""
+    import fitz
+
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for page_num in range(num_pages):
+        page = doc.new_page()
+        lines = 600 if page_num in heavy_pages else 60
+        text = "\n".join(" ".join(f"word{rng.randrange(5000)}" for _ in range(12)) for _ in range(lines))
+        page.insert_textbox(page.rect + (36, 36, -36, -36), text, fontsize=1 if page_num in heavy_pages else 6)
+    doc.save(path)
+    doc.close()
+
+
+def synthetic_corpus(directory: str, num_small: int, num_large: int, large_pages: int = 150):
+    """Many 2-page PDFs plus a few large ones whose first pages are much heavier than the rest."""
+    files = []
+    for i in range(num_small):
+        files.append(os.path.join(directory, f"small_{i}.pdf"))
+        write_synthetic_pdf(files[-1], 2, seed=i)
+    for i in range(num_large):
+        files.append(os.path.join(directory, f"large_{i}.pdf"))
+        write_synthetic_pdf(files[-1], large_pages, heavy_pages=range(10), seed=1000 + i)
+    return files
+
+
+def _legacy_load_and_process_pdf(file_path):
+    """The previous dataprocessing.load_and_process_pdf: a fresh Pool and fixed page ranges per PDF."""
+    import fitz
+    from dataprocessing import process_pages
+
+    with fitz.open(file_path) as doc:
+        total_pages = len(doc)
+    num_workers = cpu_count()
+    pages_per_worker = total_pages // num_workers if total_pages >= num_workers else 1
+    page_ranges = [range(i, min(i + pages_per_worker, total_pages)) for i in range(0, total_pages, pages_per_worker)]
+    with Pool(processes=num_workers) as pool:
+        return pool.map(process_pages, [(file_path, list(page_range)) for page_range in page_ranges])
+
+
+def benchmark_parsing(num_small: int = 40, num_large: int = 4):
+    """Pages/sec of the per-PDF pool against the shared pool with page-batch scheduling."""
+    import fitz
+    from dataprocessing import close_worker_pool, stream_pdf_chunks
+
+    with tempfile.TemporaryDirectory() as directory:
+        files = synthetic_corpus(directory, num_small, num_large)
+        total_pages = sum(len(fitz.open(f)) for f in files)
+        print(f"corpus: {num_small} small + {num_large} large PDFs, {total_pages} pages, {cpu_count()} workers")
+
+        start = time.perf_counter()
+        for file_path in files:
+            _legacy_load_and_process_pdf(file_path)
+        legacy = time.perf_counter() - start
+        print(f"per-PDF pool, fixed ranges: {total_pages / legacy:8.1f} pages/sec")
+
+        start = time.perf_counter()
+        for _ in stream_pdf_chunks(files):
+            pass
+        shared = time.perf_counter() - start
+        print(f"shared pool, page batches:  {total_pages / shared:8.1f} pages/sec")
+        close_worker_pool()
+
+
+def synthetic_vectors(num_vectors: int, dim: int, num_clusters: int = 256, seed: int = 0):
+    """Clustered float32 vectors, closer to real embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((num_clusters, dim)).astype(np.float32)
+    labels = rng.integers(num_clusters, size=num_vectors)
+    return centers[labels] + 0.5 * rng.standard_normal((num_vectors, dim)).astype(np.float32)
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    return float(np.mean([len(set(f[:k]) & set(t)) / k for f, t in zip(found, truth)]))
+
+
+def benchmark_ann(num_vectors: int = 100_000, dim: int = 128, num_queries: int = 1000, k: int = 10):
+    """Recall@k and latency of each ann_index type against the flat baseline."""
+    import faiss
+    from ann_index import build_index, estimated_bytes, search_parameters
+
+    vectors = synthetic_vectors(num_vectors + num_queries, dim)
+    queries, vectors = vectors[:num_queries], vectors[num_queries:]
+    ids = np.arange(num_vectors, dtype="int64")
+
+    def timed_search(index, params=None):
+        start = time.perf_counter()
+        _, found = index.search(queries, k, params=params)
+        return found, (time.perf_counter() - start) * 1000 / num_queries
+
+    flat = build_index("flat", vectors, ids)
+    truth, flat_ms = timed_search(flat)
+    print(f"{num_vectors} vectors x {dim} dims, {num_queries} queries, {faiss.omp_get_max_threads()} threads")
+    print(f"{'index':10} {'setting':14} {'recall@' + str(k):>10} {'ms/query':>9} {'MB':>8}")
+    print(f"{'flat':10} {'':14} {1.0:10.3f} {flat_ms:9.3f} {estimated_bytes('flat', num_vectors, dim) / 2**20:8.1f}")
+
+    sweeps = {
+        "sq8": [{}],
+        "ivf_flat": [{"nprobe": n} for n in (1, 8, 32)],
+        "ivf_sq8": [{"nprobe": n} for n in (8, 32)],
+        "ivf_pq": [{"nprobe": n} for n in (8, 32)],
+        "hnsw": [{"ef_search": ef} for ef in (16, 64, 128)],
+    }
+    for index_type, settings in sweeps.items():
+        start = time.perf_counter()
+        index = build_index(index_type, vectors, ids)
+        build_s = time.perf_counter() - start
+        size_mb = estimated_bytes(index_type, num_vectors, dim) / 2**20
+        for setting in settings:
+            found, ms = timed_search(index, search_parameters(index, **setting))
+            label = ",".join(f"{key}={value}" for key, value in setting.items()) or f"build {build_s:.1f}s"
+            print(f"{index_type:10} {label:14} {recall_at_k(found, truth):10.3f} {ms:9.3f} {size_mb:8.1f}")
+
+
+def benchmark_quantization(num_vectors: int = 100_000, dim: int = 256, num_queries: int = 1000, k: int = 10,
+                           rerank_factor: int = 4):
+    """
+    Resident size and recall@k of quantized indexes, with and without exact re-ranking.
+
+    Re-ranking reads the float32 originals from a memory-mapped VectorStore, so
+    they cost disk space but not resident memory.
+    """
+    import faiss
+    from ann_index import build_index, search, search_parameters
+    from vector_store import VectorStore
+
+    vectors = synthetic_vectors(num_vectors + num_queries, dim)
+    queries, vectors = vectors[:num_queries], vectors[num_queries:]
+    ids = np.arange(num_vectors, dtype="int64")
+
+    with tempfile.TemporaryDirectory() as directory:
+        vector_store = VectorStore(os.path.join(directory, "vectors"))
+        vector_store.add(ids, vectors)
+        vector_store.commit()
+        vector_store = VectorStore.open(vector_store.store_path)
+
+        def measure(index, params, store):
+            start = time.perf_counter()
+            _, found = search(index, queries, k, params, store, rerank_factor)
+            return found, (time.perf_counter() - start) * 1000 / num_queries
+
+        flat = build_index("flat", vectors, ids)
+        flat_mb = len(faiss.serialize_index(flat)) / 2**20
+        truth, flat_ms = measure(flat, None, None)
+        print(f"{num_vectors} vectors x {dim} dims, {num_queries} queries, re-ranking {rerank_factor * k} candidates")
+        print(f"{'index':10} {'MB':>8} {'vs flat':>8} {'recall@' + str(k):>10} {'ms/query':>9} {'reranked':>10} {'ms/query':>9}")
+        print(f"{'flat':10} {flat_mb:8.1f} {1.0:7.1f}x {1.0:10.3f} {flat_ms:9.3f}")
+
+        for index_type in ("fp16", "sq8", "ivf_sq8", "ivf_pq"):
+            index = build_index(index_type, vectors, ids)
+            params = search_parameters(index, nprobe=32)
+            size_mb = len(faiss.serialize_index(index)) / 2**20
+            found, ms = measure(index, params, None)
+            reranked, reranked_ms = measure(index, params, vector_store)
+            print(f"{index_type:10} {size_mb:8.1f} {flat_mb / size_mb:7.1f}x {recall_at_k(found, truth):10.3f} {ms:9.3f}"
+                  f" {recall_at_k(reranked, truth):10.3f} {reranked_ms:9.3f}")
+        vector_store.close()
+
+
+def benchmark_shards(num_vectors: int = 200_000, dim: int = 256, shard_counts=(1, 2, 4, 8), num_queries: int = 200,
+                     k: int = 10, index_type: str = "flat"):
+    """Single-query latency and recall@k of a corpus split over N shards searched in parallel."""
+    from concurrent.futures import ThreadPoolExecutor
+    from ann_index import build_index
+    from sharded_index import ShardedIndex
+
+    vectors = synthetic_vectors(num_vectors + num_queries, dim)
+    queries, vectors = vectors[:num_queries], vectors[num_queries:]
+    ids = np.arange(num_vectors, dtype="int64")
+    truth = None
+    print(f"{num_vectors} vectors x {dim} dims, {index_type}, {num_queries} single queries, {cpu_count()} cores")
+    print(f"{'shards':>6} {'build s':>8} {'recall@' + str(k):>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for num_shards in shard_counts:
+        start = time.perf_counter()
+        shards = [(build_index(index_type, vectors[ids % num_shards == shard], ids[ids % num_shards == shard]), None)
+                  for shard in range(num_shards)]
+        build_s = time.perf_counter() - start
+        with ThreadPoolExecutor(max_workers=min(num_shards, cpu_count())) as executor:
+            sharded = ShardedIndex(shards, executor)
+            found, latencies = [], []
+            for query in queries:
+                start = time.perf_counter()
+                found.append(sharded.search(query.reshape(1, -1), k, nprobe=16)[1][0])
+                latencies.append((time.perf_counter() - start) * 1000)
+        found = np.stack(found)
+        truth = found if truth is None else truth
+        print(f"{num_shards:6} {build_s:8.1f} {recall_at_k(found, truth):10.3f} "
+              f"{np.percentile(latencies, 50):8.2f} {np.percentile(latencies, 99):8.2f}")
+
+
+def benchmark_lexical(num_chunks: int = 100_000, num_queries: int = 1000):
+    """Build time, size and per-query latency of the BM25 index for identifier and multi-word queries."""
+    from lexical_index import LexicalIndex
+
+    chunks = synthetic_chunks(num_chunks, words_per_chunk=150)
+    rng = random.Random(1)
+    # Plant part numbers in a few chunks, the lookups dense vectors handle poorly
+    part_numbers = {rng.randrange(num_chunks): f"PN-{i:05d}" for i in range(num_queries)}
+    for vector_id, part_number in part_numbers.items():
+        chunks[vector_id] += f" {part_number}"
+
+    with tempfile.TemporaryDirectory() as directory:
+        lexical_index = LexicalIndex(os.path.join(directory, "lexical_index.bin"))
+        start = time.perf_counter()
+        for vector_id, chunk in enumerate(chunks):
+            lexical_index.add(vector_id, chunk)
+        build_s = time.perf_counter() - start
+        lexical_index.save()
+        size_mb = os.path.getsize(lexical_index.index_path) / 2**20
+        raw_mb = sum(len(chunk) for chunk in chunks) / 2**20
+        print(f"{num_chunks} chunks: built in {build_s:.1f}s, {size_mb:.1f} MB on disk for {raw_mb:.1f} MB of text")
+
+        for label, queries in (
+            ("identifier", list(part_numbers.values())),
+            ("3 words", [" ".join(rng.choices(chunks[rng.randrange(num_chunks)].split(), k=3)) for _ in range(num_queries)]),
+        ):
+            start = time.perf_counter()
+            for query in queries:
+                lexical_index.search(query, 3)
+            ms = (time.perf_counter() - start) * 1000 / len(queries)
+            print(f"{label:10} queries: {ms:.3f} ms/query")
+        found = sum(lexical_index.search(part_number, 1)[0][0] == vector_id for vector_id, part_number in part_numbers.items())
+        print(f"identifier lookups ranked first: {found}/{len(part_numbers)}")
+
+
+def latency_summary(label: str, latencies, elapsed: float) -> None:
+    latencies = np.sort(np.asarray(latencies)) * 1000
+    print(f"{label:24} {len(latencies) / elapsed:8.1f} QPS   p50 {np.percentile(latencies, 50):8.1f} ms"
+          f"   p99 {np.percentile(latencies, 99):8.1f} ms")
+
+
+def benchmark_load(num_queries: int = 2000, concurrency: int = 200, embed_latency: float = 0.05,
+                   llm_latency: float = 0.5, num_chunks: int = 20_000, sync_threads: int = 32):
+    """
+    Concurrent RetrievalTool queries against stubbed embedding and LLM backends.
+
+    The stubs sleep for the configured latencies, standing in for the OpenAI HTTP
+    calls; FAISS search, the document store and the context builder are real.
+    query_index on a pool of sync_threads threads is compared with aquery_index
+    with `concurrency` queries in flight on one event loop.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    # The stubs replace the OpenAI clients, but the modules construct them on import
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    import citation
+    import embedding
+    import retriver
+    from docstore import DocumentStore
+    from lexical_index import LexicalIndex
+
+    fake = FakeEmbeddingFunction(dim=256, latency=0)
+    chunks = synthetic_chunks(num_chunks, words_per_chunk=100)
+
+    with tempfile.TemporaryDirectory() as directory:
+        index_path = os.path.join(directory, "faiss_index.index")
+        doc_store_path = os.path.join(directory, "docstore.sqlite")
+        lexical_index_path = os.path.join(directory, "lexical_index.bin")
+
+        index = embedding.create_index(fake.dim)
+        index.add_with_ids(np.stack(fake.embed_documents(chunks)), np.arange(num_chunks, dtype="int64"))
+        docstore = DocumentStore(doc_store_path)
+        docstore.add((i, f"doc{i // 10}.pdf_page{i % 10 + 1}_{i}", {"text": chunk, "file": f"doc{i // 10}.pdf", "page": i % 10 + 1})
+                     for i, chunk in enumerate(chunks))
+        lexical_index = LexicalIndex(lexical_index_path)
+        for i, chunk in enumerate(chunks):
+            lexical_index.add(i, chunk)
+        lexical_index.save()
+        embedding.save_index(index, docstore, index_path)
+        docstore.close()
+
+        fake.latency = embed_latency
+        embedding.embeddings = retriver.embeddings = fake
+        citation.chain = FakeChatChain(llm_latency)
+        tool = retriver.RetrievalTool(directory, index_path, doc_store_path, os.path.join(directory, "manifest.json"), lexical_index_path)
+        # Unique queries so every one goes through embedding, search and the LLM
+        queries = synthetic_chunks(num_queries, words_per_chunk=6, seed=7)
+        print(f"{num_chunks} chunks, embedding {embed_latency * 1000:.0f} ms, LLM {llm_latency * 1000:.0f} ms per call")
+
+        def timed_query(query):
+            start = time.perf_counter()
+            tool.query_index(query)
+            return time.perf_counter() - start
+
+        half = num_queries // 2
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=sync_threads) as pool:
+            latencies = list(pool.map(timed_query, queries[:half]))
+        latency_summary(f"query_index, {sync_threads} threads", latencies, time.perf_counter() - start)
+
+        async def run_async():
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def timed_aquery(query):
+                async with semaphore:
+                    start = time.perf_counter()
+                    await tool.aquery_index(query)
+                    return time.perf_counter() - start
+
+            return await asyncio.gather(*(timed_aquery(query) for query in queries[half:]))
+
+        start = time.perf_counter()
+        latencies = asyncio.run(run_async())
+        latency_summary(f"aquery_index, {concurrency} tasks", latencies, time.perf_counter() - start)
+        tool.service.close()
+
+
+def benchmark_local_embedding(model_name: str = "sentence-transformers/all-MiniLM-L6-v2", quantize_modes=("", "int8"),
+                              num_queries: int = 200, num_chunks: int = 1000, num_threads: int = None):
+    """Query latency and document throughput of the local CPU embedding backend."""
+    from local_embeddings import LocalEmbeddings
+
+    queries = synthetic_chunks(num_queries, words_per_chunk=12, seed=3)
+    chunks = synthetic_chunks(num_chunks, words_per_chunk=150)
+    for quantize in quantize_modes:
+        model = LocalEmbeddings(model_name, num_threads=num_threads, quantize=quantize)
+        model.embed_query("warm up")
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            model.embed_query(query)
+            latencies.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        model.embed_documents(chunks)
+        chunks_per_sec = num_chunks / (time.perf_counter() - start)
+        latencies = np.asarray(latencies) * 1000
+        print(f"{model.model:48} query p50 {np.percentile(latencies, 50):6.1f} ms  p99 {np.percentile(latencies, 99):6.1f} ms"
+              f"   documents {chunks_per_sec:7.1f} chunks/sec")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    embedding_parser = subparsers.add_parser("embedding", help="concurrent embedding pipeline throughput")
+    embedding_parser.add_argument("--chunks", type=int, default=2000)
+    embedding_parser.add_argument("--latency", type=float, default=0.2, help="seconds per embedding request")
+    embedding_parser.add_argument("--concurrency", type=int, default=8)
+    embedding_parser.add_argument("--provider-limit", type=int, default=None,
+                                  help="reject requests beyond this many in flight with a 429")
+
+    parsing_parser = subparsers.add_parser("parsing", help="PDF parsing throughput on a synthetic corpus")
+    parsing_parser.add_argument("--small", type=int, default=40, help="number of 2-page PDFs")
+    parsing_parser.add_argument("--large", type=int, default=4, help="number of 150-page PDFs with heavy first pages")
+
+    ann_parser = subparsers.add_parser("ann", help="recall@k vs latency of approximate indexes")
+    ann_parser.add_argument("--vectors", type=int, default=100_000)
+    ann_parser.add_argument("--dim", type=int, default=128)
+    ann_parser.add_argument("--queries", type=int, default=1000)
+    ann_parser.add_argument("--k", type=int, default=10)
+
+    quantization_parser = subparsers.add_parser("quantization", help="memory and recall@k of quantized indexes with exact re-ranking")
+    quantization_parser.add_argument("--vectors", type=int, default=100_000)
+    quantization_parser.add_argument("--dim", type=int, default=256)
+    quantization_parser.add_argument("--queries", type=int, default=1000)
+    quantization_parser.add_argument("--k", type=int, default=10)
+    quantization_parser.add_argument("--rerank-factor", type=int, default=4)
+
+    shards_parser = subparsers.add_parser("shards", help="single-query latency of a sharded index with parallel fan-out")
+    shards_parser.add_argument("--vectors", type=int, default=200_000)
+    shards_parser.add_argument("--dim", type=int, default=256)
+    shards_parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    shards_parser.add_argument("--queries", type=int, default=200)
+    shards_parser.add_argument("--index-type", default="flat", help="recall is measured against the first shard count")
+
+    lexical_parser = subparsers.add_parser("lexical", help="BM25 inverted index build time and query latency")
+    lexical_parser.add_argument("--chunks", type=int, default=100_000)
+    lexical_parser.add_argument("--queries", type=int, default=1000)
+
+    load_parser = subparsers.add_parser("load", help="sync vs async RetrievalTool queries with stubbed OpenAI calls")
+    load_parser.add_argument("--queries", type=int, default=2000, help="total queries, split between sync and async runs")
+    load_parser.add_argument("--concurrency", type=int, default=200, help="async queries in flight")
+    load_parser.add_argument("--threads", type=int, default=32, help="threads for the sync run")
+    load_parser.add_argument("--embed-latency", type=float, default=0.05, help="seconds per embedding call")
+    load_parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds per LLM call")
+    load_parser.add_argument("--chunks", type=int, default=20_000)
+
+    local_parser = subparsers.add_parser("local-embedding", help="latency and throughput of the local embedding model")
+    local_parser.add_argument("--model", default="sentence-transformers/all-MiniLM-L6-v2")
+    local_parser.add_argument("--quantize", nargs="+", default=["", "int8"], help='any of "", int8, onnx')
+    local_parser.add_argument("--queries", type=int, default=200)
+    local_parser.add_argument("--chunks", type=int, default=1000)
+    local_parser.add_argument("--threads", type=int, default=None)
+
+    args = parser.parse_args()
+    if args.benchmark == "embedding":
+        benchmark_embedding(args.chunks, args.latency, args.concurrency, args.provider_limit)
+    elif args.benchmark == "parsing":
+        benchmark_parsing(args.small, args.large)
+    elif args.benchmark == "ann":
+        benchmark_ann(args.vectors, args.dim, args.queries, args.k)
+    elif args.benchmark == "quantization":
+        benchmark_quantization(args.vectors, args.dim, args.queries, args.k, args.rerank_factor)
+    elif args.benchmark == "shards":
+        benchmark_shards(args.vectors, args.dim, args.shards, args.queries, index_type=args.index_type)
+    elif args.benchmark == "lexical":
+        benchmark_lexical(args.chunks, args.queries)
+    elif args.benchmark == "load":
+        benchmark_load(args.queries, args.concurrency, args.embed_latency, args.llm_latency, args.chunks, args.threads)
+    elif args.benchmark == "local-embedding":
+        benchmark_local_embedding(args.model, args.quantize, args.queries, args.chunks, args.threads)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,8 @@
 from embedding import load_index, query_embeddings
+from context_builder import build_context
 from langchain.prompts import ChatPromptTemplate, HumanMessagePromptTemplate, SystemMessagePromptTemplate
 from langchain.schema.runnable import RunnableSequence
 from langchain_openai import ChatOpenAI
-from thefuzz import fuzz
-import re
 
 # Define the system prompt
 system_prompt = """
@@ -50,36 +49,6 @@ chat_prompt = ChatPromptTemplate.from_messages([
     )
 ])
 
-def extract_page_number(text):
-    """Extract page number from text using regex."""
-    # Common page number patterns
-    patterns = [
-        r'page[s]?\s*(\d+)',  # matches "page 1" or "pages 1"
-        r'pg\.?\s*(\d+)',     # matches "pg 1" or "pg. 1"
-        r'p\.?\s*(\d+)',      # matches "p 1" or "p. 1"
-        r'\[(\d+)\]',         # matches "[1]"
-        r'\((\d+)\)',         # matches "(1)"
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text.lower())
-        if match:
-            return int(match.group(1))
-    return None
-
-def fuzzy_match_filename(doc_id, file_list):
-    """Find the best matching filename using fuzzy string matching."""
-    best_match = None
-    best_ratio = 0
-    
-    for filename in file_list:
-        ratio = fuzz.ratio(doc_id.lower(), filename.lower())
-        if ratio > best_ratio and ratio > 60:  # threshold of 60%
-            best_ratio = ratio
-            best_match = filename
-    
-    return best_match
-
 llm = ChatOpenAI(
     model="gpt-3.5-turbo",  
     temperature=0.5
@@ -88,40 +57,78 @@ llm = ChatOpenAI(
 # Define the chain
 chain = chat_prompt | llm
 
-# Function to retrieve information with citations
-def retrieve_information_citation(query, results):
-    # Extract document IDs and try to match them to files
-    doc_ids = [result[1] for result in results if result[1]]
-    
-    # Build citation information
+def resolve_citations(blocks):
+    """
+    Citation text and structured sources for the chunks packed into the prompt.
+
+    File, page and character span are read straight from each chunk's metadata,
+    and each chunk is cited the way its block is headed in the prompt.
+    """
+    sources = []
     citations = []
-    for doc_id in doc_ids:
-        # Extract potential page number
-        page_num = extract_page_number(doc_id)
-        
-        # Get filename through fuzzy matching
-        filename = doc_id  # fallback to doc_id if no match
-        if hasattr(results, 'file_list'):
-            matched_file = fuzzy_match_filename(doc_id, results.file_list)
-            if matched_file:
-                filename = matched_file
-        
-        citation = f"{filename}"
-        if page_num:
-            citation += f" (page {page_num})"
-            
-        citations.append(citation)
-    
-    citation_info = "\n".join(citations)
-    
-    response = chain.invoke({
+    for block in blocks:
+        for source in block.sources:
+            citation = f"{source['file']} (page {source['page']})" if source["page"] is not None else source["file"]
+            sources.append(source)
+            if citation not in citations:
+                citations.append(citation)
+    return "\n".join(citations), sources
+
+def build_citation_inputs(query, results):
+    """Chain inputs for a query and its search results, the citation text shown with the answer and the structured sources."""
+    # Deduplicate, merge and pack the results into the prompt's token budget
+    context, blocks = build_context(results)
+    citation_info, sources = resolve_citations(blocks)
+    inputs = {
         "query": query,
-        "results": results,
+        "results": context,
         "citation": citation_info
-    })
+    }
+    return inputs, citation_info, sources
+
+# Function to retrieve information with citations
+def retrieve_information_citation(query, results):
+    inputs, citation_info, sources = build_citation_inputs(query, results)
+    response = chain.invoke(inputs)
     
-    # Return both the response and citations
+    # Return the response, the citations and the file/page/char span of each cited chunk
+    return {
+        "content": response.content,
+        "citations": citation_info,
+        "sources": sources
+    }
+
+async def aretrieve_information_citation(query, results):
+    """Async variant of retrieve_information_citation, using the chat model's async client."""
+    inputs, citation_info, sources = build_citation_inputs(query, results)
+    response = await chain.ainvoke(inputs)
     return {
         "content": response.content,
-        "citations": citation_info
+        "citations": citation_info,
+        "sources": sources
     }
+
+def stream_information_citation(query, results):
+    """
+    Streaming variant of retrieve_information_citation.
+
+    Yields {"type": "token", "content": ...} events as the answer is generated,
+    then one {"type": "final", "content": <full answer>, "citations": ..., "sources": ...} event.
+    """
+    inputs, citation_info, sources = build_citation_inputs(query, results)
+    parts = []
+    for chunk in chain.stream(inputs):
+        if chunk.content:
+            parts.append(chunk.content)
+            yield {"type": "token", "content": chunk.content}
+    yield {"type": "final", "content": "".join(parts), "citations": citation_info, "sources": sources}
+
+async def astream_information_citation(query, results):
+    """Async iterator variant of stream_information_citation."""
+    inputs, citation_info, sources = build_citation_inputs(query, results)
+    parts = []
+    async for chunk in chain.astream(inputs):
+        if chunk.content:
+            parts.append(chunk.content)
+            yield {"type": "token", "content": chunk.content}
+    yield {"type": "final", "content": "".join(parts), "citations": citation_info, "sources": sources}
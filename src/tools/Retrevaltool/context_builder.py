@@ -0,0 +1,156 @@
+import os
+import re
+import logging
+from collections import namedtuple
+from typing import List, Tuple
+
+from embedding_pipeline import load_token_counter
+
+logger = logging.getLogger(__name__)
+
+# Tokens of retrieved text sent to the LLM per query
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", 3000))
+# Encoding of the chat model (gpt-3.5-turbo)
+CONTEXT_ENCODING = os.getenv("CONTEXT_ENCODING", "cl100k_base")
+# Longest overlap looked for between two chunks; CharacterTextSplitter uses chunk_overlap=100
+MAX_CHUNK_OVERLAP = 200
+
+# doc ids are written by embedding.add_embedding_stream as "<file>_page<page>_<vector id>"
+DOC_ID_PATTERN = re.compile(r"^(?P<file>.*)_page(?P<page>\d+)_(?P<vector_id>\d+)$")
+
+# sources holds one citation dict (doc_id, file, page, char_start, char_end) per merged chunk
+ContextBlock = namedtuple("ContextBlock", ["file", "page", "text", "doc_ids", "sources", "rank", "tokens"])
+
+_count_tokens = None
+
+
+def count_tokens(text: str) -> int:
+    global _count_tokens
+    if _count_tokens is None:
+        _count_tokens = load_token_counter(CONTEXT_ENCODING)
+    return _count_tokens(text)
+
+
+def parse_doc_id(doc_id: str) -> Tuple[str, int, int]:
+    """(file, page, vector id) of a doc id; page and vector id are None for ids in another format."""
+    match = DOC_ID_PATTERN.match(doc_id)
+    if match is None:
+        return doc_id, None, None
+    return match.group("file"), int(match.group("page")), int(match.group("vector_id"))
+
+
+def overlap_length(left: str, right: str, max_overlap: int = MAX_CHUNK_OVERLAP) -> int:
+    """Length of the longest suffix of left that is also a prefix of right."""
+    for length in range(min(len(left), len(right), max_overlap), 0, -1):
+        if left.endswith(right[:length]):
+            return length
+    return 0
+
+
+def _merge_page(chunks):
+    """
+    Merge one page's chunks, given as (vector_id, text, source, rank) sorted by vector id.
+
+    Chunks contained in another are dropped; consecutive chunks (the splitter's
+    neighbours) are joined with their shared overlap removed.
+    """
+    merged = []
+    for vector_id, text, source, rank in chunks:
+        if merged:
+            last = merged[-1]
+            if text in last["text"]:
+                last["sources"].append(source)
+                last["rank"] = min(last["rank"], rank)
+                continue
+            if last["text"] in text:
+                last.update(text=text, rank=min(last["rank"], rank), vector_id=vector_id)
+                last["sources"].append(source)
+                continue
+            if vector_id is not None and vector_id == last["vector_id"] + 1:
+                overlap = overlap_length(last["text"], text)
+                separator = "" if overlap else "\n"
+                last.update(text=last["text"] + separator + text[overlap:], rank=min(last["rank"], rank), vector_id=vector_id)
+                last["sources"].append(source)
+                continue
+        merged.append({"text": text, "sources": [source], "rank": rank, "vector_id": vector_id})
+    return merged
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    """Longest prefix of text within max_tokens, cut at a whitespace boundary where possible."""
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    cut = text.rfind(" ", 0, low)
+    return text[:cut if cut > low // 2 else low]
+
+
+def build_context_blocks(results, max_tokens: int = CONTEXT_MAX_TOKENS) -> List[ContextBlock]:
+    """
+    Turn search results into deduplicated, merged blocks that fit a token budget.
+
+    results are (text, doc_id, score) tuples, best first, as returned by the
+    search functions in embedding.py; file and page come from their metadata
+    when they carry it and from the doc id otherwise. Empty results are dropped,
+    overlapping and adjacent chunks of the same page are merged, and blocks are
+    packed best-rank first until max_tokens is reached. Returns the packed
+    blocks in rank order.
+    """
+    pages = {}
+    seen = set()
+    for rank, result in enumerate(results):
+        text, doc_id, _ = result
+        if not text or not text.strip() or doc_id in seen:
+            continue
+        seen.add(doc_id)
+        metadata = getattr(result, "metadata", None)
+        if metadata is not None:
+            file, page, vector_id = metadata["file"], metadata["page"], metadata["vector_id"]
+            char_start, char_end = metadata.get("char_start"), metadata.get("char_end")
+        else:
+            file, page, vector_id = parse_doc_id(doc_id)
+            char_start = char_end = None
+        source = {"doc_id": doc_id, "file": file, "page": page, "char_start": char_start, "char_end": char_end}
+        pages.setdefault((file, page), []).append((vector_id, text.strip(), source, rank))
+
+    blocks = []
+    for (file, page), chunks in pages.items():
+        chunks.sort(key=lambda chunk: (chunk[0] is None, chunk[0] or 0))
+        for block in _merge_page(chunks):
+            doc_ids = [source["doc_id"] for source in block["sources"]]
+            blocks.append(ContextBlock(file, page, block["text"], doc_ids, block["sources"], block["rank"], count_tokens(block["text"])))
+    blocks.sort(key=lambda block: block.rank)
+
+    packed = []
+    remaining = max_tokens
+    for block in blocks:
+        if block.tokens <= remaining:
+            packed.append(block)
+            remaining -= block.tokens
+        elif not packed and remaining > 0:
+            # The best block alone is over budget: keep as much of it as fits
+            text = _truncate(block.text, remaining)
+            packed.append(block._replace(text=text, tokens=count_tokens(text)))
+            remaining -= packed[-1].tokens
+    logger.info(f"Packed {len(packed)} of {len(blocks)} context blocks from {len(results)} results "
+                f"into {max_tokens - remaining} tokens")
+    return packed
+
+
+def format_context(blocks: List[ContextBlock]) -> str:
+    """Render blocks for the prompt, each headed by the source it should be cited as."""
+    sections = []
+    for block in blocks:
+        source = f"{block.file} (page {block.page})" if block.page is not None else block.file
+        sections.append(f"[Source: {source}]\n{block.text}")
+    return "\n\n".join(sections)
+
+
+def build_context(results, max_tokens: int = CONTEXT_MAX_TOKENS) -> Tuple[str, List[ContextBlock]]:
+    """Packed prompt context for results, and the blocks it was built from."""
+    blocks = build_context_blocks(results, max_tokens)
+    return format_context(blocks), blocks
@@ -1,17 +1,102 @@
 import fitz  # PyMuPDF
 import time
+import atexit
+from collections import OrderedDict, deque
 from multiprocessing import Pool, cpu_count
 from langchain.text_splitter import CharacterTextSplitter
 import os
 
 text_splitter = CharacterTextSplitter(chunk_size=1000,chunk_overlap=100)
 
-def process_pages(args):
+# Pages handed to a worker per task; small batches let idle workers pick up
+# the remaining pages of a large PDF instead of waiting on one fixed range
+PAGES_PER_TASK = 4
+
+# Documents each worker keeps open between tasks
+MAX_OPEN_DOCUMENTS = 16
+
+# Per-process cache of open documents, keyed by path and mtime so an edited
+# file is re-opened rather than read from a stale handle
+_open_documents = OrderedDict()
+
+def open_document(file_path):
+    """Return an open fitz document, reusing this process's handle when there is one."""
+    key = (file_path, os.stat(file_path).st_mtime_ns)
+    doc = _open_documents.pop(key, None)
+    if doc is None:
+        doc = fitz.open(file_path)
+    _open_documents[key] = doc
+    while len(_open_documents) > MAX_OPEN_DOCUMENTS:
+        _, stale = _open_documents.popitem(last=False)
+        stale.close()
+    return doc
+
+_worker_pool = None
+_worker_pool_size = None
+
+def get_worker_pool(num_workers=None):
+    """
+    Return the process-wide PDF worker pool, starting it on first use.
+
+    The pool lives for the lifetime of the process so repeated ingestion runs
+    and many small PDFs do not pay pool start-up cost each time.
+    """
+    global _worker_pool, _worker_pool_size
+    num_workers = num_workers or cpu_count()
+    if _worker_pool is not None and _worker_pool_size != num_workers:
+        close_worker_pool()
+    if _worker_pool is None:
+        _worker_pool = Pool(processes=num_workers)
+        _worker_pool_size = num_workers
+    return _worker_pool
+
+@atexit.register
+def close_worker_pool():
+    global _worker_pool
+    if _worker_pool is not None:
+        _worker_pool.terminate()
+        _worker_pool.join()
+        _worker_pool = None
+
+def chunk_offsets(text, chunks):
+    """
+    Character offset of each chunk in the page text, or None where the splitter changed it.
+
+    Chunks come back in page order and overlap, so each is searched from just
+    after the previous chunk's start.
+    """
+    offsets = []
+    position = 0
+    for chunk in chunks:
+        offset = text.find(chunk, position)
+        if offset < 0:
+            offsets.append(None)
+            continue
+        offsets.append(offset)
+        position = offset + 1
+    return offsets
+
+def extract_pages(args):
+    """
+    Classify, extract and chunk a batch of pages in a single visit.
+
+    A page with no extractable text is treated as image-only and returned for a
+    later OCR stage instead of being opened a second time by a separate
+    categorization pass.
+
+    A batch that fails part-way returns no chunks and an error marker instead of
+    being passed off as complete, so the caller can retry the whole file.
+
+    Returns:
+        chunks (list), chunk_metadata (list), image_pages (list of 0-based page numbers),
+        error (None, or the message of the exception that stopped the batch)
+    """
     file_path, text_page = args
     chunks = []
     chunk_metadata = []
+    image_pages = []
     try:
-        doc = fitz.open(file_path)
+        doc = open_document(file_path)
         filename = os.path.basename(file_path)
         for page_num in text_page:
             page = doc.load_page(page_num)
@@ -23,37 +108,81 @@ def process_pages(args):
                 chunk_metadata.extend([{
                     'file': filename,
                     'page': page_num + 1,  # 1-based page numbering
-                    'text': chunk
-                } for chunk in page_chunks])
-        doc.close()
+                    'text': chunk,
+                    'char_start': char_start,
+                    'char_end': char_start + len(chunk) if char_start is not None else None
+                } for chunk, char_start in zip(page_chunks, chunk_offsets(text, page_chunks))])
+            else:
+                image_pages.append(page_num)
     except Exception as e:
         print(f"Error processing pages {text_page} in {file_path}: {e}")
+        # Partial chunks of a failed batch are dropped with it
+        return [], [], [], f"{type(e).__name__}: {e}"
+    return chunks, chunk_metadata, image_pages, None
+
+def process_pages(args):
+    chunks, chunk_metadata, _, _ = extract_pages(args)
     return chunks, chunk_metadata
 
-def load_and_process_pdf(file_path, num_workers=None):
-    doc = fitz.open(file_path)
-    total_pages = len(doc)
-    doc.close()
+def page_tasks(pdf_files, pages_per_task=PAGES_PER_TASK):
+    """Split every PDF into (file_path, page batch) tasks."""
+    for file_path in pdf_files:
+        try:
+            with fitz.open(file_path) as doc:
+                total_pages = len(doc)
+        except Exception as e:
+            print(f"Error opening {file_path}: {e}")
+            continue
+        for i in range(0, total_pages, pages_per_task):
+            yield file_path, list(range(i, min(i + pages_per_task, total_pages)))
+
+def run_page_tasks(worker, tasks, num_workers=None, max_pending=None):
+    """
+    Run (file_path, pages) tasks on the shared pool, yielding (file_path, result) in task order.
+
+    Tasks from all files share one queue, so each worker takes the next page batch
+    as soon as it is free. At most max_pending tasks are in flight, so memory stays
+    constant and a slow consumer applies backpressure.
+    """
+    pool = get_worker_pool(num_workers)
+    if max_pending is None:
+        max_pending = 4 * _worker_pool_size
 
-    #using all available CPUs if num_worker is not specified
-    if num_workers is None:
-        num_workers = cpu_count()
+    def results():
+        pending = deque()
+        for task in tasks:
+            pending.append((task[0], pool.apply_async(worker, (task,))))
+            if len(pending) >= max_pending:
+                file_path, result = pending.popleft()
+                yield file_path, result.get()
+        while pending:
+            file_path, result = pending.popleft()
+            yield file_path, result.get()
 
-    # Divide the text_page into chunks for parallel processing
-    pages_per_worker = total_pages // num_workers if total_pages >= num_workers else 1
-    page_ranges = [
-        range(i, min(i + pages_per_worker, total_pages))  # Create ranges for each worker
-        for i in range(0, total_pages, pages_per_worker)
-    ]
+    return results()
 
+def stream_pdf_chunks(pdf_files, num_workers=None, pages_per_task=PAGES_PER_TASK, max_pending=None):
+    """
+    Parse PDFs on the shared worker pool and yield (file_path, chunks, metadata, image_pages, error) per page batch.
 
+    Results come back in file and page order while the workers keep parsing ahead
+    of the consumer, so parsing overlaps with embedding.
+    """
+    results = run_page_tasks(extract_pages, page_tasks(pdf_files, pages_per_task), num_workers, max_pending)
+    return ((file_path, *result) for file_path, result in results)
+
+def extract_pdf(file_path, num_workers=None):
+    """Chunk the text pages of a PDF and list its image-only pages, in one pass."""
     all_chunks = []
     all_metadata = []
-    with Pool(processes=num_workers) as pool:
-        # Map the processing to each chunk of text_page
-        results = pool.map(process_pages, [(file_path, list(page_range)) for page_range in page_ranges])
-        for chunks, metadata in results:
-            all_chunks.extend(chunks)
-            all_metadata.extend(metadata)
+    all_image_pages = []
+    for _, chunks, metadata, image_pages, _ in stream_pdf_chunks([file_path], num_workers):
+        all_chunks.extend(chunks)
+        all_metadata.extend(metadata)
+        all_image_pages.extend(image_pages)
+
+    return all_chunks, all_metadata, all_image_pages
 
+def load_and_process_pdf(file_path, num_workers=None):
+    all_chunks, all_metadata, _ = extract_pdf(file_path, num_workers)
     return all_chunks, all_metadata
@@ -0,0 +1,273 @@
+import os
+import glob
+import mmap
+import sqlite3
+import logging
+import time
+import threading
+from collections import namedtuple
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SearchFilter(namedtuple("SearchFilter", ["files", "pages", "ingested_after", "ingested_before"])):
+    """
+    Restricts a search to chunks matching every given field; None fields do not filter.
+
+    files are file names as recorded in the chunk metadata, pages an inclusive
+    (first, last) page range, and ingested_after / ingested_before Unix
+    timestamps or datetimes bounding when the chunk was added. Chunks stored
+    before ingestion times were recorded never match a date bound.
+    """
+
+    def __new__(cls, files=None, pages=None, ingested_after=None, ingested_before=None):
+        if isinstance(files, str):
+            files = [files]
+        # Normalized so equal filters have equal keys in the query cache
+        files = tuple(sorted(files)) if files is not None else None
+        pages = tuple(pages) if pages is not None else None
+        ingested_after, ingested_before = (
+            value.timestamp() if hasattr(value, "timestamp") else value for value in (ingested_after, ingested_before)
+        )
+        return super().__new__(cls, files, pages, ingested_after, ingested_before)
+
+
+class DocumentStore:
+    """
+    Chunk metadata and text, addressed by FAISS vector id.
+
+    Metadata lives in a SQLite table (vector id, doc id, file, page, the chunk's
+    character span within its page, when it was ingested and the offset/length
+    of the chunk text) and the text itself in an append-only UTF-8
+    blob that is memory-mapped for reads. Opening the store reads nothing but the
+    SQLite header, and a query fetches only the rows it needs. Deleted chunks
+    leave dead bytes in the blob until compact() is called.
+
+    compact() writes the live text to a new blob generation and switches the
+    offsets and the generation number in one transaction, so other processes
+    or threads reading the same store always pair offsets with the right blob.
+    The replaced blob is left for readers still using it and deleted by the
+    next open or compaction.
+    """
+
+    def __init__(self, store_path: str):
+        self.store_path = store_path
+        self._base = os.path.splitext(store_path)[0]
+        self._lock = threading.RLock()
+        self._mm = None
+
+        os.makedirs(os.path.dirname(store_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(store_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "vector_id INTEGER PRIMARY KEY, doc_id TEXT NOT NULL, file TEXT, page INTEGER, "
+            "text_offset INTEGER NOT NULL, text_length INTEGER NOT NULL, char_start INTEGER, char_end INTEGER, "
+            "ingested_at REAL)"
+        )
+        # Stores written before citation spans and ingestion times were recorded
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(chunks)")}
+        for column, column_type in (("char_start", "INTEGER"), ("char_end", "INTEGER"), ("ingested_at", "REAL")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE chunks ADD COLUMN {column} {column_type}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_file ON chunks(file, page)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_ingested_at ON chunks(ingested_at)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._conn.execute("INSERT OR IGNORE INTO meta VALUES ('generation', 0)")
+        self._conn.commit()
+        self.generation = self._read_generation()
+        self._text_file = open(self.text_path, "a+b")
+        self._remove_generations(before=self.generation)
+
+    @property
+    def text_path(self) -> str:
+        return self._text_path(self.generation)
+
+    def _text_path(self, generation: int) -> str:
+        return f"{self._base}.text" if generation == 0 else f"{self._base}.{generation}.text"
+
+    def _remove_generations(self, before: int) -> None:
+        """Delete the blobs of generations older than before."""
+        for path in glob.glob(f"{glob.escape(self._base)}.*text"):
+            suffix = path[len(self._base) + 1:-len(".text")]
+            generation = 0 if suffix == "" else int(suffix) if suffix.isdigit() else None
+            if generation is not None and generation < before:
+                try:
+                    os.remove(path)
+                except OSError:
+                    # Still open in a reader on a platform that forbids it; retried on the next open or compaction
+                    pass
+
+    def _read_generation(self) -> int:
+        return self._conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()[0]
+
+    def _switch_generation(self, generation: int) -> None:
+        """Point reads and appends at another blob generation."""
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._text_file.close()
+        self.generation = generation
+        self._text_file = open(self.text_path, "a+b")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def max_id(self) -> int:
+        """Largest vector id in the store, or -1 when it is empty."""
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(vector_id), -1) FROM chunks").fetchone()[0]
+
+    def add(self, rows: Iterable[Tuple[int, str, Dict]]) -> None:
+        """Append (vector_id, doc_id, metadata) rows. Call commit() to make them durable."""
+        ingested_at = time.time()
+        with self._lock:
+            offset = self._text_file.tell()
+            records = []
+            for vector_id, doc_id, meta in rows:
+                data = meta["text"].encode("utf-8")
+                self._text_file.write(data)
+                records.append((vector_id, doc_id, meta.get("file"), meta.get("page"), offset, len(data),
+                                meta.get("char_start"), meta.get("char_end"), meta.get("ingested_at", ingested_at)))
+                offset += len(data)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (vector_id, doc_id, file, page, text_offset, text_length, char_start, char_end, "
+                "ingested_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                records,
+            )
+
+    def delete(self, vector_ids: List[int]) -> None:
+        with self._lock:
+            self._conn.executemany("DELETE FROM chunks WHERE vector_id = ?", [(int(v),) for v in vector_ids])
+
+    def commit(self) -> None:
+        with self._lock:
+            self._text_file.flush()
+            os.fsync(self._text_file.fileno())
+            self._conn.commit()
+
+    def _text(self, offset: int, length: int) -> str:
+        if length == 0:
+            return ""
+        if self._mm is None or offset + length > len(self._mm):
+            # The blob grew since it was mapped
+            self._text_file.flush()
+            if self._mm is not None:
+                self._mm.close()
+            # Mapped through the open handle, so a blob deleted after a compaction stays readable
+            self._mm = mmap.mmap(self._text_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mm[offset:offset + length].decode("utf-8")
+
+    def get(self, vector_ids) -> Dict[int, Dict]:
+        """Fetch {vector_id: metadata} for the given ids; unknown ids are left out."""
+        vector_ids = [int(v) for v in vector_ids if v >= 0]
+        if not vector_ids:
+            return {}
+        with self._lock:
+            # Read the generation and the offsets from one snapshot
+            own_transaction = not self._conn.in_transaction
+            if own_transaction:
+                self._conn.execute("BEGIN")
+            try:
+                generation = self._read_generation()
+                placeholders = ",".join("?" * len(vector_ids))
+                rows = self._conn.execute(
+                    f"SELECT vector_id, doc_id, file, page, text_offset, text_length, char_start, char_end, ingested_at "
+                    f"FROM chunks WHERE vector_id IN ({placeholders})",
+                    vector_ids,
+                ).fetchall()
+            finally:
+                if own_transaction:
+                    self._conn.commit()
+            if generation != self.generation:
+                # Another writer compacted the store
+                self._switch_generation(generation)
+            return {
+                vector_id: {"text": self._text(offset, length), "file": file, "page": page, "doc_id": doc_id,
+                            "char_start": char_start, "char_end": char_end, "ingested_at": ingested_at}
+                for vector_id, doc_id, file, page, offset, length, char_start, char_end, ingested_at in rows
+            }
+
+    def matching_ids(self, search_filter: SearchFilter) -> np.ndarray:
+        """Sorted vector ids of the chunks a SearchFilter admits."""
+        clauses, params = [], []
+        if search_filter.files is not None:
+            clauses.append(f"file IN ({','.join('?' * len(search_filter.files))})")
+            params.extend(search_filter.files)
+        if search_filter.pages is not None:
+            clauses.append("page BETWEEN ? AND ?")
+            params.extend(search_filter.pages)
+        if search_filter.ingested_after is not None:
+            clauses.append("ingested_at >= ?")
+            params.append(search_filter.ingested_after)
+        if search_filter.ingested_before is not None:
+            clauses.append("ingested_at < ?")
+            params.append(search_filter.ingested_before)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(f"SELECT vector_id FROM chunks{where} ORDER BY vector_id", params)
+            return np.fromiter((row[0] for row in rows), dtype=np.int64)
+
+    def items(self, batch_size: int = 1000):
+        """Yield (vector_id, metadata) for every chunk, in vector id order."""
+        last_id = -1
+        while True:
+            with self._lock:
+                vector_ids = [row[0] for row in self._conn.execute(
+                    "SELECT vector_id FROM chunks WHERE vector_id > ? ORDER BY vector_id LIMIT ?", (last_id, batch_size)
+                )]
+            if not vector_ids:
+                return
+            documents = self.get(vector_ids)
+            for vector_id in vector_ids:
+                if vector_id in documents:
+                    yield vector_id, documents[vector_id]
+            last_id = vector_ids[-1]
+
+    def dead_bytes(self) -> int:
+        with self._lock:
+            live = self._conn.execute("SELECT COALESCE(SUM(text_length), 0) FROM chunks").fetchone()[0]
+            self._text_file.flush()
+            return os.path.getsize(self.text_path) - live
+
+    def compact(self) -> None:
+        """Rewrite the live text into a new blob generation, dropping the bytes of deleted chunks."""
+        with self._lock:
+            self.commit()
+            generation = self._read_generation() + 1
+            rows = self._conn.execute("SELECT vector_id, text_offset, text_length FROM chunks ORDER BY text_offset").fetchall()
+            updates = []
+            with open(self._text_path(generation), "wb") as out:
+                for vector_id, offset, length in rows:
+                    updates.append((out.tell(), vector_id))
+                    out.write(self._text(offset, length).encode("utf-8"))
+                out.flush()
+                os.fsync(out.fileno())
+            self._conn.executemany("UPDATE chunks SET text_offset = ? WHERE vector_id = ?", updates)
+            self._conn.execute("UPDATE meta SET value = ? WHERE key = 'generation'", (generation,))
+            self._conn.commit()
+
+            self._switch_generation(generation)
+            # The blob just replaced may still be read by other readers
+            self._remove_generations(before=generation - 1)
+            logger.info(f"Compacted document store text to {os.path.getsize(self.text_path)} bytes")
+
+    def close(self) -> None:
+        with self._lock:
+            self._text_file.close()
+            if self._mm is not None:
+                self._mm.close()
+                self._mm = None
+            self._conn.close()
+
+    @staticmethod
+    def remove(store_path: str) -> None:
+        """Delete a store's files."""
+        base = os.path.splitext(store_path)[0]
+        for path in [store_path, f"{store_path}-wal", f"{store_path}-shm"] + glob.glob(f"{glob.escape(base)}.*text"):
+            if os.path.exists(path):
+                os.remove(path)
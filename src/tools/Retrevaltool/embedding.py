@@ -3,10 +3,20 @@ from langchain_openai import OpenAIEmbeddings
 import faiss
 import numpy as np
 import os
-import json
+import asyncio
 import logging
+import threading
 import time
+from collections import namedtuple
 from dotenv import load_dotenv
+from embedding_cache import EMBEDDING_CACHE_PATH, CachedEmbeddings, EmbeddingCache
+from embedding_pipeline import EmbeddingPipeline
+from docstore import DocumentStore
+from ann_index import LOSSY_TYPES, extract_vectors, id_selector, index_type_of, maybe_rebuild, mmr, remove_ids, search, search_parameters
+from lexical_index import reciprocal_rank_fusion
+from local_embeddings import LocalEmbeddings, model_name_for
+from sharded_index import ShardedIndex, shard_path
+from vector_store import VectorStore
 
 logger = logging.getLogger(__name__)
 
@@ -14,120 +24,516 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-if not OPENAI_API_KEY:
-    raise ValueError("OpenAI API Key not found. Please set it in the .env file.")
+# Embedding backend: "openai" (OpenAIEmbeddings) or "local" (a transformers model on CPU, no network)
+EMBEDDING_BACKENDS = ("openai", "local")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai")
+# Indexes built before the model was recorded in the manifest used OpenAIEmbeddings' default model
+OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-ada-002")
+LOCAL_EMBEDDING_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+LOCAL_EMBEDDING_BATCH_SIZE = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", 32))
+# torch intra-op threads for the local model (0 keeps torch's default)
+LOCAL_EMBEDDING_THREADS = int(os.getenv("LOCAL_EMBEDDING_THREADS", 0))
+# "" (float32), "int8" (dynamic quantization) or "onnx" (ONNX Runtime)
+LOCAL_EMBEDDING_QUANTIZE = os.getenv("LOCAL_EMBEDDING_QUANTIZE", "")
 
-# Initialize OpenAI embeddings
-embeddings = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 1_000_000))
+# Number of embedding requests kept in flight while indexing; the local model
+# already uses every torch thread for one batch
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", 4 if EMBEDDING_BACKEND == "openai" else 1))
+# FAISS index type ("auto" or one of ann_index.INDEX_TYPES) and the memory it may use in auto mode
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "auto")
+FAISS_MEMORY_BUDGET_MB = int(os.getenv("FAISS_MEMORY_BUDGET_MB", 0))
+# Default query-time recall/latency knobs for IVF (nprobe) and HNSW (efSearch) indexes
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", 16))
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", 64))
+# Keep float32 originals of the vectors on disk next to the index; quantized indexes
+# re-rank FAISS_RERANK_FACTOR * top_k candidates against them (1 disables re-ranking)
+FAISS_STORE_VECTORS = os.getenv("FAISS_STORE_VECTORS", "1") == "1"
+FAISS_RERANK_FACTOR = int(os.getenv("FAISS_RERANK_FACTOR", 4))
+# Memory-map the index when serving instead of reading it into RAM
+FAISS_USE_MMAP = os.getenv("FAISS_USE_MMAP", "0") == "1"
+# Rewrite the vector store once deleted vectors make up this share of it
+VECTOR_STORE_COMPACT_RATIO = 0.2
+# Index files the corpus is split over by file name hash; 1 keeps a single index
+FAISS_SHARDS = int(os.getenv("FAISS_SHARDS", 1))
+# Default retrieval mode and how many candidates each side contributes to hybrid fusion
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", 20))
+# Maximal marginal relevance in vector search: 1.0 ranks by similarity alone, lower
+# values trade relevance for diversity among MMR_CANDIDATES over-fetched hits
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", 1.0))
+MMR_CANDIDATES = int(os.getenv("MMR_CANDIDATES", 20))
+
+def embedding_model_name(backend=EMBEDDING_BACKEND):
+    """Name of the model a backend embeds with, recorded in the ingestion manifest and the embedding cache."""
+    if backend == "openai":
+        return OPENAI_EMBEDDING_MODEL
+    if backend == "local":
+        return model_name_for(LOCAL_EMBEDDING_MODEL, LOCAL_EMBEDDING_QUANTIZE)
+    raise ValueError(f"Unknown embedding backend {backend}, expected one of {EMBEDDING_BACKENDS}")
+
+def load_embedding_backend(backend=EMBEDDING_BACKEND):
+    if backend == "openai":
+        if not OPENAI_API_KEY:
+            raise ValueError("OpenAI API Key not found. Please set it in the .env file, or use EMBEDDING_BACKEND=local.")
+        return OpenAIEmbeddings(model=OPENAI_EMBEDDING_MODEL, openai_api_key=OPENAI_API_KEY)
+    if backend == "local":
+        return LocalEmbeddings(LOCAL_EMBEDDING_MODEL, batch_size=LOCAL_EMBEDDING_BATCH_SIZE,
+                               num_threads=LOCAL_EMBEDDING_THREADS or None, quantize=LOCAL_EMBEDDING_QUANTIZE)
+    raise ValueError(f"Unknown embedding backend {backend}, expected one of {EMBEDDING_BACKENDS}")
+
+class DeferredEmbeddings:
+    """
+    Embedding backend created on first use.
+
+    Importing this module then needs neither an API key nor a model download,
+    so lexical search, benchmarks and tools that never embed work without them.
+    """
+
+    def __init__(self, backend=EMBEDDING_BACKEND):
+        self.backend = backend
+        self.model = embedding_model_name(backend)
+        self._embeddings = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._embeddings is None:
+            with self._lock:
+                if self._embeddings is None:
+                    self._embeddings = load_embedding_backend(self.backend)
+        return self._embeddings
+
+    def embed_documents(self, texts):
+        return self._load().embed_documents(texts)
+
+    def embed_query(self, text):
+        return self._load().embed_query(text)
+
+    def embed_queries(self, texts):
+        embeddings = self._load()
+        if hasattr(embeddings, "embed_queries"):
+            return embeddings.embed_queries(texts)
+        # OpenAIEmbeddings embeds a query the same way as a document, so a batch is one request
+        return embeddings.embed_documents(texts)
+
+    async def aembed_query(self, text):
+        # Creating the backend can load a model from disk, which must not block the event loop
+        embeddings = self._embeddings or await asyncio.to_thread(self._load)
+        return await embeddings.aembed_query(text)
+
+# Initialize the embedding backend behind the persistent embedding cache; neither
+# is created until the first embedding call, so importing this module touches no files
+embedding_cache = EmbeddingCache(EMBEDDING_CACHE_PATH, max_entries=EMBEDDING_CACHE_MAX_ENTRIES)
+embeddings = CachedEmbeddings(DeferredEmbeddings(), embedding_cache, model=embedding_model_name())
+
+def create_index(embedding_dim):
+    """
+    Create a flat L2 index wrapped in an id map so vectors can be addressed and removed by id.
+
+    New indexes start flat; optimize_index switches to an approximate index once
+    the corpus is large enough.
+    """
+    return faiss.IndexIDMap(faiss.IndexFlatL2(embedding_dim))
+
+def optimize_index(index, index_type=FAISS_INDEX_TYPE, memory_budget_mb=FAISS_MEMORY_BUDGET_MB, vector_store=None):
+    """
+    Rebuild the index as the configured type, or in auto mode the type suited to its size and memory budget.
+
+    Rebuilds start from the float32 originals in vector_store when it has them.
+    """
+    return maybe_rebuild(index, index_type, memory_budget_mb * 1024 * 1024 or None, vector_store)
+
+def vector_store_path(index_file_path):
+    return f"{index_file_path}.vectors"
+
+def open_vector_store(index_file_path, index=None):
+    """
+    Open the store of float32 originals next to the index for writing, or None if FAISS_STORE_VECTORS is off.
+
+    An index built before the store existed has its vectors copied in when they
+    can be reconstructed exactly; a quantized one only gets originals for the
+    vectors added from now on.
+    """
+    if not FAISS_STORE_VECTORS:
+        return None
+    vector_store = VectorStore(vector_store_path(index_file_path))
+    if not len(vector_store) and index is not None and index.ntotal:
+        if index_type_of(index) in LOSSY_TYPES:
+            logger.warning("Quantized index has no stored originals; only new vectors will be re-ranked exactly")
+        else:
+            vectors, ids = extract_vectors(index)
+            vector_store.add(ids, vectors)
+            logger.info(f"Copied {len(ids)} vectors from the index into the vector store")
+    return vector_store
+
+def version_path(index_file_path):
+    return f"{index_file_path}.version"
+
+def read_index_version(index_file_path):
+    """Version of the published index, 0 if it was never published."""
+    try:
+        with open(version_path(index_file_path)) as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+def _write_atomic(path, write):
+    tmp_path = f"{path}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
 
 # Save and load index functions
-def save_index(index, documents, ids, index_file_path, doc_map_file_path):
+def save_index(index, docstore, index_file_path, vector_store=None):
+    """
+    Publish the FAISS index and commit the document store and vector store.
+
+    The index is written to a temporary file and renamed into place, then the
+    version file is bumped, so readers never see a partially written index and
+    RetrievalService instances know to swap it in.
+    """
+    docstore.commit()
+    logger.info(f"Document store committed to {docstore.store_path}")
+    write_index(index, index_file_path, vector_store)
+    publish_index(index_file_path)
+
+def write_index(index, index_file_path, vector_store=None):
+    """Commit the vector store and atomically replace the index file, without publishing a new version."""
+    if vector_store is not None:
+        vector_store.commit()
+        if len(vector_store) - index.ntotal > VECTOR_STORE_COMPACT_RATIO * max(index.ntotal, 1):
+            vector_store.compact(faiss.vector_to_array(index.id_map))
+        logger.info(f"Vector store committed to {vector_store.store_path}")
+
     # Save the FAISS index
-    faiss.write_index(index, index_file_path)
+    _write_atomic(index_file_path, lambda path: faiss.write_index(index, path))
     logger.info(f"Index saved to {index_file_path}")
 
-    # Save the document-to-ID mapping with metadata
-    doc_map = {}
-    for i in range(len(documents)):
-        if isinstance(documents[i], dict):
-            # If document is already a metadata dict
-            doc_map[ids[i]] = documents[i]
-        else:
-            # If document is just text, create basic metadata
-            doc_map[ids[i]] = {
-                'text': documents[i],
-                'file': 'unknown',
-                'page': None
-            }
-
-    # Save the document map to a file (using JSON format)
-    with open(doc_map_file_path, 'w') as doc_map_file:
-        json.dump(doc_map, doc_map_file)
-    logger.info(f"Document mapping saved to {doc_map_file_path}")
-
-def load_index(index_file_path, doc_map_file_path):
+def publish_index(index_file_path):
+    """Bump the version file so RetrievalService instances swap in the index files written so far."""
+    version = read_index_version(index_file_path) + 1
+    def write_version(path):
+        with open(path, "w") as f:
+            f.write(str(version))
+    _write_atomic(version_path(index_file_path), write_version)
+    logger.info(f"Published index version {version}")
+
+def load_index(index_file_path, doc_store_path, use_mmap=False):
+    """
+    Load the FAISS index and open its document store.
+
+    With use_mmap the index is memory-mapped (IO_FLAG_MMAP) where the index type
+    supports it, so it is paged in on demand instead of read up front.
+    """
     # Load the FAISS index
+    index = faiss.read_index(index_file_path, faiss.IO_FLAG_MMAP if use_mmap else 0)
+    logger.info(f"Index loaded from {index_file_path}")
+
+    docstore = DocumentStore(doc_store_path)
+    logger.info(f"Document store opened at {doc_store_path}")
+
+    return index, docstore
+
+def load_sharded_index(index_file_path, num_shards=FAISS_SHARDS, use_mmap=False, executor=None):
+    """Load every shard written so far, with its vector store, as a ShardedIndex searched on executor."""
+    shards = []
+    for shard in range(num_shards):
+        path = shard_path(index_file_path, shard, num_shards)
+        if os.path.exists(path):
+            shards.append((faiss.read_index(path, faiss.IO_FLAG_MMAP if use_mmap else 0), VectorStore.open(vector_store_path(path))))
+    logger.info(f"Loaded {len(shards)} of {num_shards} index shards from {index_file_path}")
+    return ShardedIndex(shards, executor)
+
+def load_index_file(index_file_path):
+    """The FAISS index at index_file_path, or None if none was written there yet."""
+    if not os.path.exists(index_file_path):
+        return None
     index = faiss.read_index(index_file_path)
     logger.info(f"Index loaded from {index_file_path}")
+    return index
 
-    # Load the document-to-ID mapping
-    with open(doc_map_file_path, 'r') as doc_map_file:
-        doc_map = json.load(doc_map_file)
-    logger.info(f"Document mapping loaded from {doc_map_file_path}")
+def load_or_create_index(index_file_path, doc_store_path):
+    """Load the persisted index if there is one, otherwise return no index yet and an empty document store."""
+    if os.path.exists(index_file_path):
+        logger.info("Loading existing FAISS index and document store...")
+        return load_index(index_file_path, doc_store_path)
+    logger.info("Creating new FAISS index and document store...")
+    return None, DocumentStore(doc_store_path)
 
-    # Extract ids and documents from the mapping
-    ids = list(doc_map.keys())
-    documents = list(doc_map.values())
+def add_embedding_stream(index, docstore, items, BATCH_SIZE=None, vector_store=None):
+    """
+    Embed a stream of (chunk, (vector_id, metadata)) items and add them to the index.
 
-    return index, documents, ids
+    Items are consumed lazily and embedded concurrently in token-packed batches
+    (BATCH_SIZE caps the number of chunks per request); each batch is added to the
+    index and the document store as soon as it completes. The index is created on
+    the first batch if it does not exist yet. With a vector_store the float32
+    vectors are also appended there. Returns the (possibly new) index.
+    """
+    pipeline_options = {"max_batch_size": BATCH_SIZE} if BATCH_SIZE else {}
+    pipeline = EmbeddingPipeline(embeddings.embed_documents, max_in_flight=EMBEDDING_CONCURRENCY, **pipeline_options)
 
-def calculate_embedding(chunks, metadata, BATCH_SIZE=20, persist_path="data/output/faiss_index.index", doc_map_path="data/output/doc_map.json"):
-    start_time_1 = time.time()
+    for payloads, batch_embeddings in pipeline.run(items):
+        if index is None:
+            index = create_index(batch_embeddings.shape[1])
+
+        # Add to index
+        batch_vector_ids = [vector_id for vector_id, _ in payloads]
+        index.add_with_ids(batch_embeddings, np.array(batch_vector_ids, dtype='int64'))
+        if vector_store is not None:
+            vector_store.add(batch_vector_ids, batch_embeddings)
+        # Generate a unique ID for each chunk
+        docstore.add((vector_id, f"{meta['file']}_page{meta['page']}_{vector_id}", meta) for vector_id, meta in payloads)
+
+    logger.info(f"Embedding cache: {embedding_cache.stats()}")
+    return index
 
-    # Create a FAISS index (L2 distance)
-    embedding_dim = len(embeddings.embed_documents(["test"])[0])
-    index = faiss.IndexFlatL2(embedding_dim)
-    documents = metadata  # Store metadata instead of just chunks
-    ids = []
+def add_embeddings(index, docstore, chunks, metadata, vector_ids, BATCH_SIZE=None, vector_store=None):
+    """Embed chunks and add them to the index under the given vector ids. Returns the (possibly new) index."""
+    items = ((chunk, (vector_id, meta)) for chunk, meta, vector_id in zip(chunks, metadata, vector_ids))
+    return add_embedding_stream(index, docstore, items, BATCH_SIZE, vector_store)
 
-    # Check if an index exists and load it
-    if os.path.exists(persist_path):
-        logger.info("Loading existing FAISS index and document mapping...")
-        index, documents, ids = load_index(persist_path, doc_map_path)
-    else:
-        logger.info("Creating new FAISS index and document mapping...")
+def remove_embeddings(index, docstore, vector_ids, vector_store=None):
+    """
+    Remove vectors from the index and their chunks from the document store. Returns the (possibly rebuilt) index.
+
+    Their rows in vector_store are dropped when save_index compacts it.
+    """
+    if index is not None and vector_ids:
+        index, removed = remove_ids(index, vector_ids, vector_store)
+        logger.info(f"Removed {removed} vectors from FAISS index")
+    docstore.delete(vector_ids)
+    return index
+
+def calculate_embedding(chunks, metadata, BATCH_SIZE=None, persist_path="data/output/faiss_index.index", doc_store_path="data/output/docstore.sqlite", vector_ids=None):
+    """
+    Embed chunks into the persisted index and save it.
+
+    vector_ids defaults to the ids following the largest id already in the store.
+    Returns the vector ids that were assigned.
+    """
+    start_time_1 = time.time()
+
+    index, docstore = load_or_create_index(persist_path, doc_store_path)
+    vector_store = open_vector_store(persist_path, index)
+    if vector_ids is None:
+        first_id = docstore.max_id() + 1
+        vector_ids = list(range(first_id, first_id + len(chunks)))
 
     end_time_1 = time.time()
     logger.info(f"Time for setting up FAISS index: {end_time_1 - start_time_1:.2f} seconds")
 
     start_time = time.time()
-    for i in range(0, len(chunks), BATCH_SIZE):
-        batch_chunks = chunks[i:i + BATCH_SIZE]
-        batch_metadata = metadata[i:i + BATCH_SIZE]
-        
-        # Generate unique IDs for each chunk
-        batch_ids = [f"{meta['file']}_page{meta['page']}_{j}" for j, meta in enumerate(batch_metadata)]
-        
-        # Create embeddings for the text chunks
-        batch_embeddings = embeddings.embed_documents(batch_chunks)
-        batch_embeddings = np.array(batch_embeddings).astype('float32')
-        
-        # Add to index
-        index.add(batch_embeddings)
-        ids.extend(batch_ids)
-    
+    index = add_embeddings(index, docstore, chunks, metadata, vector_ids, BATCH_SIZE, vector_store)
+    index = optimize_index(index, vector_store=vector_store)
     end_time = time.time()
     logger.info(f"Time for creating/updating FAISS index: {end_time - start_time:.2f} seconds")
 
-    # Save the updated index and document mapping
-    save_index(index, documents, ids, persist_path, doc_map_path)
+    # Save the updated index and document store
+    if index is not None:
+        save_index(index, docstore, persist_path, vector_store)
+    docstore.close()
+    if vector_store is not None:
+        vector_store.close()
+    return vector_ids
 
-def query_embeddings(index, query_text, documents, ids, top_k=3):
+class SearchResult(namedtuple("SearchResult", ["text", "doc_id", "score"])):
     """
-    Query the FAISS index for the closest embeddings and return the top-k documents.
+    A (text, doc_id, score) search hit.
+
+    metadata holds the chunk's citation fields (vector_id, file, page, char_start,
+    char_end) straight from the document store, or None for a missing hit.
     """
-    query_embedding = np.array([embeddings.embed_query(query_text)]).astype('float32')
-    distances, indices = index.search(query_embedding, top_k)
-
-    results = []
-    for i in range(top_k):
-        index_id = indices[0][i]
-        if index_id < len(ids):
-            doc_id = ids[index_id]
-            document = documents[index_id]
-            distance = distances[0][i]
-            results.append((document['text'], doc_id, distance))
-        else:
-            results.append((None, None, None))
 
+    def __new__(cls, text, doc_id, score, metadata=None):
+        result = super().__new__(cls, text, doc_id, score)
+        result.metadata = metadata
+        return result
+
+    def __getnewargs__(self):
+        return (*self, self.metadata)
+
+EMPTY_RESULT = SearchResult(None, None, None)
+
+def _search_result(vector_id, document, score):
+    if document is None:
+        return EMPTY_RESULT
+    metadata = {
+        'vector_id': int(vector_id),
+        'file': document['file'],
+        'page': document['page'],
+        'char_start': document.get('char_start'),
+        'char_end': document.get('char_end'),
+    }
+    return SearchResult(document['text'], document['doc_id'], score, metadata)
+
+def _results(docstore, vector_ids, scores, top_k):
+    """Look up ranked vector ids in the document store as SearchResults, padded to top_k."""
+    documents = docstore.get(vector_ids)
+    results = [_search_result(vector_id, documents.get(int(vector_id)), score) for vector_id, score in zip(vector_ids, scores)]
+    results.extend([EMPTY_RESULT] * (top_k - len(results)))
     return results
 
+def _allowed_ids(docstore, search_filter):
+    """Vector ids a SearchFilter admits, or None when there is no filter."""
+    return docstore.matching_ids(search_filter) if search_filter is not None else None
+
+def _search(index, query_matrix, top_k, nprobe, ef_search, vector_store=None, rerank_factor=FAISS_RERANK_FACTOR, allowed_ids=None):
+    """Search a single index or fan out over a ShardedIndex, which holds its own vector stores."""
+    if isinstance(index, ShardedIndex):
+        return index.search(query_matrix, top_k, nprobe, ef_search, rerank_factor, allowed_ids)
+    selector = id_selector(allowed_ids) if allowed_ids is not None else None
+    params = search_parameters(index, nprobe, ef_search, selector)
+    return search(index, query_matrix, top_k, params, vector_store, rerank_factor, allowed_ids)
+
+def _vector_search(index, query_vector, top_k, nprobe, ef_search, vector_store=None, rerank_factor=FAISS_RERANK_FACTOR, allowed_ids=None):
+    query_embedding = np.asarray(query_vector, dtype='float32').reshape(1, -1)
+    distances, indices = _search(index, query_embedding, top_k, nprobe, ef_search, vector_store, rerank_factor, allowed_ids)
+    return distances[0], indices[0]
+
+def _stored_vectors(index, vector_store, vector_ids):
+    """(vectors, found) for vector ids from the vector store(s) of the index."""
+    if isinstance(index, ShardedIndex):
+        return index.get_vectors(vector_ids)
+    if vector_store is not None:
+        return vector_store.get(vector_ids)
+    return None, np.zeros(len(vector_ids), dtype=bool)
+
+def _mmr_rerank(index, vector_store, query_vector, distances, vector_ids, top_k, lambda_mult):
+    """Reorder over-fetched hits by maximal marginal relevance, using the stored vectors of the candidates."""
+    valid = vector_ids >= 0
+    distances, vector_ids = distances[valid], vector_ids[valid]
+    vectors, found = _stored_vectors(index, vector_store, vector_ids)
+    if not found.all():
+        logger.warning("Some candidates have no stored vector, skipping MMR for this query")
+        return distances[:top_k], vector_ids[:top_k]
+    picked = mmr(query_vector, vectors, top_k, lambda_mult)
+    return distances[picked], vector_ids[picked]
+
+def query_embeddings(index, query_text, docstore, top_k=3, nprobe=FAISS_NPROBE, ef_search=FAISS_EF_SEARCH, query_vector=None,
+                     vector_store=None, rerank_factor=FAISS_RERANK_FACTOR, search_filter=None, mmr_lambda=MMR_LAMBDA,
+                     mmr_candidates=MMR_CANDIDATES):
+    """
+    Query the FAISS index for the closest embeddings and return the top-k documents.
+
+    nprobe (IVF indexes) and ef_search (HNSW) trade recall for latency per query.
+    Only the top-k rows are read from the document store. Pass query_vector when
+    the query has already been embedded to skip the embedding call. With a
+    vector_store, hits of a quantized index are re-ranked by exact distance.
+
+    search_filter (a docstore.SearchFilter) restricts the search to matching
+    chunks inside FAISS. With mmr_lambda below 1, mmr_candidates hits are
+    fetched and the top-k picked by maximal marginal relevance over their
+    stored vectors, so near-duplicate chunks do not crowd out other sources.
+    """
+    allowed_ids = _allowed_ids(docstore, search_filter)
+    if allowed_ids is not None and not len(allowed_ids):
+        return [EMPTY_RESULT] * top_k
+    if query_vector is None:
+        query_vector = embeddings.embed_query(query_text)
+    use_mmr = mmr_lambda < 1
+    fetch = max(top_k, mmr_candidates) if use_mmr else top_k
+    distances, indices = _vector_search(index, query_vector, fetch, nprobe, ef_search, vector_store, rerank_factor, allowed_ids)
+    if use_mmr:
+        distances, indices = _mmr_rerank(index, vector_store, query_vector, distances, indices, top_k, mmr_lambda)
+    return _results(docstore, indices, distances, top_k)
+
+def query_lexical(lexical_index, query_text, docstore, top_k=3, search_filter=None):
+    """
+    Keyword search with BM25 over the local inverted index. No embedding call is made.
+
+    Results have the same (text, doc_id, score) form as query_embeddings, with the BM25 score (higher is better).
+    """
+    matches = lexical_index.search(query_text, top_k, _allowed_ids(docstore, search_filter))
+    return _results(docstore, [vector_id for vector_id, _ in matches], [score for _, score in matches], top_k)
+
+def query_hybrid(index, lexical_index, query_text, docstore, top_k=3, candidates=HYBRID_CANDIDATES, nprobe=FAISS_NPROBE,
+                 ef_search=FAISS_EF_SEARCH, query_vector=None, vector_store=None, rerank_factor=FAISS_RERANK_FACTOR,
+                 search_filter=None):
+    """
+    Fuse vector and BM25 rankings with reciprocal rank fusion.
+
+    Each side contributes its best `candidates` ids; the score in the results is the fused RRF score.
+    """
+    allowed_ids = _allowed_ids(docstore, search_filter)
+    if allowed_ids is not None and not len(allowed_ids):
+        return [EMPTY_RESULT] * top_k
+    if query_vector is None:
+        query_vector = embeddings.embed_query(query_text)
+    candidates = max(candidates, top_k)
+    _, vector_ids = _vector_search(index, query_vector, candidates, nprobe, ef_search, vector_store, rerank_factor, allowed_ids)
+    lexical_ids = [vector_id for vector_id, _ in lexical_index.search(query_text, candidates, allowed_ids)]
+    fused = reciprocal_rank_fusion([[int(v) for v in vector_ids if v >= 0], lexical_ids])[:top_k]
+    return _results(docstore, [vector_id for vector_id, _ in fused], [score for _, score in fused], top_k)
+
+def query_index(index, lexical_index, query_text, docstore, top_k=3, mode=RETRIEVAL_MODE, **search_options):
+    """Search in the given mode: "vector" (FAISS), "lexical" (BM25) or "hybrid" (both, fused)."""
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode {mode}, expected one of {SEARCH_MODES}")
+    if mode != "vector" and (lexical_index is None or not len(lexical_index)):
+        if mode == "lexical":
+            return [EMPTY_RESULT] * top_k
+        mode = "vector"
+    if mode == "lexical":
+        return query_lexical(lexical_index, query_text, docstore, top_k, search_options.get("search_filter"))
+    if mode == "hybrid":
+        return query_hybrid(index, lexical_index, query_text, docstore, top_k, **search_options)
+    return query_embeddings(index, query_text, docstore, top_k, **search_options)
+
+class BatchSearchResults:
+    """
+    Results of query_embeddings_batch.
+
+    distances and vector_ids are (n_queries, top_k) arrays straight from FAISS
+    (-1 marks a missing hit). Documents are only read from the document store
+    when asked for, with one lookup for all requested rows.
+    """
+
+    def __init__(self, queries, distances, vector_ids, docstore):
+        self.queries = queries
+        self.distances = distances
+        self.vector_ids = vector_ids
+        self.docstore = docstore
+        self._documents = {}
+
+    def __len__(self):
+        return len(self.queries)
+
+    def _fetch(self, vector_ids):
+        missing = [v for v in np.unique(vector_ids) if v >= 0 and v not in self._documents]
+        if missing:
+            self._documents.update(self.docstore.get(missing))
+
+    def results(self, i):
+        """SearchResults for query i, in the same form as query_embeddings."""
+        self._fetch(self.vector_ids[i])
+        return [_search_result(vector_id, self._documents.get(int(vector_id)), distance)
+                for vector_id, distance in zip(self.vector_ids[i], self.distances[i])]
+
+    def all_results(self):
+        self._fetch(self.vector_ids)
+        return [self.results(i) for i in range(len(self))]
+
+def query_embeddings_batch(index, query_texts, docstore, top_k=3, nprobe=FAISS_NPROBE, ef_search=FAISS_EF_SEARCH, vector_store=None,
+                           rerank_factor=FAISS_RERANK_FACTOR, search_filter=None):
+    """
+    Search many queries at once: one embedding call and one FAISS search over the whole query matrix.
+
+    The queries are embedded as queries, so each row matches what query_embeddings
+    would search with for that query alone.
+    """
+    query_matrix = np.asarray(embeddings.embed_queries(list(query_texts)), dtype='float32')
+    allowed_ids = _allowed_ids(docstore, search_filter)
+    distances, indices = _search(index, query_matrix, top_k, nprobe, ef_search, vector_store, rerank_factor, allowed_ids)
+    return BatchSearchResults(list(query_texts), distances, indices, docstore)
+
 def print_query_results(results):
     """
     Print the results from the query_embeddings function in a readable format.
     
     Args:
-        results: List of tuples where each tuple contains (document, id, distance).
+        results: List of tuples where each tuple contains (document, id, score), the score being
+            the L2 distance for vector search, BM25 for lexical and RRF for hybrid search.
     """
     if not results:
         print("No results found.")
@@ -135,9 +541,9 @@ def print_query_results(results):
 
     print("Query Results:")
     print("=" * 40)
-    for rank, (document, doc_id, distance) in enumerate(results, start=1):
+    for rank, (document, doc_id, score) in enumerate(results, start=1):
         print(f"Rank {rank}:")
         print(f"Document: {document}")
         print(f"ID: {doc_id}")
-        print(f"Distance: {distance:.4f}")
+        print(f"Score: {score:.4f}")
         print("-" * 40)
@@ -0,0 +1,193 @@
+import os
+import time
+import asyncio
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+# One cache for every embedding call of the project (PDF retrieval and the SQL
+# tool's tabular vector DB); a relative path is taken from the project root, so
+# the tools share it whatever their working directory
+EMBEDDING_CACHE_PATH = os.path.join(PROJECT_ROOT, os.getenv("EMBEDDING_CACHE_PATH", os.path.join("data", "output", "embedding_cache.sqlite")))
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text before hashing so whitespace-only differences share a cache entry."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(model: str, text: str) -> bytes:
+    return hashlib.sha256(f"{model}\x00{normalize_text(text)}".encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache backed by SQLite.
+
+    Vectors are stored as float32 blobs keyed by sha256(model + normalized text).
+    The cache is bounded to max_entries; the least recently used entries are
+    evicted first. Safe to share between threads.
+    """
+
+    def __init__(self, cache_path: str, max_entries: int = 1_000_000):
+        self.cache_path = cache_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # The database is opened on first use, so creating a cache touches no files
+        self._conn = None
+        self._size = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database and create its table if needed; called with the lock held."""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.cache_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key BLOB PRIMARY KEY, dim INTEGER NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+            conn.commit()
+            self._size = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._connect()
+            return self._size
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Return the cached vector for each text, or None where it is not cached."""
+        keys = [cache_key(model, text) for text in texts]
+        found = {}
+        with self._lock:
+            conn = self._connect()
+            # Stay well below SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+                conn.commit()
+
+            results = [np.frombuffer(found[key], dtype=np.float32) if key in found else None for key in keys]
+            hits = sum(vector is not None for vector in results)
+            self.hits += hits
+            self.misses += len(results) - hits
+        return results
+
+    def put_many(self, model: str, texts: List[str], vectors) -> None:
+        now = time.time()
+        rows = []
+        for text, vector in zip(texts, vectors):
+            vector = np.asarray(vector, dtype=np.float32)
+            rows.append((cache_key(model, text), vector.shape[0], vector.tobytes(), now))
+        with self._lock:
+            conn = self._connect()
+            before = conn.total_changes
+            conn.executemany("INSERT OR IGNORE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            self._size += conn.total_changes - before
+            if self._size > self.max_entries:
+                self._evict(self._size - self.max_entries)
+            conn.commit()
+
+    def _evict(self, count: int) -> None:
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (count,)
+        )
+        self._size -= count
+        logger.info(f"Evicted {count} least recently used embeddings from {self.cache_path}")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class CachedEmbeddings:
+    """
+    Wrap a LangChain embeddings object so every call goes through an EmbeddingCache.
+
+    Only texts missing from the cache are sent to the wrapped model, in a single
+    embed_documents (or embed_queries) call, and duplicates within a call are
+    embedded once. Query vectors are cached apart from document vectors, since a
+    model may embed the same text differently as a query.
+    """
+
+    def __init__(self, embeddings, cache: EmbeddingCache, model: str = None):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = model or getattr(embeddings, "model", None) or type(embeddings).__name__
+        self.query_model = f"{self.model}|query"
+
+    def _embed_cached(self, model: str, texts: List[str], embed) -> List[List[float]]:
+        vectors = self.cache.get_many(model, texts)
+        missing = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(normalize_text(texts[i]), []).append(i)
+
+        if missing:
+            positions = list(missing.values())
+            miss_texts = [texts[indices[0]] for indices in positions]
+            new_vectors = embed(miss_texts)
+            self.cache.put_many(model, miss_texts, new_vectors)
+            for indices, vector in zip(positions, new_vectors):
+                for i in indices:
+                    vectors[i] = vector
+
+        return [np.asarray(vector, dtype=np.float32).tolist() for vector in vectors]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed_cached(self.model, texts, self.embeddings.embed_documents)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Batch embed_query: the query vectors missing from the cache are embedded together."""
+        embed_queries = getattr(self.embeddings, "embed_queries", None)
+        if embed_queries is None:
+            def embed_queries(miss_texts):
+                return [self.embeddings.embed_query(text) for text in miss_texts]
+        return self._embed_cached(self.query_model, texts, embed_queries)
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.cache.get_many(self.query_model, [text])[0]
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put_many(self.query_model, [text], [vector])
+        return np.asarray(vector, dtype=np.float32).tolist()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """Async embed_query; the SQLite cache reads and writes run on a worker thread, off the event loop."""
+        vector = (await asyncio.to_thread(self.cache.get_many, self.query_model, [text]))[0]
+        if vector is None:
+            vector = await self.embeddings.aembed_query(text)
+            await asyncio.to_thread(self.cache.put_many, self.query_model, [text], [vector])
+        return np.asarray(vector, dtype=np.float32).tolist()
@@ -0,0 +1,196 @@
+import time
+import random
+import logging
+import threading
+from functools import lru_cache
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Iterable, Iterator, List, Tuple
+
+import numpy as np
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def load_token_counter(encoding_name: str = "cl100k_base") -> Callable[[str], int]:
+    """
+    Return a function counting tokens with tiktoken.
+
+    tiktoken downloads its BPE files on first use; when that is not possible
+    (offline ingestion) fall back to the usual ~4 characters per token estimate.
+    The counter, or the fallback, is kept for the process, so an offline
+    download is only attempted once rather than by every pipeline.
+    """
+    try:
+        encoding = tiktoken.get_encoding(encoding_name)
+    except Exception as e:
+        logger.warning(f"tiktoken encoding {encoding_name} unavailable ({e}), estimating 4 characters per token")
+        return lambda text: len(text) // 4 + 1
+    return lambda text: len(encoding.encode_ordinary(text))
+
+
+def is_rate_limit_error(exc: Exception) -> bool:
+    """Recognize HTTP 429s from the OpenAI client, LangChain wrappers and plain HTTP errors."""
+    if type(exc).__name__ == "RateLimitError":
+        return True
+    status = getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+    return status == 429
+
+
+def retry_after(exc: Exception):
+    """Seconds the provider asked us to wait, if it sent a Retry-After header."""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class EmbeddingPipeline:
+    """
+    Concurrent, rate-limit-aware batch embedding.
+
+    Texts are packed into batches by token count, up to max_in_flight batches
+    are embedded concurrently on a thread pool, and finished batches are yielded
+    as soon as they complete so callers can stream them into the index. Input is
+    consumed lazily, so a generator of chunks is never materialized.
+
+    On a 429 the allowed concurrency is halved and every worker pauses for the
+    backoff delay (or the provider's Retry-After); each successful batch lets
+    the concurrency grow back by one.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], List[List[float]]],
+        max_in_flight: int = 4,
+        max_batch_tokens: int = 50_000,
+        max_batch_size: int = 512,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        encoding_name: str = "cl100k_base",
+    ):
+        self.embed_fn = embed_fn
+        self.max_in_flight = max_in_flight
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.count_tokens = load_token_counter(encoding_name)
+
+        self._limit = max_in_flight
+        self._active = 0
+        self._cooldown_until = 0.0
+        self._cond = threading.Condition()
+
+        self.chunks = 0
+        self.batches = 0
+        self.tokens = 0
+        self.rate_limited = 0
+        self.elapsed = 0.0
+
+    @property
+    def chunks_per_sec(self) -> float:
+        return self.chunks / self.elapsed if self.elapsed else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "chunks": self.chunks,
+            "batches": self.batches,
+            "tokens": self.tokens,
+            "rate_limited": self.rate_limited,
+            "seconds": round(self.elapsed, 3),
+            "chunks_per_sec": round(self.chunks_per_sec, 1),
+        }
+
+    def pack_batches(self, items: Iterable[Tuple[str, Any]]) -> Iterator[List[Tuple[str, Any, int]]]:
+        """Group (text, payload) pairs into batches bounded by token count and batch size."""
+        batch, batch_tokens = [], 0
+        for text, payload in items:
+            n_tokens = self.count_tokens(text)
+            if batch and (batch_tokens + n_tokens > self.max_batch_tokens or len(batch) >= self.max_batch_size):
+                yield batch
+                batch, batch_tokens = [], 0
+            batch.append((text, payload, n_tokens))
+            batch_tokens += n_tokens
+        if batch:
+            yield batch
+
+    def _acquire(self) -> None:
+        with self._cond:
+            while True:
+                wait_for = self._cooldown_until - time.monotonic()
+                if wait_for <= 0 and self._active < self._limit:
+                    self._active += 1
+                    return
+                self._cond.wait(timeout=wait_for if wait_for > 0 else None)
+
+    def _release(self, rate_limited: bool, delay: float = 0.0) -> None:
+        with self._cond:
+            self._active -= 1
+            if rate_limited:
+                self.rate_limited += 1
+                self._limit = max(1, self._limit // 2)
+                self._cooldown_until = max(self._cooldown_until, time.monotonic() + delay)
+            elif self._limit < self.max_in_flight:
+                self._limit += 1
+            self._cond.notify_all()
+
+    def _embed_batch(self, batch: List[Tuple[str, Any, int]]) -> np.ndarray:
+        texts = [text for text, _, _ in batch]
+        for attempt in range(self.max_retries + 1):
+            self._acquire()
+            try:
+                vectors = self.embed_fn(texts)
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt == self.max_retries:
+                    self._release(rate_limited=False)
+                    raise
+                delay = retry_after(e) or min(self.max_delay, self.base_delay * 2 ** attempt)
+                delay *= random.uniform(1.0, 1.25)
+                logger.warning(f"Embedding rate limited, backing off {delay:.1f}s (attempt {attempt + 1})")
+                self._release(rate_limited=True, delay=delay)
+                continue
+            self._release(rate_limited=False)
+            return np.asarray(vectors, dtype=np.float32)
+
+    def run(self, items: Iterable[Tuple[str, Any]]) -> Iterator[Tuple[List[Any], np.ndarray]]:
+        """
+        Embed (text, payload) pairs, yielding (payloads, vectors) per batch in completion order.
+
+        At most max_in_flight batches are pending at any time, which bounds memory
+        and applies backpressure to the producer of items.
+        """
+        start = time.perf_counter()
+        batches = self.pack_batches(items)
+        pending = {}
+        with ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="embed") as pool:
+            try:
+                exhausted = False
+                while True:
+                    while not exhausted and len(pending) < self.max_in_flight:
+                        batch = next(batches, None)
+                        if batch is None:
+                            exhausted = True
+                            break
+                        pending[pool.submit(self._embed_batch, batch)] = batch
+                    if not pending:
+                        break
+
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        batch = pending.pop(future)
+                        vectors = future.result()
+                        self.chunks += len(batch)
+                        self.batches += 1
+                        self.tokens += sum(n_tokens for _, _, n_tokens in batch)
+                        yield [payload for _, payload, _ in batch], vectors
+            finally:
+                for future in pending:
+                    future.cancel()
+                self.elapsed += time.perf_counter() - start
+
+        logger.info(f"Embedding pipeline: {self.stats()}")
@@ -1,7 +1,7 @@
 import os
 import fitz  # PyMuPDF
 import logging
-from multiprocessing import Pool, cpu_count
+from dataprocessing import open_document, page_tasks, run_page_tasks
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -22,7 +22,7 @@ def categorize_pages_worker(args):
     image_pages = []
     
     try:
-        doc = fitz.open(file_path)
+        doc = open_document(file_path)
         for page_num in page_range:
             page = doc[page_num]
             text = page.get_text()[:100].strip()
@@ -32,7 +32,6 @@ def categorize_pages_worker(args):
                 text_pages.append(page_num)
             else :
                 image_pages.append(page_num)
-        doc.close()
     except Exception as e:
         logging.error(f"Error processing pages {page_range} of {file_path}: {e}")
     
@@ -51,34 +50,23 @@ def categorize_pdf_pages(file_path, use_multiprocessing=True):
         image_pages (list): List of page numbers with images but no extractable text.
     """
     try:
-        doc = fitz.open(file_path)
-        total_pages = len(doc)
-        doc.close()
-        
-        if total_pages == 0:
+        tasks = list(page_tasks([file_path]))
+        if not tasks:
             logging.warning(f"The PDF {file_path} is empty.")
             return [], []
-        
-        logging.info(f"Processing {total_pages} pages from {file_path}.")
 
-        # Prepare page ranges for multiprocessing
-        num_workers = cpu_count() if use_multiprocessing else 1
-        pages_per_worker = max(1, total_pages // num_workers)
-        page_ranges = [range(i, min(i + pages_per_worker, total_pages)) for i in range(0, total_pages, pages_per_worker)]
+        logging.info(f"Processing {tasks[-1][1][-1] + 1} pages from {file_path}.")
 
         text_pages, image_pages = [], []
 
         if use_multiprocessing:
-            with Pool(processes=num_workers) as pool:
-                results = pool.map(categorize_pages_worker, [(file_path, page_range) for page_range in page_ranges])
-                for text, images in results:
-                    text_pages.extend(text)
-                    image_pages.extend(images)
+            # Page batches are scheduled on the shared worker pool
+            results = (result for _, result in run_page_tasks(categorize_pages_worker, tasks))
         else:
-            for page_range in page_ranges:
-                text, images = categorize_pages_worker((file_path, page_range))
-                text_pages.extend(text)
-                image_pages.extend(images)
+            results = map(categorize_pages_worker, tasks)
+        for text, images in results:
+            text_pages.extend(text)
+            image_pages.extend(images)
 
         logging.info(f"Completed {file_path}. Text-based pages: {len(text_pages)}, Image-based pages: {len(image_pages)}.")
         return text_pages, image_pages
@@ -0,0 +1,232 @@
+import os
+import re
+import math
+import pickle
+import logging
+from collections import Counter
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# BM25 term-frequency saturation and length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Rewrite the postings once deleted chunks make up this share of the indexed ones
+COMPACT_RATIO = 0.2
+# Rank constant of reciprocal rank fusion
+RRF_K = 60
+
+# Words plus identifiers joined by - . / : such as "AB-1234", "4.2.1" or "iso/iec"
+TOKEN_PATTERN = re.compile(r"\w+(?:[-./:]\w+)*")
+SEPARATOR_PATTERN = re.compile(r"[-./:]")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens; compound identifiers are indexed whole and by their parts."""
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        token = match.group()
+        tokens.append(token)
+        parts = SEPARATOR_PATTERN.split(token)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+def encode_varint(value: int, out: bytearray) -> None:
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varints(data: bytes) -> np.ndarray:
+    """Decode a run of LEB128 varints in one vectorized pass."""
+    encoded = np.frombuffer(data, dtype=np.uint8)
+    if not len(encoded):
+        return np.zeros(0, dtype=np.int64)
+    ends = np.flatnonzero(encoded < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    shifts = 7 * (np.arange(len(encoded)) - np.repeat(starts, ends - starts + 1))
+    return np.add.reduceat((encoded & 0x7F).astype(np.int64) << shifts, starts)
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Iterable[int]], k: int = RRF_K) -> List[Tuple[int, float]]:
+    """Fuse ranked id lists into one, scoring each id by sum(1 / (k + rank))."""
+    scores = {}
+    for ranking in rankings:
+        for rank, vector_id in enumerate(ranking, start=1):
+            scores[vector_id] = scores.get(vector_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over chunk text, addressed by FAISS vector id.
+
+    Each term's posting list is a byte string of varint-encoded (vector id
+    delta, term frequency) pairs. Vector ids are handed out in increasing order
+    by the ingestion manifest, so new chunks are appended to the end of the
+    lists. Deleting a chunk only zeroes its length (a tombstone); its postings
+    are skipped at query time and dropped when the index is compacted.
+    """
+
+    VERSION = 1
+
+    def __init__(self, index_path: str):
+        self.index_path = index_path
+        self.postings = {}
+        self._last_ids = {}
+        # Token count per vector id; 0 marks an absent or deleted chunk
+        self._lengths = np.zeros(0, dtype=np.int32)
+        self.max_id = -1
+        self.num_docs = 0
+        self.total_length = 0
+        self.tombstones = 0
+
+    @classmethod
+    def load(cls, index_path: str) -> "LexicalIndex":
+        lexical_index = cls(index_path)
+        if not os.path.exists(index_path):
+            return lexical_index
+        with open(index_path, "rb") as f:
+            data = pickle.load(f)
+        if data.get("version") != cls.VERSION:
+            logger.warning(f"Ignoring lexical index with unsupported version {data.get('version')}")
+            return lexical_index
+        lexical_index.postings = data["postings"]
+        lexical_index._last_ids = data["last_ids"]
+        lexical_index._lengths = np.frombuffer(data["lengths"], dtype=np.int32).copy()
+        lexical_index.max_id = data["max_id"]
+        lexical_index.num_docs = data["num_docs"]
+        lexical_index.total_length = data["total_length"]
+        lexical_index.tombstones = data["tombstones"]
+        logger.info(f"Lexical index loaded from {index_path} ({lexical_index.num_docs} chunks)")
+        return lexical_index
+
+    def exists(self) -> bool:
+        return os.path.exists(self.index_path)
+
+    def __len__(self) -> int:
+        return self.num_docs
+
+    def save(self) -> None:
+        """Write the index atomically, compacting it first if enough chunks were deleted."""
+        if self.tombstones > COMPACT_RATIO * max(self.num_docs, 1):
+            self.compact()
+        data = {
+            "version": self.VERSION,
+            "postings": {term: bytes(postings) for term, postings in self.postings.items()},
+            "last_ids": self._last_ids,
+            "lengths": self._lengths.tobytes(),
+            "max_id": self.max_id,
+            "num_docs": self.num_docs,
+            "total_length": self.total_length,
+            "tombstones": self.tombstones,
+        }
+        os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.index_path)
+        logger.info(f"Lexical index saved to {self.index_path}")
+
+    def add(self, vector_id: int, text: str) -> None:
+        """Index a chunk. Ids must be larger than every id added before."""
+        vector_id = int(vector_id)
+        if vector_id <= self.max_id:
+            raise ValueError(f"Vector id {vector_id} is not larger than the ids already in the lexical index")
+        self.max_id = vector_id
+        tokens = tokenize(text)
+        if not tokens:
+            return
+        if vector_id >= len(self._lengths):
+            grown = np.zeros(max(vector_id + 1, 2 * len(self._lengths)), dtype=np.int32)
+            grown[:len(self._lengths)] = self._lengths
+            self._lengths = grown
+        self._lengths[vector_id] = len(tokens)
+        self.num_docs += 1
+        self.total_length += len(tokens)
+
+        for term, frequency in Counter(tokens).items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = bytearray()
+            elif not isinstance(postings, bytearray):
+                postings = self.postings[term] = bytearray(postings)
+            encode_varint(vector_id - self._last_ids.get(term, 0), postings)
+            encode_varint(frequency, postings)
+            self._last_ids[term] = vector_id
+
+    def delete(self, vector_ids) -> None:
+        for vector_id in vector_ids:
+            vector_id = int(vector_id)
+            if vector_id < len(self._lengths) and self._lengths[vector_id]:
+                self.total_length -= int(self._lengths[vector_id])
+                self._lengths[vector_id] = 0
+                self.num_docs -= 1
+                self.tombstones += 1
+
+    def _decode(self, term: str):
+        """(vector ids, term frequencies) of the live chunks containing term."""
+        values = decode_varints(self.postings[term])
+        vector_ids = np.cumsum(values[0::2])
+        frequencies = values[1::2]
+        live = self._lengths[vector_ids] > 0
+        return vector_ids[live], frequencies[live]
+
+    def compact(self) -> None:
+        """Rewrite the posting lists without the postings of deleted chunks."""
+        postings = {}
+        last_ids = {}
+        for term in self.postings:
+            vector_ids, frequencies = self._decode(term)
+            if not len(vector_ids):
+                continue
+            encoded = bytearray()
+            previous = 0
+            for vector_id, frequency in zip(vector_ids.tolist(), frequencies.tolist()):
+                encode_varint(vector_id - previous, encoded)
+                encode_varint(frequency, encoded)
+                previous = vector_id
+            postings[term] = encoded
+            last_ids[term] = previous
+        logger.info(f"Compacted lexical index: dropped {self.tombstones} deleted chunks, {len(self.postings) - len(postings)} terms")
+        self.postings = postings
+        self._last_ids = last_ids
+        self.tombstones = 0
+
+    def search(self, query_text: str, top_k: int = 3, allowed_ids=None) -> List[Tuple[int, float]]:
+        """Return up to top_k (vector_id, BM25 score) pairs, best first, among allowed_ids if given."""
+        if not self.num_docs:
+            return []
+        average_length = self.total_length / self.num_docs
+        matched_ids = []
+        matched_scores = []
+        for term in set(tokenize(query_text)):
+            if term not in self.postings:
+                continue
+            vector_ids, frequencies = self._decode(term)
+            if not len(vector_ids):
+                continue
+            idf = math.log(1 + (self.num_docs - len(vector_ids) + 0.5) / (len(vector_ids) + 0.5))
+            lengths = self._lengths[vector_ids]
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / average_length)
+            matched_ids.append(vector_ids)
+            matched_scores.append(idf * frequencies * (BM25_K1 + 1) / (frequencies + norm))
+        if not matched_ids:
+            return []
+
+        vector_ids, positions = np.unique(np.concatenate(matched_ids), return_inverse=True)
+        scores = np.bincount(positions, weights=np.concatenate(matched_scores))
+        if allowed_ids is not None:
+            allowed = np.isin(vector_ids, allowed_ids)
+            vector_ids, scores = vector_ids[allowed], scores[allowed]
+        if len(scores) > top_k:
+            best = np.argpartition(-scores, top_k)[:top_k]
+        else:
+            best = np.arange(len(scores))
+        best = best[np.argsort(-scores[best])]
+        return [(int(vector_ids[i]), float(scores[i])) for i in best]
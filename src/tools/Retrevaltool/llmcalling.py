@@ -1,4 +1,5 @@
 from embedding import load_index, query_embeddings
+from context_builder import build_context
 from langchain.prompts import ChatPromptTemplate, HumanMessagePromptTemplate, SystemMessagePromptTemplate
 from langchain.schema.runnable import RunnableSequence
 from langchain_openai import ChatOpenAI
@@ -37,9 +38,43 @@ chain = chat_prompt | llm
 
 # Function to retrieve information
 def retrieve_information(query, results):
+    context, _ = build_context(results)
     response = chain.invoke({
         "query": query,
-        "results": results
+        "results": context
     })
     return response
 
+async def aretrieve_information(query, results):
+    """Async variant of retrieve_information, using the chat model's async client."""
+    context, _ = build_context(results)
+    return await chain.ainvoke({
+        "query": query,
+        "results": context
+    })
+
+def stream_information(query, results):
+    """
+    Streaming variant of retrieve_information.
+
+    Yields {"type": "token", "content": ...} events as the answer is generated,
+    then one {"type": "final", "content": <full answer>} event.
+    """
+    context, _ = build_context(results)
+    parts = []
+    for chunk in chain.stream({"query": query, "results": context}):
+        if chunk.content:
+            parts.append(chunk.content)
+            yield {"type": "token", "content": chunk.content}
+    yield {"type": "final", "content": "".join(parts)}
+
+async def astream_information(query, results):
+    """Async iterator variant of stream_information."""
+    context, _ = build_context(results)
+    parts = []
+    async for chunk in chain.astream({"query": query, "results": context}):
+        if chunk.content:
+            parts.append(chunk.content)
+            yield {"type": "token", "content": chunk.content}
+    yield {"type": "final", "content": "".join(parts)}
+
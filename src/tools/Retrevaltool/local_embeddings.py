@@ -0,0 +1,133 @@
+import queue
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from typing import List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+QUANTIZE_MODES = ("", "int8", "onnx")
+
+
+def model_name_for(model_name: str, quantize: str = "") -> str:
+    """Name identifying the vectors a model produces, used as the embedding cache and manifest key."""
+    return f"{model_name}:{quantize}" if quantize else model_name
+
+
+class LocalEmbeddings:
+    """
+    Sentence embeddings from a local transformers model on CPU.
+
+    Implements the embed_documents / embed_query interface of LangChain
+    embeddings, so it can stand in for OpenAIEmbeddings behind CachedEmbeddings.
+    Vectors are the attention-masked mean of the last hidden states,
+    L2-normalized.
+
+    Documents are sorted by length and batched so each batch is padded only to
+    its own longest text. Concurrent embed_query calls are coalesced by a
+    background thread: whatever queries are waiting when the model becomes free
+    run as one batch, so a lone query never waits and a burst of queries shares
+    forward passes.
+
+    quantize="int8" applies dynamic int8 quantization to the linear layers;
+    quantize="onnx" runs an ONNX Runtime export of the model (needs the optimum
+    package). num_threads sets the torch intra-op thread count.
+    """
+
+    def __init__(self, model_name: str = "sentence-transformers/all-MiniLM-L6-v2", batch_size: int = 32,
+                 max_length: int = 256, num_threads: int = None, quantize: str = ""):
+        if quantize not in QUANTIZE_MODES:
+            raise ValueError(f"Unknown quantization {quantize}, expected one of {QUANTIZE_MODES}")
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        self.torch = torch
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_length = max_length
+        if num_threads:
+            torch.set_num_threads(num_threads)
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.encoder = self._load_model(AutoModel, quantize)
+        # Model name as LangChain embeddings expose it; quantized vectors differ slightly, so they get their own name
+        self.model = model_name_for(model_name, quantize)
+
+        self._queries = queue.Queue()
+        self._worker = threading.Thread(target=self._serve_queries, name="local-embeddings", daemon=True)
+        self._worker.start()
+        logger.info(f"Loaded local embedding model {self.model} ({torch.get_num_threads()} threads)")
+
+    def _load_model(self, auto_model, quantize: str):
+        if quantize == "onnx":
+            try:
+                from optimum.onnxruntime import ORTModelForFeatureExtraction
+            except ImportError as e:
+                raise ImportError("quantize='onnx' needs ONNX Runtime: pip install optimum[onnxruntime]") from e
+            return ORTModelForFeatureExtraction.from_pretrained(self.model_name, export=True)
+
+        model = auto_model.from_pretrained(self.model_name).eval()
+        if quantize == "int8":
+            model = self.torch.quantization.quantize_dynamic(model, {self.torch.nn.Linear}, dtype=self.torch.qint8)
+        return model
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        inputs = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="pt")
+        with self.torch.inference_mode():
+            hidden = self.encoder(**inputs).last_hidden_state
+        mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+        pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+        pooled = self.torch.nn.functional.normalize(pooled, p=2, dim=1)
+        return pooled.numpy().astype(np.float32)
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        # Length-sorted batches keep padding (and wasted compute) to a minimum
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            for i, vector in zip(batch, self._embed_batch([texts[i] for i in batch])):
+                vectors[i] = vector
+        return np.stack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+
+    def _serve_queries(self) -> None:
+        while True:
+            pending = [self._queries.get()]
+            while len(pending) < self.batch_size:
+                try:
+                    pending.append(self._queries.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                vectors = self._embed_batch([text for text, _ in pending])
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+            for (_, future), vector in zip(pending, vectors):
+                future.set_result(vector.tolist())
+
+    def _submit_query(self, text: str) -> Future:
+        future = Future()
+        self._queries.put((text, future))
+        return future
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(list(texts)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._submit_query(text).result()
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed many queries through the query batcher, so each vector matches embed_query's."""
+        futures = [self._submit_query(text) for text in texts]
+        return [future.result() for future in futures]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await asyncio.wrap_future(self._submit_query(text))
@@ -0,0 +1,162 @@
+import os
+import json
+import hashlib
+import logging
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def file_sha256(file_path: str) -> str:
+    """Hash a file in fixed-size blocks so large PDFs are never fully loaded."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def compress_ids(vector_ids) -> List[List[int]]:
+    """Collapse a collection of integer ids into sorted [start, end) ranges."""
+    ranges = []
+    for vector_id in sorted(vector_ids):
+        if ranges and ranges[-1][1] == vector_id:
+            ranges[-1][1] = vector_id + 1
+        else:
+            ranges.append([vector_id, vector_id + 1])
+    return ranges
+
+
+def expand_ids(ranges) -> List[int]:
+    """Inverse of compress_ids."""
+    return [vector_id for start, end in ranges for vector_id in range(start, end)]
+
+
+class ManifestDiff:
+    """Result of comparing the files on disk against the manifest."""
+
+    def __init__(self, added: List[str], changed: List[str], removed: List[str], stats: Dict[str, Dict], refreshed: List[str] = None):
+        self.added = added
+        self.changed = changed
+        self.removed = removed
+        # files whose mtime changed but whose content hash did not
+        self.refreshed = refreshed or []
+        # size/mtime/sha256 of every added or changed file, computed during the diff
+        self.stats = stats
+
+    @property
+    def to_index(self) -> List[str]:
+        return self.added + self.changed
+
+    @property
+    def to_remove(self) -> List[str]:
+        return self.changed + self.removed
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
+
+    def __repr__(self) -> str:
+        return f"ManifestDiff(added={len(self.added)}, changed={len(self.changed)}, removed={len(self.removed)})"
+
+
+class IngestionManifest:
+    """
+    Record of what has been ingested into the FAISS index.
+
+    Each entry is keyed by the PDF path and stores its size, mtime, content hash,
+    the vector id ranges its chunks occupy in the index and its image-only pages,
+    so that only new or changed files are re-embedded and deleted files can be
+    removed from the index.
+    """
+
+    VERSION = 1
+
+    def __init__(self, manifest_path: str, files: Dict[str, Dict] = None, next_id: int = 0, embedding_model: str = None,
+                 shards: int = 1):
+        self.manifest_path = manifest_path
+        self.files = files or {}
+        self.next_id = next_id
+        # Model the indexed vectors were embedded with; None for manifests written before it was recorded
+        self.embedding_model = embedding_model
+        # Number of index shards the files are spread over
+        self.shards = shards
+
+    @classmethod
+    def load(cls, manifest_path: str) -> "IngestionManifest":
+        if not os.path.exists(manifest_path):
+            return cls(manifest_path)
+        with open(manifest_path, "r") as f:
+            data = json.load(f)
+        if data.get("version") != cls.VERSION:
+            logger.warning(f"Ignoring manifest {manifest_path} with unsupported version {data.get('version')}")
+            return cls(manifest_path)
+        return cls(manifest_path, files=data["files"], next_id=data["next_id"], embedding_model=data.get("embedding_model"),
+                   shards=data.get("shards", 1))
+
+    def exists(self) -> bool:
+        return os.path.exists(self.manifest_path)
+
+    def save(self) -> None:
+        """Write the manifest atomically so a crash never leaves a truncated file."""
+        os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": self.VERSION, "next_id": self.next_id, "embedding_model": self.embedding_model,
+                       "shards": self.shards, "files": self.files}, f, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+        logger.info(f"Ingestion manifest saved to {self.manifest_path}")
+
+    def diff(self, file_paths: List[str]) -> ManifestDiff:
+        """
+        Compare the given files against the manifest.
+
+        Size and mtime are checked first; the content hash is only computed when
+        they differ, so an unchanged corpus costs one stat() per file. A file whose
+        mtime changed but whose content did not is refreshed in place and not
+        reported as changed.
+        """
+        added, changed, refreshed, stats = [], [], [], {}
+        current = set()
+        for file_path in file_paths:
+            key = os.path.abspath(file_path)
+            current.add(key)
+            st = os.stat(file_path)
+            entry = self.files.get(key)
+            if entry and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime:
+                continue
+
+            sha256 = file_sha256(file_path)
+            if entry and entry["sha256"] == sha256:
+                entry["size"], entry["mtime"] = st.st_size, st.st_mtime
+                refreshed.append(key)
+                continue
+
+            stats[key] = {"size": st.st_size, "mtime": st.st_mtime, "sha256": sha256}
+            (changed if entry else added).append(key)
+
+        removed = [key for key in self.files if key not in current]
+        return ManifestDiff(added, changed, removed, stats, refreshed)
+
+    def vector_ids(self, file_path: str) -> List[int]:
+        entry = self.files.get(os.path.abspath(file_path))
+        return expand_ids(entry["vector_ids"]) if entry else []
+
+    def allocate_ids(self, count: int) -> Tuple[int, int]:
+        """Reserve a contiguous block of vector ids."""
+        start = self.next_id
+        self.next_id += count
+        return start, self.next_id
+
+    def record(self, file_path: str, stats: Dict, vector_ids, image_pages: List[int] = ()) -> None:
+        self.files[os.path.abspath(file_path)] = dict(
+            stats, vector_ids=compress_ids(vector_ids), image_pages=sorted(image_pages)
+        )
+
+    def image_pages(self) -> Dict[str, List[int]]:
+        """0-based image-only pages per file, found during ingestion and awaiting OCR."""
+        return {path: entry["image_pages"] for path, entry in self.files.items() if entry.get("image_pages")}
+
+    def forget(self, file_path: str) -> None:
+        self.files.pop(os.path.abspath(file_path), None)
@@ -0,0 +1,178 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from embedding_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    __slots__ = ("value", "vector", "expires_at")
+
+    def __init__(self, value, vector, expires_at):
+        self.value = value
+        self.vector = vector
+        self.expires_at = expires_at
+
+
+class QueryCache:
+    """
+    In-memory cache of query answers with an exact and a semantic tier.
+
+    The exact tier matches queries on normalized text (Unicode NFC, collapsed
+    whitespace, case-folded). The semantic tier compares a query embedding with
+    the embeddings of cached queries and returns the closest answer whose cosine
+    similarity reaches similarity_threshold. Entries live for ttl seconds, the
+    least recently used are evicted beyond max_entries, and everything is
+    dropped when a lookup comes in for a new index version. Only lookups move
+    the version: an answer put for another version than the current one (a
+    query that started before a new version was published) is discarded.
+
+    Keys carry a namespace (the search mode) so answers from different modes are
+    not mixed.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 3600.0, similarity_threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Stacked unit vectors of the cached queries, rebuilt lazily after changes
+        self._matrix = None
+        self._matrix_keys = []
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+
+    @staticmethod
+    def _key(query: str, namespace: str):
+        return namespace, normalize_text(query).casefold()
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_version(self, version) -> None:
+        if version != self.version:
+            if self._entries:
+                logger.info(f"Index version changed to {version}, dropping {len(self._entries)} cached answers")
+                self.invalidations += 1
+            self._entries.clear()
+            self._matrix = None
+            self.version = version
+
+    def _remove(self, key) -> None:
+        del self._entries[key]
+        self._matrix = None
+
+    def lookup(self, query: str, namespace: str = "", version=None, embed: Callable = None) -> Tuple[Optional[Any], Any]:
+        """
+        Return (cached answer or None, query embedding or None).
+
+        embed(query) is only called when the exact tier misses; its result is
+        returned so the caller can reuse it for the search and for put().
+        """
+        value = self._get_exact(query, namespace, version)
+        if value is not None:
+            return value, None
+        query_vector = embed(query) if embed is not None else None
+        return self._get_similar(query_vector, namespace, version), query_vector
+
+    async def alookup(self, query: str, namespace: str = "", version=None, embed: Callable = None) -> Tuple[Optional[Any], Any]:
+        """lookup with an async embed function."""
+        value = self._get_exact(query, namespace, version)
+        if value is not None:
+            return value, None
+        query_vector = await embed(query) if embed is not None else None
+        return self._get_similar(query_vector, namespace, version), query_vector
+
+    def _get_exact(self, query: str, namespace: str, version) -> Optional[Any]:
+        with self._lock:
+            self._check_version(version)
+            key = self._key(query, namespace)
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry.value
+
+    def _get_similar(self, query_vector, namespace: str, version) -> Optional[Any]:
+        """The answer of the most similar cached query above the threshold; counts a miss otherwise."""
+        with self._lock:
+            self._check_version(version)
+            if query_vector is None:
+                self.misses += 1
+                return None
+            if self._matrix is None:
+                self._matrix_keys = [key for key, entry in self._entries.items() if entry.vector is not None]
+                self._matrix = np.stack([self._entries[key].vector for key in self._matrix_keys]) if self._matrix_keys else None
+            if self._matrix is not None:
+                similarities = self._matrix @ self._unit(query_vector)
+                now = time.monotonic()
+                for i in np.argsort(-similarities):
+                    if similarities[i] < self.similarity_threshold:
+                        break
+                    key = self._matrix_keys[i]
+                    entry = self._entries.get(key)
+                    if key[0] != namespace or entry is None or entry.expires_at <= now:
+                        continue
+                    self._entries.move_to_end(key)
+                    self.semantic_hits += 1
+                    return entry.value
+            self.misses += 1
+            return None
+
+    def put(self, query: str, value: Any, namespace: str = "", version=None, query_vector=None) -> None:
+        with self._lock:
+            if version != self.version:
+                self.stale_puts += 1
+                return
+            key = self._key(query, namespace)
+            vector = self._unit(query_vector) if query_vector is not None else None
+            self._entries[key] = _Entry(value, vector, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            self._matrix = None
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.exact_hits + self.semantic_hits
+        lookups = hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "stale_puts": self.stale_puts,
+        }
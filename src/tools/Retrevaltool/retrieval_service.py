@@ -0,0 +1,210 @@
+import os
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from docstore import DocumentStore
+from embedding import (
+    FAISS_SHARDS,
+    FAISS_USE_MMAP,
+    RETRIEVAL_MODE,
+    load_index,
+    load_sharded_index,
+    query_embeddings_batch,
+    query_index,
+    read_index_version,
+    vector_store_path,
+)
+from lexical_index import LexicalIndex
+from vector_store import VectorStore
+from sharded_index import ShardedIndex, shard_path
+
+logger = logging.getLogger(__name__)
+
+# Threads running FAISS searches for async callers; FAISS releases the GIL while searching
+SEARCH_THREADS = int(os.getenv("SEARCH_THREADS", 8))
+
+
+class IndexSnapshot:
+    """One loaded version of the index, its lexical index, document store and vector store, reference counted by in-flight queries."""
+
+    def __init__(self, index, docstore, version: int, lexical_index=None, vector_store=None):
+        self.index = index
+        self.docstore = docstore
+        self.lexical_index = lexical_index
+        self.vector_store = vector_store
+        self.version = version
+        self._users = 0
+        self._retired = False
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self._lock:
+            self._users += 1
+
+    def release(self) -> None:
+        with self._lock:
+            self._users -= 1
+            close = self._retired and self._users == 0
+        if close:
+            self._close()
+
+    def retire(self) -> None:
+        """Close once the last query using this snapshot finishes."""
+        with self._lock:
+            self._retired = True
+            close = self._users == 0
+        if close:
+            self._close()
+
+    def _close(self) -> None:
+        self.docstore.close()
+        if isinstance(self.index, ShardedIndex):
+            self.index.close()
+        if self.vector_store is not None:
+            self.vector_store.close()
+        logger.info(f"Released index version {self.version}")
+
+
+class RetrievalService:
+    """
+    Long-lived, thread-safe handle on the published FAISS index.
+
+    The index is loaded once and kept resident; queries run against an
+    immutable snapshot and never touch the index file. A background thread
+    polls the version file written by embedding.save_index and atomically swaps
+    in the new version; snapshots still in use by running queries are closed
+    when those queries finish.
+
+    A quantized index is served with the float32 originals saved next to it,
+    memory-mapped, for exact re-ranking of its top candidates; use_mmap also
+    maps the index file itself instead of reading it into RAM.
+
+    With num_shards > 1 every shard is loaded and queries fan out over them on a
+    pool of one thread per shard (up to the core count).
+    """
+
+    def __init__(self, index_path: str, doc_store_path: str, lexical_index_path: str = None, use_mmap: bool = FAISS_USE_MMAP,
+                 reload_interval: float = 2.0, mode: str = RETRIEVAL_MODE, num_shards: int = FAISS_SHARDS):
+        self.index_path = index_path
+        self.doc_store_path = doc_store_path
+        self.lexical_index_path = lexical_index_path
+        self.mode = mode
+        self.use_mmap = use_mmap
+        self.num_shards = num_shards
+        self.reload_interval = reload_interval
+        self._snapshot = None
+        self._swap_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        # Worker threads are only started once asearch is used
+        self._executor = ThreadPoolExecutor(max_workers=SEARCH_THREADS, thread_name_prefix="faiss-search")
+        self._shard_executor = None
+        if num_shards > 1:
+            self._shard_executor = ThreadPoolExecutor(max_workers=min(num_shards, os.cpu_count() or 1),
+                                                      thread_name_prefix="faiss-shard")
+
+        self.refresh()
+        self._watcher = threading.Thread(target=self._watch, name="index-reload", daemon=True)
+        self._watcher.start()
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version if self._snapshot else 0
+
+    def refresh(self) -> bool:
+        """Swap in the published index if its version changed. Returns True if a new version was loaded."""
+        with self._reload_lock:
+            version = read_index_version(self.index_path)
+            if self._snapshot is not None and self._snapshot.version == version:
+                return False
+            if not any(os.path.exists(shard_path(self.index_path, shard, self.num_shards)) for shard in range(self.num_shards)):
+                return False
+
+            # Load outside the swap lock so queries keep running on the old version meanwhile
+            if self.num_shards > 1:
+                index = load_sharded_index(self.index_path, self.num_shards, self.use_mmap, self._shard_executor)
+                docstore, vector_store = DocumentStore(self.doc_store_path), None
+            else:
+                index, docstore = load_index(self.index_path, self.doc_store_path, use_mmap=self.use_mmap)
+                vector_store = VectorStore.open(vector_store_path(self.index_path))
+            lexical_index = LexicalIndex.load(self.lexical_index_path) if self.lexical_index_path else None
+            with self._swap_lock:
+                old, self._snapshot = self._snapshot, IndexSnapshot(index, docstore, version, lexical_index, vector_store)
+            logger.info(f"Serving index version {version} ({index.ntotal} vectors)")
+        if old is not None:
+            old.retire()
+        return True
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.reload_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Index reload failed, still serving version {self.version}: {e}")
+
+    @contextmanager
+    def snapshot(self):
+        """Pin the current index version for the duration of a query."""
+        with self._swap_lock:
+            snapshot = self._snapshot
+            if snapshot is None:
+                raise FileNotFoundError(f"No index has been published at {self.index_path}")
+            snapshot.acquire()
+        try:
+            yield snapshot
+        finally:
+            snapshot.release()
+
+    def search(self, query_text: str, top_k: int = 3, mode: str = None, snapshot: IndexSnapshot = None, **search_options):
+        """
+        Search the current index version in the given mode (the service's default mode if None).
+
+        A snapshot pinned by the caller with snapshot() is searched instead of
+        the current version, so the caller knows which version answered.
+        search_options (nprobe, ef_search, candidates, rerank_factor, search_filter, mmr_lambda)
+        go to embedding.query_index.
+        """
+        if snapshot is None:
+            with self.snapshot() as snapshot:
+                return self.search(query_text, top_k, mode, snapshot, **search_options)
+        if (mode or self.mode) != "lexical":
+            search_options.setdefault("vector_store", snapshot.vector_store)
+        return query_index(snapshot.index, snapshot.lexical_index, query_text, snapshot.docstore, top_k,
+                           mode or self.mode, **search_options)
+
+    async def asearch(self, query_text: str, top_k: int = 3, mode: str = None, snapshot: IndexSnapshot = None,
+                      **search_options):
+        """
+        search for async callers, run on the service's search thread pool.
+
+        Pass query_vector (embedded with the async client) so the worker thread
+        only does the FAISS and document store work.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor,
+                                          lambda: self.search(query_text, top_k, mode, snapshot, **search_options))
+
+    def search_batch(self, query_texts, top_k: int = 3, **search_options):
+        """
+        Search many queries in one embedding call and one FAISS search.
+
+        The returned BatchSearchResults keeps the snapshot's document store, so
+        materialize documents before the next index version is swapped in.
+        """
+        with self.snapshot() as snapshot:
+            return query_embeddings_batch(snapshot.index, query_texts, snapshot.docstore, top_k,
+                                          vector_store=snapshot.vector_store, **search_options)
+
+    def close(self) -> None:
+        self._stop.set()
+        self._watcher.join()
+        self._executor.shutdown()
+        with self._swap_lock:
+            old, self._snapshot = self._snapshot, None
+        if old is not None:
+            old.retire()
+        if self._shard_executor is not None:
+            self._shard_executor.shutdown()
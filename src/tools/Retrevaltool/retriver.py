@@ -1,47 +1,335 @@
 import os
-from typing import List, Dict, Any
+import asyncio
+import threading
+from typing import List, Dict, Any, AsyncIterator, Iterator
 import logging
-from dataprocessing import load_and_process_pdf
-from embedding import calculate_embedding, query_embeddings, load_index
+from dataprocessing import stream_pdf_chunks
+from docstore import DocumentStore, SearchFilter
+from embedding import (
+    FAISS_SHARDS,
+    OPENAI_EMBEDDING_MODEL,
+    add_embedding_stream,
+    embeddings,
+    load_index_file,
+    open_vector_store,
+    optimize_index,
+    publish_index,
+    remove_embeddings,
+    vector_store_path,
+    write_index,
+)
+from lexical_index import LexicalIndex
+from vector_store import VectorStore
+from sharded_index import shard_of, shard_path
+from retrieval_service import RetrievalService
+from manifest import IngestionManifest
+from query_cache import QueryCache
 from llmcalling import retrieve_information
-from citation import retrieve_information_citation
+from citation import (
+    aretrieve_information_citation,
+    astream_information_citation,
+    retrieve_information_citation,
+    stream_information_citation,
+)
 
 logger = logging.getLogger(__name__)
 
+# Rewrite the document store text once deleted chunks leave this much garbage
+DOCSTORE_COMPACT_BYTES = 64 * 1024 * 1024
+
+# Answers cached in front of query_index; a new query reuses the answer of a
+# cached one whose embedding is at least QUERY_CACHE_SIMILARITY cosine-similar
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", 1000))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", 3600))
+QUERY_CACHE_SIMILARITY = float(os.getenv("QUERY_CACHE_SIMILARITY", 0.95))
+
 class RetrievalTool:
-    def __init__(self, input_dir: str = r"data\input", index_path: str = "data/output/faiss_index.index", doc_map_path: str = "data/output/doc_map.json"):
+    def __init__(self, input_dir: str = r"data\input", index_path: str = "data/output/faiss_index.index", doc_store_path: str = "data/output/docstore.sqlite", manifest_path: str = "data/output/manifest.json", lexical_index_path: str = "data/output/lexical_index.bin"):
         self.input_dir = input_dir
         self.index_path = index_path
-        self.doc_map_path = doc_map_path
+        self.doc_store_path = doc_store_path
+        self.manifest_path = manifest_path
+        self.lexical_index_path = lexical_index_path
+        self._service = None
+        self._service_lock = threading.Lock()
+        # One ingestion at a time when queries from several threads or tasks call _run
+        self._index_lock = threading.Lock()
+        self.query_cache = QueryCache(QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_TTL, QUERY_CACHE_SIMILARITY)
+
+    @property
+    def service(self) -> RetrievalService:
+        """Resident index handle, created on first use and hot-reloaded when ingestion publishes."""
+        if self._service is None:
+            with self._service_lock:
+                if self._service is None:
+                    self._service = RetrievalService(self.index_path, self.doc_store_path, self.lexical_index_path)
+        return self._service
+
+    def _load_manifest(self) -> IngestionManifest:
+        """
+        Load the ingestion manifest, discarding any index it does not describe.
+
+        An index without a manifest was built by the old re-index-everything code
+        and may hold duplicate vectors, so it is rebuilt from scratch. So is an
+        index embedded with another model than the configured one, since its
+        vectors cannot be compared with new query embeddings, and one split over
+        another number of shards than FAISS_SHARDS.
+        """
+        manifest = IngestionManifest.load(self.manifest_path)
+        shard_paths = [shard_path(self.index_path, shard, manifest.shards) for shard in range(manifest.shards)]
+        index_missing = not any(os.path.exists(path) for path in shard_paths)
+        indexed_model = manifest.embedding_model or OPENAI_EMBEDDING_MODEL
+        if (manifest.exists() and not (index_missing and manifest.next_id > 0) and indexed_model == embeddings.model
+                and manifest.shards == FAISS_SHARDS):
+            manifest.embedding_model = embeddings.model
+            return manifest
+        if manifest.exists() and indexed_model != embeddings.model:
+            logger.info(f"Embedding model changed from {indexed_model} to {embeddings.model}")
+        if manifest.exists() and manifest.shards != FAISS_SHARDS:
+            logger.info(f"Shard count changed from {manifest.shards} to {FAISS_SHARDS}")
+
+        logger.info("No usable ingestion manifest found, rebuilding the index from scratch")
+        for path in shard_paths + [self.lexical_index_path]:
+            if os.path.exists(path):
+                os.remove(path)
+        for path in shard_paths:
+            VectorStore.remove(vector_store_path(path))
+        DocumentStore.remove(self.doc_store_path)
+        return IngestionManifest(self.manifest_path, embedding_model=embeddings.model, shards=FAISS_SHARDS)
+
+    def _load_lexical_index(self, docstore: DocumentStore) -> LexicalIndex:
+        """Load the BM25 index, building it from the document store if it predates lexical search."""
+        lexical_index = LexicalIndex.load(self.lexical_index_path)
+        if not lexical_index.exists() and len(docstore):
+            logger.info("Building the lexical index from the document store")
+            for vector_id, document in docstore.items():
+                lexical_index.add(vector_id, document['text'])
+        return lexical_index
 
     def index_pdfs(self) -> None:
-        """Index all PDFs in the input directory."""
+        """Incrementally index the PDFs in the input directory, embedding only new or changed files."""
+        with self._index_lock:
+            self._index_pdfs()
+
+    def _index_pdfs(self) -> None:
         pdf_files = [os.path.join(self.input_dir, f) for f in os.listdir(self.input_dir) if f.endswith('.pdf')]
-        
-        all_chunks = []
-        all_metadata = []
-        
-        for pdf_file in pdf_files:
-            logger.info(f"Processing {pdf_file}...")
-            chunks, metadata = load_and_process_pdf(pdf_file)
-            all_chunks.extend(chunks)
-            all_metadata.extend(metadata)
-        
-        # Calculate embeddings for all chunks
-        calculate_embedding(all_chunks, all_metadata)
+
+        manifest = self._load_manifest()
+        changes = manifest.diff(pdf_files)
+        if not changes:
+            if changes.refreshed or not manifest.exists():
+                manifest.save()
+            logger.info("Index is up to date, skipping ingestion")
+            return
+        logger.info(f"Ingestion changes: {changes}")
+
+        docstore = DocumentStore(self.doc_store_path)
+        lexical_index = self._load_lexical_index(docstore)
+
+        # Parsing runs ahead of embedding on a worker pool, bounded so memory stays flat
+        file_vector_ids = {pdf_file: [] for pdf_file in changes.to_index}
+        file_image_pages = {pdf_file: [] for pdf_file in changes.to_index}
+        # Files that could not be opened or had a page batch fail to parse
+        failed_files = set()
+        parsed_files = set()
+
+        def chunk_stream(pdf_files):
+            for pdf_file, chunks, metadata, image_pages, error in stream_pdf_chunks(pdf_files):
+                if error is not None:
+                    logger.warning(f"Failed to parse part of {pdf_file}, it will be retried on the next run: {error}")
+                    failed_files.add(pdf_file)
+                parsed_files.add(pdf_file)
+                start, end = manifest.allocate_ids(len(chunks))
+                file_vector_ids[pdf_file].extend(range(start, end))
+                file_image_pages[pdf_file].extend(image_pages)
+                for chunk, meta, vector_id in zip(chunks, metadata, range(start, end)):
+                    # The keyword index is built from the same chunks as the vectors
+                    lexical_index.add(vector_id, chunk)
+                    yield chunk, (vector_id, meta)
+
+        # Only the shards holding changed files are loaded, updated and rewritten
+        shard_files = {}
+        for pdf_file in changes.to_remove + changes.to_index:
+            shard_files.setdefault(shard_of(pdf_file, manifest.shards), set()).add(pdf_file)
+
+        written = False
+        try:
+            for shard, pdf_files in sorted(shard_files.items()):
+                path = shard_path(self.index_path, shard, manifest.shards)
+                index = load_index_file(path)
+                vector_store = open_vector_store(path, index)
+
+                # Drop vectors of changed and deleted files
+                stale_ids = [vector_id for pdf_file in changes.to_remove if pdf_file in pdf_files
+                             for vector_id in manifest.vector_ids(pdf_file)]
+                index = remove_embeddings(index, docstore, stale_ids, vector_store)
+                lexical_index.delete(stale_ids)
+
+                # Calculate embeddings for the new chunks only
+                to_index = [pdf_file for pdf_file in changes.to_index if pdf_file in pdf_files]
+                if to_index:
+                    logger.info(f"Processing {len(to_index)} new or changed PDFs into shard {shard}...")
+                    index = add_embedding_stream(index, docstore, chunk_stream(to_index), vector_store=vector_store)
+                    for pdf_file in to_index:
+                        if pdf_file not in parsed_files:
+                            logger.warning(f"Could not open {pdf_file}, it will be retried on the next run")
+                            failed_files.add(pdf_file)
+                    # The chunks a failed file did yield are taken out again so the retry starts clean
+                    failed_ids = [vector_id for pdf_file in to_index if pdf_file in failed_files
+                                  for vector_id in file_vector_ids[pdf_file]]
+                    index = remove_embeddings(index, docstore, failed_ids, vector_store)
+                    lexical_index.delete(failed_ids)
+                index = optimize_index(index, vector_store=vector_store)
+                if index is not None:
+                    # Chunks are committed before the shard that points at them is written
+                    docstore.commit()
+                    write_index(index, path, vector_store)
+                    written = True
+                if vector_store is not None:
+                    vector_store.close()
+
+                # Record the shard's files and the ids they took as soon as it is written, so
+                # a failure in a later shard never hands this shard's ids out a second time.
+                # Failed files are left out of the manifest so the next run ingests them again.
+                for pdf_file in pdf_files:
+                    if pdf_file in file_vector_ids and pdf_file not in failed_files:
+                        manifest.record(pdf_file, changes.stats[pdf_file], file_vector_ids[pdf_file], file_image_pages[pdf_file])
+                    else:
+                        manifest.forget(pdf_file)
+                lexical_index.save()
+                manifest.save()
+
+            if docstore.dead_bytes() > DOCSTORE_COMPACT_BYTES:
+                docstore.compact()
+            docstore.commit()
+            if written:
+                publish_index(self.index_path)
+        finally:
+            # Uncommitted chunks of a failed shard are rolled back
+            docstore.close()
         logger.info("PDF indexing completed")
 
-    def query_index(self, query: str) -> Dict[str, Any]:
-        """Query the index with the given query."""
-        index, documents, ids = load_index(self.index_path, self.doc_map_path)
-        results = query_embeddings(index, query, documents, ids)
+        # Serve the new version right away instead of waiting for the watcher
+        if self._service is not None:
+            self._service.refresh()
 
-        response = retrieve_information_citation(query, results)
-        return {
+    @staticmethod
+    def _cache_namespace(mode: str, search_filter: SearchFilter = None) -> str:
+        """Answers are only reused for the same search mode and filter."""
+        return mode if search_filter is None else f"{mode}|{search_filter!r}"
+
+    def _retrieve(self, query: str, mode: str = None, search_filter: SearchFilter = None):
+        """
+        Look the query up in the answer cache and search the index on a miss.
+
+        Returns (cached answer or None, search results, cache key) where the cache
+        key is what _remember needs to store the new answer. The lookup and the
+        search use one pinned index snapshot, and the answer is cached under
+        that snapshot's version, so a version published meanwhile cannot be
+        mixed up with it.
+        """
+        mode = mode or self.service.mode
+        namespace = self._cache_namespace(mode, search_filter)
+        # Lexical search needs no embedding, so it only uses the exact tier
+        embed = embeddings.embed_query if mode != "lexical" else None
+        with self.service.snapshot() as snapshot:
+            cached, query_vector = self.query_cache.lookup(query, namespace, snapshot.version, embed)
+            if cached is not None:
+                logger.info(f"Answered from query cache: {self.query_cache.stats()}")
+                return {**cached, "query": query}, None, None
+            results = self.service.search(query, mode=mode, snapshot=snapshot, query_vector=query_vector,
+                                          search_filter=search_filter)
+        return None, results, (namespace, snapshot.version, query_vector)
+
+    async def _aretrieve(self, query: str, mode: str = None, search_filter: SearchFilter = None):
+        """_retrieve with the async embedding client and the FAISS search on the service's thread pool."""
+        service = self._service or await asyncio.to_thread(lambda: self.service)
+        mode = mode or service.mode
+        namespace = self._cache_namespace(mode, search_filter)
+        embed = embeddings.aembed_query if mode != "lexical" else None
+        with service.snapshot() as snapshot:
+            cached, query_vector = await self.query_cache.alookup(query, namespace, snapshot.version, embed)
+            if cached is not None:
+                logger.info(f"Answered from query cache: {self.query_cache.stats()}")
+                return {**cached, "query": query}, None, None
+            results = await service.asearch(query, mode=mode, snapshot=snapshot, query_vector=query_vector,
+                                            search_filter=search_filter)
+        return None, results, (namespace, snapshot.version, query_vector)
+
+    def _remember(self, query: str, response: Dict[str, Any], cache_key) -> Dict[str, Any]:
+        result = {
             "query": query,
             "response": response['content'],
-            "citations": response['citations']
+            "citations": response['citations'],
+            "sources": response['sources']
         }
+        namespace, version, query_vector = cache_key
+        self.query_cache.put(query, result, namespace, version, query_vector)
+        return result
+
+    def query_index(self, query: str, mode: str = None, search_filter: SearchFilter = None) -> Dict[str, Any]:
+        """
+        Query the index with the given query, in "vector", "lexical" or "hybrid" mode (RETRIEVAL_MODE if None).
+
+        search_filter restricts retrieval to chunks of given files, pages or ingestion dates.
+
+        Answers are cached per index version: a repeated query, or one whose embedding
+        is close enough to a cached one, skips the search and the LLM call.
+        """
+        cached, results, cache_key = self._retrieve(query, mode, search_filter)
+        if cached is not None:
+            return cached
+
+        response = retrieve_information_citation(query, results)
+        return self._remember(query, response, cache_key)
+
+    async def aquery_index(self, query: str, mode: str = None, search_filter: SearchFilter = None) -> Dict[str, Any]:
+        """
+        Async variant of query_index.
+
+        The query embedding and the LLM call use the async OpenAI clients and the
+        FAISS search runs on a thread pool, so one event loop can serve many
+        concurrent queries without holding a thread per query.
+        """
+        cached, results, cache_key = await self._aretrieve(query, mode, search_filter)
+        if cached is not None:
+            return cached
+
+        response = await aretrieve_information_citation(query, results)
+        return self._remember(query, response, cache_key)
+
+    def stream_query_index(self, query: str, mode: str = None, search_filter: SearchFilter = None) -> Iterator[Dict[str, Any]]:
+        """
+        Streaming variant of query_index.
+
+        Yields {"type": "token", "content": ...} events while the answer is generated,
+        then a {"type": "final", "query", "response", "citations", "sources"} event with the same
+        fields query_index returns. A cached answer is yielded as the final event alone.
+        """
+        cached, results, cache_key = self._retrieve(query, mode, search_filter)
+        if cached is not None:
+            yield {"type": "final", **cached}
+            return
+
+        for event in stream_information_citation(query, results):
+            if event["type"] == "token":
+                yield event
+            else:
+                yield {"type": "final", **self._remember(query, event, cache_key)}
+
+    async def astream_query_index(self, query: str, mode: str = None,
+                                  search_filter: SearchFilter = None) -> AsyncIterator[Dict[str, Any]]:
+        """Async iterator variant of stream_query_index."""
+        cached, results, cache_key = await self._aretrieve(query, mode, search_filter)
+        if cached is not None:
+            yield {"type": "final", **cached}
+            return
+
+        async for event in astream_information_citation(query, results):
+            if event["type"] == "token":
+                yield event
+            else:
+                yield {"type": "final", **self._remember(query, event, cache_key)}
 
     def _run(self, query: str) -> Dict[str, Any]:
         """
@@ -50,12 +338,22 @@ class RetrievalTool:
         :param query: The query to search for.
         :return: A dictionary containing query, response, and citations.
         """
-        # Index PDFs before querying
+        # Pick up new, changed or deleted PDFs before querying; a no-op when nothing changed
         self.index_pdfs()
         
         # Query the index with the provided query
         return self.query_index(query)
 
+    async def _arun(self, query: str) -> Dict[str, Any]:
+        """Async variant of _run; indexing runs in a worker thread."""
+        await asyncio.to_thread(self.index_pdfs)
+        return await self.aquery_index(query)
+
+    def stream_run(self, query: str) -> Iterator[Dict[str, Any]]:
+        """Streaming variant of _run: index any changed PDFs, then stream the answer events."""
+        self.index_pdfs()
+        yield from self.stream_query_index(query)
+
 
 # # Example usage as a tool in your agent
 # if __name__ == "__main__":
@@ -0,0 +1,97 @@
+import os
+import zlib
+import logging
+
+import numpy as np
+
+from ann_index import MISSING_DISTANCE, RERANK_FACTOR, id_selector, search, search_parameters
+
+logger = logging.getLogger(__name__)
+
+
+def shard_path(index_path: str, shard: int, num_shards: int) -> str:
+    """Index file of a shard; a single shard keeps the unsharded path."""
+    if num_shards == 1:
+        return index_path
+    root, ext = os.path.splitext(index_path)
+    return f"{root}.shard{shard}{ext}"
+
+
+def shard_of(file_path: str, num_shards: int) -> int:
+    """Shard a file's vectors live in, from a stable hash of its name."""
+    return zlib.crc32(os.path.basename(file_path).encode("utf-8")) % num_shards
+
+
+def merge_results(distances, vector_ids, top_k: int):
+    """Merge per-shard (n_queries, k) search results into the overall top_k by distance."""
+    distances = np.concatenate(distances, axis=1)
+    vector_ids = np.concatenate(vector_ids, axis=1)
+    order = np.argsort(distances, axis=1, kind="stable")[:, :top_k]
+    return np.take_along_axis(distances, order, axis=1), np.take_along_axis(vector_ids, order, axis=1)
+
+
+class ShardedIndex:
+    """
+    Several FAISS indexes searched as one.
+
+    shards is a list of (index, vector_store) pairs; vector ids are global, so
+    each id lives in exactly one shard. A query fans out to every non-empty
+    shard on the executor (FAISS releases the GIL while searching, so shards are
+    searched on all cores at once), each shard returns its own top_k, re-ranked
+    against its vector store when quantized, and the results are merged by
+    distance.
+    """
+
+    def __init__(self, shards, executor=None):
+        self.shards = shards
+        self.executor = executor
+
+    @property
+    def ntotal(self) -> int:
+        return sum(index.ntotal for index, _ in self.shards)
+
+    @property
+    def d(self) -> int:
+        return self.shards[0][0].d
+
+    def search(self, query_matrix: np.ndarray, top_k: int, nprobe: int = None, ef_search: int = None,
+               rerank_factor: int = RERANK_FACTOR, allowed_ids=None):
+        """Search every shard and merge; allowed_ids restricts the search to those vector ids."""
+        # One selector, read concurrently by all shards
+        selector = id_selector(allowed_ids) if allowed_ids is not None else None
+
+        def search_shard(shard):
+            index, vector_store = shard
+            return search(index, query_matrix, top_k, search_parameters(index, nprobe, ef_search, selector), vector_store,
+                          rerank_factor, allowed_ids)
+
+        shards = [shard for shard in self.shards if shard[0].ntotal]
+        if not shards:
+            return (np.full((len(query_matrix), top_k), MISSING_DISTANCE, dtype=np.float32),
+                    np.full((len(query_matrix), top_k), -1, dtype=np.int64))
+        if self.executor is not None and len(shards) > 1:
+            results = list(self.executor.map(search_shard, shards))
+        else:
+            results = [search_shard(shard) for shard in shards]
+        return merge_results([distances for distances, _ in results], [vector_ids for _, vector_ids in results], top_k)
+
+    def get_vectors(self, vector_ids):
+        """(vectors, found) for the ids from the shards' vector stores, as VectorStore.get returns."""
+        vectors, found = None, np.zeros(len(vector_ids), dtype=bool)
+        for _, vector_store in self.shards:
+            if vector_store is None or not len(vector_store):
+                continue
+            shard_vectors, shard_found = vector_store.get(vector_ids)
+            if vectors is None:
+                vectors = shard_vectors
+            else:
+                vectors[shard_found] = shard_vectors[shard_found]
+            found |= shard_found
+        if vectors is None:
+            vectors = np.zeros((len(vector_ids), self.d), dtype=np.float32)
+        return vectors, found
+
+    def close(self) -> None:
+        for _, vector_store in self.shards:
+            if vector_store is not None:
+                vector_store.close()
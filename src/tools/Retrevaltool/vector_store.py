@@ -0,0 +1,179 @@
+import os
+import glob
+import json
+import logging
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Vectors read per block while compacting
+COMPACT_BLOCK_ROWS = 65_536
+
+
+class VectorStore:
+    """
+    Float32 originals of the indexed vectors on disk, addressed by vector id.
+
+    Vectors and their ids are appended to two flat files that are memory-mapped
+    for reads, so only the rows a query touches are paged in. A small JSON
+    header records the dimension, the committed row count and the file
+    generation; rows written after the last commit are ignored by readers.
+
+    The store is what lets the FAISS index keep compressed codes (float16, int8
+    or PQ) in RAM: the top candidates of a search are re-ranked with the exact
+    distances to these originals, and index rebuilds start from them instead of
+    from reconstructed codes. compact() drops deleted rows into a new generation
+    so readers that still map the old files are unaffected.
+    """
+
+    def __init__(self, store_path: str):
+        self.store_path = store_path
+        self._lock = threading.RLock()
+        self.dim = None
+        self.count = 0
+        self.generation = 0
+        if os.path.exists(store_path):
+            with open(store_path) as f:
+                header = json.load(f)
+            self.dim, self.count, self.generation = header["dim"], header["count"], header["generation"]
+        self._vector_file = None
+        self._id_file = None
+        self._uncommitted = 0
+        self._mapped = None
+
+    @classmethod
+    def open(cls, store_path: str):
+        """Open a store for reading, mapping its committed rows now; None if there is no store."""
+        if not os.path.exists(store_path):
+            return None
+        vector_store = cls(store_path)
+        if vector_store.count:
+            # Map before a later compaction can replace this generation's files
+            vector_store._map()
+        return vector_store
+
+    def _paths(self, generation: int):
+        return f"{self.store_path}.{generation}.f32", f"{self.store_path}.{generation}.ids"
+
+    def exists(self) -> bool:
+        return os.path.exists(self.store_path)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def add(self, vector_ids, vectors: np.ndarray) -> None:
+        """Append vectors under the given ids. Call commit() to make them visible to readers."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Vector store holds {self.dim}-d vectors, got {vectors.shape[1]}-d")
+            if self._vector_file is None:
+                vector_path, id_path = self._paths(self.generation)
+                self._vector_file = open(vector_path, "ab")
+                self._id_file = open(id_path, "ab")
+                # Drop rows a crashed writer appended after the last commit
+                self._vector_file.truncate(self.count * self.dim * 4)
+                self._id_file.truncate(self.count * 8)
+            self._vector_file.write(vectors.tobytes())
+            self._id_file.write(np.asarray(vector_ids, dtype=np.int64).tobytes())
+            self._uncommitted += len(vectors)
+
+    def _write_header(self) -> None:
+        tmp_path = f"{self.store_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"dim": self.dim, "count": self.count, "generation": self.generation}, f)
+        os.replace(tmp_path, self.store_path)
+
+    def commit(self) -> None:
+        with self._lock:
+            if self._vector_file is None:
+                return
+            for f in (self._vector_file, self._id_file):
+                f.flush()
+                os.fsync(f.fileno())
+            self.count += self._uncommitted
+            self._uncommitted = 0
+            self._write_header()
+
+    def _map(self):
+        """(vectors, sorted ids, row of each sorted id) for the committed rows, re-mapped when the store grew."""
+        with self._lock:
+            if self._mapped is None or self._mapped[0].shape[0] != self.count:
+                vector_path, id_path = self._paths(self.generation)
+                vectors = np.memmap(vector_path, dtype=np.float32, mode="r", shape=(self.count, self.dim))
+                ids = np.fromfile(id_path, dtype=np.int64, count=self.count)
+                # Batches are embedded concurrently, so rows are not in id order
+                order = np.argsort(ids, kind="stable")
+                self._mapped = (vectors, ids[order], order)
+            return self._mapped
+
+    def get(self, vector_ids):
+        """Return (vectors, found): float32 rows for the ids, and a mask of the ids the store holds."""
+        vector_ids = np.asarray(vector_ids, dtype=np.int64)
+        if not self.count:
+            return np.zeros((len(vector_ids), self.dim or 0), dtype=np.float32), np.zeros(len(vector_ids), dtype=bool)
+        vectors, sorted_ids, order = self._map()
+        positions = np.minimum(np.searchsorted(sorted_ids, vector_ids), len(sorted_ids) - 1)
+        found = sorted_ids[positions] == vector_ids
+        rows = order[positions]
+        result = np.zeros((len(vector_ids), self.dim), dtype=np.float32)
+        if found.any():
+            # Read the touched rows in file order
+            wanted = np.unique(rows[found])
+            result[found] = vectors[wanted][np.searchsorted(wanted, rows[found])]
+        return result, found
+
+    def compact(self, live_ids) -> None:
+        """Rewrite the store with only the rows of live_ids, as a new generation."""
+        with self._lock:
+            self.commit()
+            self._close_files()
+            old_generation = self.generation
+            vectors, ids = self._map()[0], np.fromfile(self._paths(old_generation)[1], dtype=np.int64, count=self.count)
+            keep = np.flatnonzero(np.isin(ids, np.asarray(live_ids, dtype=np.int64)))
+            vector_path, id_path = self._paths(old_generation + 1)
+            with open(vector_path, "wb") as vector_file, open(id_path, "wb") as id_file:
+                for start in range(0, len(keep), COMPACT_BLOCK_ROWS):
+                    rows = keep[start:start + COMPACT_BLOCK_ROWS]
+                    vector_file.write(np.ascontiguousarray(vectors[rows]).tobytes())
+                    id_file.write(ids[rows].tobytes())
+                for f in (vector_file, id_file):
+                    f.flush()
+                    os.fsync(f.fileno())
+            dropped = self.count - len(keep)
+            self.generation, self.count = old_generation + 1, len(keep)
+            self._write_header()
+            self._mapped = None
+            self._remove_generations(keep=self.generation)
+            logger.info(f"Compacted vector store: dropped {dropped} deleted vectors, {self.count} remain")
+
+    def _remove_generations(self, keep: int) -> None:
+        for path in glob.glob(f"{glob.escape(self.store_path)}.*.f32") + glob.glob(f"{glob.escape(self.store_path)}.*.ids"):
+            if path not in self._paths(keep):
+                try:
+                    os.remove(path)
+                except OSError:
+                    # Still mapped by a reader on a platform that forbids it; removed by the next compaction
+                    pass
+
+    def _close_files(self) -> None:
+        for f in (self._vector_file, self._id_file):
+            if f is not None:
+                f.close()
+        self._vector_file = self._id_file = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_files()
+            self._mapped = None
+
+    @staticmethod
+    def remove(store_path: str) -> None:
+        """Delete a store's files."""
+        for path in [store_path] + glob.glob(f"{glob.escape(store_path)}.*.f32") + glob.glob(f"{glob.escape(store_path)}.*.ids"):
+            if os.path.exists(path):
+                os.remove(path)
@@ -1,9 +1,7 @@
 import os
-from sqlalchemy import create_engine
-from langchain_community.utilities import SQLDatabase
 from langchain.chains import create_sql_query_chain
-from langchain_community.agent_toolkits import create_sql_agent
 from load_config import LoadConfig
+from sql_session import SQL_SESSIONS
 
 APPCFG = LoadConfig()
 
@@ -18,6 +16,11 @@ class ChatBot:
         """
         Respond to a message by querying a SQL database created from CSV/XLSX files.
 
+        The engine, reflected schema and SQL agent come from the shared session
+        registry, so only the first message after the database changes pays for
+        reflection; query results and the SQL of answered questions are cached
+        per database version.
+
         Args:
             chatbot (list): A list storing the chatbot's conversation history.
             message (str): The user's query.
@@ -28,22 +31,19 @@ class ChatBot:
         """
         if chat_type == "Q&A with stored CSV/XLSX SQL-DB":
             if os.path.exists(APPCFG.stored_csv_xlsx_directory):
-                # Connect to the stored SQL database
-                engine = create_engine(
-                    f"sqlite:///{APPCFG.stored_csv_xlsx_directory}")
-                db = SQLDatabase(engine=engine)
+                # Reuse the engine, schema and SQL agent of the stored SQL database
+                session = SQL_SESSIONS.get(
+                    APPCFG.stored_csv_xlsx_directory, APPCFG.langchain_llm)
 
                 # Print available tables for debugging
-                print(f"Available tables: {db.get_usable_table_names()}")
-
-                # Create a SQL agent to process the query
-                agent_executor = create_sql_agent(
-                    APPCFG.langchain_llm, db=db, agent_type="openai-tools", verbose=True
-                )
+                print(f"Available tables: {session.table_names}")
 
-                # Process the user's query
-                response = agent_executor.invoke({"input": message})
-                chatbot.append((message, response["output"]))
+                # Process the user's query; repeated questions reuse their SQL
+                answer = session.ask(message)
+                # Index columns that recurring slow queries scan for; a no-op until
+                # new candidates appear, and never more than one run at a time
+                session.index_advisor.apply_in_background()
+                chatbot.append((message, answer))
                 return "", chatbot
             else:
                 chatbot.append(
@@ -1,8 +1,46 @@
+import sys
 import gradio as gr
+from pyprojroot import here
 from upload_file import UploadFile
 from chatbot import ChatBot
 from ui_settings import UISettings
 
+# The PDF retrieval tool lives next to this one
+sys.path.append(str(here("src/tools/Retrevaltool")))
+from retriver import RetrievalTool
+
+PDF_CHAT_TYPE = "RAG with stored PDFs"
+_retrieval_tool = None
+
+
+def respond(chatbot, message, chat_type, app_functionality):
+    """
+    Gradio handler for the text box and submit button.
+
+    PDF answers are streamed into the last chat message token by token, with the
+    citations appended once generation finishes; the other chat types answer in
+    one step through ChatBot.respond.
+    """
+    global _retrieval_tool
+    if chat_type != PDF_CHAT_TYPE:
+        output = ChatBot.respond(chatbot, message, chat_type)
+        yield output[0], output[1]
+        return
+
+    if _retrieval_tool is None:
+        _retrieval_tool = RetrievalTool()
+    chatbot.append((message, ""))
+    answer = ""
+    for event in _retrieval_tool.stream_run(message):
+        if event["type"] == "token":
+            answer += event["content"]
+        else:
+            answer = event["response"]
+            if event["citations"]:
+                answer += f"\n\nSources:\n{event['citations']}"
+        chatbot[-1] = (message, answer)
+        yield "", chatbot
+
 
 with gr.Blocks() as demo:
     with gr.Tabs():
@@ -45,29 +83,30 @@ with gr.Blocks() as demo:
                         "Q&A with stored SQL-DB",
                         "Q&A with stored CSV/XLSX SQL-DB",
                         "RAG with stored CSV/XLSX ChromaDB",
-                        "Q&A with Uploaded CSV/XLSX SQL-DB"
+                        "Q&A with Uploaded CSV/XLSX SQL-DB",
+                        PDF_CHAT_TYPE
                     ], value="Q&A with stored SQL-DB")
                 clear_button = gr.ClearButton([input_txt, chatbot])
             ##############
             # Process:
             ##############
+            # Queued so per-file progress streams into the chat
             file_msg = upload_btn.upload(fn=UploadFile.run_pipeline, inputs=[
-                upload_btn, chatbot, app_functionality], outputs=[input_txt, chatbot], queue=False)
+                upload_btn, chatbot, app_functionality], outputs=[input_txt, chatbot])
 
-            txt_msg = input_txt.submit(fn=ChatBot.respond,
+            # Queued so generator handlers can stream partial answers
+            txt_msg = input_txt.submit(fn=respond,
                                        inputs=[chatbot, input_txt,
                                                chat_type, app_functionality],
                                        outputs=[input_txt,
-                                                chatbot],
-                                       queue=False).then(lambda: gr.Textbox(interactive=True),
+                                                chatbot]).then(lambda: gr.Textbox(interactive=True),
                                                          None, [input_txt], queue=False)
 
-            txt_msg = text_submit_btn.click(fn=ChatBot.respond,
+            txt_msg = text_submit_btn.click(fn=respond,
                                             inputs=[chatbot, input_txt,
                                                     chat_type, app_functionality],
                                             outputs=[input_txt,
-                                                     chatbot],
-                                            queue=False).then(lambda: gr.Textbox(interactive=True),
+                                                     chatbot]).then(lambda: gr.Textbox(interactive=True),
                                                               None, [input_txt], queue=False)
 
 
@@ -0,0 +1,274 @@
+"""
+Offline benchmarks for the SQL tool.
+
+Everything here runs on generated data, so no API key or network is needed:
+
+    python benchmarks.py bulk-load --rows 1000000 --chunk-rows 100000
+    python benchmarks.py ingest --files 20 --rows 200000 --workers 1 2 4 8
+    python benchmarks.py index-advisor --rows 1000000
+    python benchmarks.py sql-cache --rows 1000000
+"""
+import os
+import csv
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+import multiprocessing
+
+import numpy as np
+
+
+def generate_csv(path: str, num_rows: int, seed: int = 0, block_rows: int = 100_000) -> None:
+    """Write an orders-like CSV with integer, float, text, date and partly empty columns."""
+    rng = np.random.default_rng(seed)
+    categories = np.array(["books", "electronics", "garden", "grocery", "toys", "clothing", "sports", "health"])
+    words = np.array(random.Random(seed).sample(
+        "delivered late damaged gift express return refund priority bulk fragile sample discount".split(), 12))
+    start_day = np.datetime64("2020-01-01")
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["order_id", "customer_id", "category", "quantity", "amount", "order_date", "note"])
+        for block_start in range(0, num_rows, block_rows):
+            n = min(block_rows, num_rows - block_start)
+            order_ids = np.arange(block_start, block_start + n)
+            notes = np.where(rng.random(n) < 0.7, "", words[rng.integers(0, len(words), n)])
+            writer.writerows(zip(
+                order_ids.tolist(),
+                rng.integers(0, num_rows // 10 + 1, n).tolist(),
+                categories[rng.integers(0, len(categories), n)].tolist(),
+                rng.integers(1, 20, n).tolist(),
+                np.round(rng.gamma(2.0, 40.0, n), 2).tolist(),
+                (start_day + rng.integers(0, 1500, n)).astype(str).tolist(),
+                notes.tolist(),
+            ))
+
+
+def _peak_rss_mb() -> float:
+    import resource
+
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if os.uname().sysname == "Darwin" else peak / 1024
+
+
+def _load_with_pandas(csv_path: str, db_path: str, chunk_rows: int) -> int:
+    """The previous loader: the whole file in one DataFrame, written with to_sql."""
+    import pandas as pd
+
+    df = pd.read_csv(csv_path)
+    with sqlite3.connect(db_path) as conn:
+        df.to_sql("orders", conn, if_exists="replace", index=False)
+    return len(df)
+
+
+def _load_streaming(csv_path: str, db_path: str, chunk_rows: int) -> int:
+    from bulk_loader import load_table
+
+    return load_table(csv_path, db_path, "orders", if_exists="replace", index_columns=[], chunk_rows=chunk_rows)
+
+
+def _load_streaming_indexed(csv_path: str, db_path: str, chunk_rows: int) -> int:
+    from bulk_loader import load_table
+
+    return load_table(csv_path, db_path, "orders", if_exists="replace", chunk_rows=chunk_rows)
+
+
+LOADERS = {
+    "pandas read_csv + to_sql": _load_with_pandas,
+    "streaming load_table": _load_streaming,
+    "streaming + key indexes": _load_streaming_indexed,
+}
+
+
+def _run_loader(name: str, csv_path: str, db_path: str, chunk_rows: int, results) -> None:
+    start = time.perf_counter()
+    rows = LOADERS[name](csv_path, db_path, chunk_rows)
+    results.put((rows, time.perf_counter() - start, _peak_rss_mb()))
+
+
+def benchmark_bulk_load(num_rows: int, chunk_rows: int, csv_path: str = None) -> None:
+    """Rows/sec and peak RSS of loading a generated CSV into SQLite, each loader in a fresh process."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if csv_path is None:
+            csv_path = os.path.join(tmp_dir, "orders.csv")
+            start = time.perf_counter()
+            generate_csv(csv_path, num_rows)
+            print(f"Generated {num_rows} rows ({os.path.getsize(csv_path) / 2**20:.0f} MiB) in {time.perf_counter() - start:.1f}s")
+
+        # A fresh interpreter per loader, so peak RSS is not inherited from the previous run
+        context = multiprocessing.get_context("spawn")
+        for name in LOADERS:
+            db_path = os.path.join(tmp_dir, f"{len(os.listdir(tmp_dir))}.db")
+            results = context.Queue()
+            process = context.Process(target=_run_loader, args=(name, csv_path, db_path, chunk_rows, results))
+            process.start()
+            rows, elapsed, peak_rss = results.get()
+            process.join()
+            print(f"{name:26} {rows:>10} rows  {elapsed:6.1f}s  {rows / elapsed:>10,.0f} rows/sec"
+                  f"  peak RSS {peak_rss:7.0f} MiB  db {os.path.getsize(db_path) / 2**20:6.0f} MiB")
+
+
+def benchmark_ingest(num_files: int, num_rows: int, workers_list, xlsx_files: int = 0) -> None:
+    """Wall time of loading a batch of files serially with load_table vs on ingest_files' process pool."""
+    import pandas as pd
+    from bulk_loader import load_table
+    from parallel_loader import ingest_files
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        files = []
+        for i in range(num_files):
+            csv_path = os.path.join(tmp_dir, f"orders_{i}.csv")
+            generate_csv(csv_path, num_rows, seed=i)
+            if i < xlsx_files:
+                xlsx_path = os.path.join(tmp_dir, f"orders_{i}.xlsx")
+                pd.read_csv(csv_path).to_excel(xlsx_path, index=False)
+                os.remove(csv_path)
+                csv_path = xlsx_path
+            files.append((csv_path, f"orders_{i}"))
+        total_rows = num_files * num_rows
+        print(f"{num_files} files ({xlsx_files} xlsx) of {num_rows} rows, {os.cpu_count()} cores")
+
+        db_path = os.path.join(tmp_dir, "serial.db")
+        start = time.perf_counter()
+        for file_path, table_name in files:
+            load_table(file_path, db_path, table_name)
+        elapsed = time.perf_counter() - start
+        print(f"{'serial load_table':24} {elapsed:6.1f}s  {total_rows / elapsed:>10,.0f} rows/sec")
+
+        for workers in workers_list:
+            db_path = os.path.join(tmp_dir, f"parallel_{workers}.db")
+            start = time.perf_counter()
+            loaded = sum(progress.rows for progress in ingest_files(files, db_path, max_workers=workers))
+            elapsed = time.perf_counter() - start
+            assert loaded == total_rows, f"loaded {loaded} of {total_rows} rows"
+            print(f"{f'ingest_files {workers} workers':24} {elapsed:6.1f}s  {total_rows / elapsed:>10,.0f} rows/sec")
+
+
+AGENT_QUERIES = [
+    "SELECT COUNT(*) FROM orders WHERE customer_id = 4242",
+    "SELECT SUM(amount) FROM orders WHERE order_date BETWEEN '2021-03-01' AND '2021-03-31'",
+    "SELECT category, COUNT(*) FROM orders GROUP BY category",
+    "SELECT c.name, SUM(o.amount) FROM orders o JOIN customers c ON o.customer_id = c.customer_id "
+    "WHERE c.name = 'customer 77' GROUP BY c.name",
+    "SELECT order_id, amount FROM orders WHERE quantity = 7 AND amount > 400 ORDER BY amount DESC LIMIT 10",
+    "SELECT * FROM orders WHERE order_id = 123456",
+]
+
+
+def _time_queries(engine, repeats: int = 3):
+    from sqlalchemy import text
+
+    timings = []
+    with engine.connect() as conn:
+        for query in AGENT_QUERIES:
+            elapsed = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                conn.execute(text(query)).fetchall()
+                elapsed.append(time.perf_counter() - start)
+            timings.append(min(elapsed) * 1000)
+    return timings
+
+
+def benchmark_index_advisor(num_rows: int) -> None:
+    """Latency of typical agent queries on an unindexed table, after profiling and after learning from the queries."""
+    from sqlalchemy import create_engine
+    from bulk_loader import load_table
+    from index_advisor import QueryIndexAdvisor, advise_after_load
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path, db_path = os.path.join(tmp_dir, "orders.csv"), os.path.join(tmp_dir, "orders.db")
+        generate_csv(csv_path, num_rows)
+        load_table(csv_path, db_path, "orders", index_columns=[])
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("CREATE TABLE customers AS SELECT DISTINCT customer_id, 'customer ' || customer_id AS name FROM orders")
+
+        engine = create_engine(f"sqlite:///{db_path}")
+        advisor = QueryIndexAdvisor(db_path)
+        advisor.attach(engine)
+        phases = [("no indexes", _time_queries(engine))]
+
+        start = time.perf_counter()
+        advise_after_load(db_path)
+        print(f"Profiling and indexing took {time.perf_counter() - start:.1f}s")
+        engine.dispose()
+        phases.append(("after profiling", _time_queries(engine)))
+
+        start = time.perf_counter()
+        advisor.apply()
+        print(f"Learning from executed queries took {time.perf_counter() - start:.1f}s")
+        engine.dispose()
+        phases.append(("after query learning", _time_queries(engine)))
+
+        print(f"{'query':60} " + " ".join(f"{name:>22}" for name, _ in phases))
+        for i, query in enumerate(AGENT_QUERIES):
+            print(f"{query[:60]:60} " + " ".join(f"{timings[i]:19.1f} ms" for _, timings in phases))
+
+
+def benchmark_sql_cache(num_rows: int, repeats: int = 20) -> None:
+    """Latency of the agent's SQL tool calls on an unindexed table, first run vs served from the result cache."""
+    from sqlalchemy import create_engine
+    from bulk_loader import load_table
+    from query_cache import SQL_RESULT_CACHE
+    from sql_session import CachedSQLDatabase, file_signature
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path, db_path = os.path.join(tmp_dir, "orders.csv"), os.path.join(tmp_dir, "orders.db")
+        generate_csv(csv_path, num_rows)
+        load_table(csv_path, db_path, "orders", index_columns=[])
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("CREATE TABLE customers AS SELECT DISTINCT customer_id, 'customer ' || customer_id AS name FROM orders")
+
+        db = CachedSQLDatabase(create_engine(f"sqlite:///{db_path}"), lazy_table_reflection=True,
+                               db_path=db_path, version=file_signature(db_path))
+        print(f"{'query':60} {'first run':>12} {'cached':>12}")
+        for query in AGENT_QUERIES:
+            start = time.perf_counter()
+            db.run_no_throw(query)
+            first = time.perf_counter() - start
+            start = time.perf_counter()
+            for _ in range(repeats):
+                # The agent rewrites the same query with different spacing and a trailing semicolon
+                db.run_no_throw("  " + query.replace(" FROM ", "\n  FROM ") + ";")
+            cached = (time.perf_counter() - start) / repeats
+            print(f"{query[:60]:60} {first * 1000:9.1f} ms {cached * 1e6:9.1f} us")
+        print(f"Result cache: {len(SQL_RESULT_CACHE)} entries, {SQL_RESULT_CACHE.size / 1024:.1f} KiB, "
+              f"{SQL_RESULT_CACHE.hits} hits, {SQL_RESULT_CACHE.misses} misses")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    bulk_load_parser = subparsers.add_parser("bulk-load", help="rows/sec and peak RSS of CSV loading into SQLite")
+    bulk_load_parser.add_argument("--rows", type=int, default=1_000_000)
+    bulk_load_parser.add_argument("--chunk-rows", type=int, default=100_000)
+    bulk_load_parser.add_argument("--csv", default=None, help="load this file instead of a generated one")
+
+    ingest_parser = subparsers.add_parser("ingest", help="serial vs process-pool loading of a batch of files")
+    ingest_parser.add_argument("--files", type=int, default=20)
+    ingest_parser.add_argument("--rows", type=int, default=200_000, help="rows per file")
+    ingest_parser.add_argument("--xlsx", type=int, default=0, help="how many of the files are XLSX workbooks")
+    ingest_parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+
+    advisor_parser = subparsers.add_parser("index-advisor", help="agent query latency before and after automatic indexing")
+    advisor_parser.add_argument("--rows", type=int, default=1_000_000)
+
+    cache_parser = subparsers.add_parser("sql-cache", help="agent SQL tool call latency with the result cache")
+    cache_parser.add_argument("--rows", type=int, default=1_000_000)
+
+    args = parser.parse_args()
+    if args.benchmark == "bulk-load":
+        benchmark_bulk_load(args.rows, args.chunk_rows, args.csv)
+    elif args.benchmark == "ingest":
+        benchmark_ingest(args.files, args.rows, args.workers, args.xlsx)
+    elif args.benchmark == "index-advisor":
+        benchmark_index_advisor(args.rows)
+    elif args.benchmark == "sql-cache":
+        benchmark_sql_cache(args.rows)
+
+
+if __name__ == "__main__":
+    main()
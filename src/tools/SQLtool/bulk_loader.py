@@ -0,0 +1,284 @@
+import os
+import time
+import sqlite3
+from typing import Dict, Iterator, List, Optional
+
+import pandas as pd
+
+# Rows read, converted and inserted per batch; bounds the loader's memory use
+CHUNK_ROWS = int(os.getenv("SQL_LOAD_CHUNK_ROWS", 100_000))
+# Rows sampled to infer column types before streaming the file
+INFER_ROWS = int(os.getenv("SQL_LOAD_INFER_ROWS", 10_000))
+# SQLite page cache while loading, in KiB
+LOAD_CACHE_KIB = int(os.getenv("SQL_LOAD_CACHE_KIB", 256 * 1024))
+
+SUPPORTED_EXTENSIONS = (".csv", ".xlsx", ".xls")
+
+
+def quote_identifier(name: str) -> str:
+    """Quote a table or column name for SQLite."""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def sqlite_type(series: pd.Series) -> str:
+    """
+    SQLite column type for a pandas column, matching what DataFrame.to_sql creates.
+
+    Args:
+        series (pd.Series): Sampled values of the column.
+
+    Returns:
+        str: INTEGER, REAL, TIMESTAMP or TEXT.
+    """
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_integer_dtype(series):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(series):
+        # An all-empty sample says nothing about the column
+        return "REAL" if series.notna().any() else "TEXT"
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return "TIMESTAMP"
+    return "TEXT"
+
+
+def reader_dtypes(sample: pd.DataFrame) -> dict:
+    """
+    Fixed read_csv dtypes from an inferred sample, so later chunks skip type inference.
+
+    Integer and boolean columns keep the plain numpy types, which parse several
+    times faster than the nullable ones; if an empty field turns up past the
+    sample, read_csv raises ValueError and load_table falls back to inferring
+    types per chunk.
+
+    Args:
+        sample (pd.DataFrame): First rows of the file, read with inferred types.
+
+    Returns:
+        dict: Column name to dtype, for read_csv(dtype=...).
+    """
+    dtypes = {}
+    for column, series in sample.items():
+        if pd.api.types.is_bool_dtype(series):
+            dtypes[column] = "bool"
+        elif pd.api.types.is_integer_dtype(series):
+            dtypes[column] = "int64"
+        elif pd.api.types.is_float_dtype(series) and series.notna().any():
+            dtypes[column] = "float64"
+        else:
+            dtypes[column] = object
+    return dtypes
+
+
+def _csv_chunks(file_path: str, chunk_rows: int, dtypes: Optional[dict]) -> Iterator[pd.DataFrame]:
+    yield from pd.read_csv(file_path, chunksize=chunk_rows, dtype=dtypes)
+
+
+def excel_chunks(file_path: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """Stream the first worksheet of a workbook as DataFrames of chunk_rows rows, with the first row as header."""
+    if not file_path.endswith(".xlsx"):
+        # openpyxl cannot stream legacy .xls workbooks
+        df = pd.read_excel(file_path)
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+        return
+
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [name if name is not None else f"Unnamed: {i}" for i, name in enumerate(header)]
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == chunk_rows:
+                yield pd.DataFrame(batch, columns=columns)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=columns)
+    finally:
+        workbook.close()
+
+
+def _chain(first: pd.DataFrame, rest: Iterator[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+    yield first
+    yield from rest
+
+
+def to_rows(chunk: pd.DataFrame):
+    """Rows of a chunk as tuples of Python values, with missing values as None or NaN (stored as NULL)."""
+    columns = []
+    for _, series in chunk.items():
+        if pd.api.types.is_datetime64_any_dtype(series):
+            series = series.dt.strftime("%Y-%m-%d %H:%M:%S")
+        if isinstance(series.dtype, pd.api.extensions.ExtensionDtype) and series.hasnans:
+            # pd.NA cannot be bound as a parameter
+            columns.append(series.astype(object).where(series.notna(), None).tolist())
+        else:
+            columns.append(series.tolist())
+    return zip(*columns)
+
+
+def key_columns(columns: List[str]) -> List[str]:
+    """Columns that look like keys (id, *_id, * id), which get an index after the load."""
+    return [column for column in columns
+            if str(column).lower() == "id" or str(column).lower().endswith(("_id", " id"))]
+
+
+def table_schema(sample: pd.DataFrame) -> Dict[str, str]:
+    """Column name to SQLite type for a table created from the sample's columns."""
+    return {column: sqlite_type(series) for column, series in sample.items()}
+
+
+def insert_statement(table_name: str, num_columns: int) -> str:
+    return f"INSERT INTO {quote_identifier(table_name)} VALUES ({', '.join('?' * num_columns)})"
+
+
+def check_if_exists(if_exists: str) -> None:
+    if if_exists not in ("replace", "append", "fail"):
+        raise ValueError(f"if_exists must be 'replace', 'append' or 'fail', got {if_exists!r}")
+
+
+def connect_for_bulk_load(db_path: str, check_same_thread: bool = True) -> sqlite3.Connection:
+    """
+    Open a connection tuned for bulk loading, in manual transaction mode.
+
+    The journal is kept in memory and writes are not fsynced; the database is
+    derived from the source files, so it can be rebuilt if the process dies
+    mid-load. The page cache is enlarged so index builds sort in memory.
+
+    Args:
+        db_path (str): Path to the SQLite database file.
+        check_same_thread (bool): False to hand the connection to a writer thread.
+
+    Returns:
+        sqlite3.Connection: Connection on which to run BEGIN ... COMMIT.
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=check_same_thread)
+    conn.execute("PRAGMA journal_mode=MEMORY")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute(f"PRAGMA cache_size=-{LOAD_CACHE_KIB}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+def prepare_table(conn: sqlite3.Connection, table_name: str, schema: Dict[str, str], if_exists: str) -> int:
+    """
+    Create, replace or keep the table to load into, inside the caller's transaction.
+
+    Args:
+        conn (sqlite3.Connection): Connection with an open transaction.
+        table_name (str): Name of the table.
+        schema (Dict[str, str]): Column name to SQLite type, as table_schema returns.
+        if_exists (str): "replace", "append" or "fail", as in DataFrame.to_sql.
+
+    Returns:
+        int: Largest rowid in the table before the load (0 for a new table).
+    """
+    table = quote_identifier(table_name)
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                          (table_name,)).fetchone() is not None
+    if exists and if_exists == "fail":
+        raise ValueError(f"Table '{table_name}' already exists.")
+    if exists and if_exists == "replace":
+        conn.execute(f"DROP TABLE {table}")
+    if not exists or if_exists == "replace":
+        column_defs = ", ".join(f"{quote_identifier(column)} {column_type}" for column, column_type in schema.items())
+        conn.execute(f"CREATE TABLE {table} ({column_defs})")
+    return conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}").fetchone()[0]
+
+
+def create_indexes(conn: sqlite3.Connection, table_name: str, columns: List[str]) -> None:
+    """Index the given columns of a loaded table."""
+    for column in columns:
+        index_name = quote_identifier(f"ix_{table_name}_{column}")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {quote_identifier(table_name)} ({quote_identifier(column)})")
+
+
+def _insert_chunks(conn: sqlite3.Connection, insert_sql: str, chunks: Iterator[pd.DataFrame]) -> int:
+    rows = 0
+    for chunk in chunks:
+        conn.executemany(insert_sql, to_rows(chunk))
+        rows += len(chunk)
+    return rows
+
+
+def load_table(file_path: str, db_path: str, table_name: str, if_exists: str = "replace",
+               index_columns: Optional[List[str]] = None, chunk_rows: int = CHUNK_ROWS) -> int:
+    """
+    Stream a CSV or Excel file into a SQLite table.
+
+    Column types are inferred from the first rows and then fixed for the rest of
+    the file, which is read, converted and inserted chunk by chunk, so memory
+    use does not grow with the file. All inserts run in a single transaction
+    on a connection tuned for bulk loading (see connect_for_bulk_load).
+    Indexes are built once the rows are in, which is much cheaper than
+    maintaining them row by row.
+
+    If a value past the sample does not fit its inferred type (e.g. text in a
+    column that started out numeric, or a blank in an integer column), the rows
+    inserted so far are deleted and the file is re-read with types inferred per
+    chunk; SQLite's column affinity still stores whole floats in INTEGER columns
+    as integers.
+
+    Args:
+        file_path (str): Path to the CSV, XLSX or XLS file.
+        db_path (str): Path to the SQLite database file.
+        table_name (str): Name of the table to create.
+        if_exists (str): "replace", "append" or "fail", as in DataFrame.to_sql.
+        index_columns (Optional[List[str]]): Columns to index after the load; key-like
+            columns (see key_columns) if None.
+        chunk_rows (int): Rows per chunk.
+
+    Returns:
+        int: Number of rows loaded.
+    """
+    file_path = os.fspath(file_path)
+    is_csv = file_path.endswith(".csv")
+    if not file_path.endswith(SUPPORTED_EXTENSIONS):
+        raise ValueError("Unsupported file format. Please provide a CSV or Excel file.")
+    check_if_exists(if_exists)
+
+    start = time.perf_counter()
+    if is_csv:
+        sample = pd.read_csv(file_path, nrows=INFER_ROWS)
+        chunks = _csv_chunks(file_path, chunk_rows, reader_dtypes(sample))
+    else:
+        chunks = excel_chunks(file_path, chunk_rows)
+        sample = next(chunks, None)
+        if sample is None:
+            raise ValueError(f"{file_path} has no data rows")
+        chunks = _chain(sample, chunks)
+
+    insert_sql = insert_statement(table_name, len(sample.columns))
+    if index_columns is None:
+        index_columns = key_columns(list(sample.columns))
+
+    conn = connect_for_bulk_load(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            last_rowid = prepare_table(conn, table_name, table_schema(sample), if_exists)
+            try:
+                rows = _insert_chunks(conn, insert_sql, chunks)
+            except ValueError as e:
+                if not is_csv:
+                    raise
+                print(f"Column types of {os.path.basename(file_path)} changed past the first {INFER_ROWS} rows ({e}), "
+                      f"reloading with types inferred per chunk")
+                conn.execute(f"DELETE FROM {quote_identifier(table_name)} WHERE rowid > ?", (last_rowid,))
+                rows = _insert_chunks(conn, insert_sql, _csv_chunks(file_path, chunk_rows, None))
+            create_indexes(conn, table_name, index_columns)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Table '{table_name}': {rows} rows loaded into {db_path} in {elapsed:.1f}s "
+          f"({rows / max(elapsed, 1e-9):,.0f} rows/sec)")
+    return rows
@@ -1,6 +1,7 @@
-import pandas as pd
 from sqlalchemy import create_engine
 import os
+from parallel_loader import ingest_files
+from index_advisor import advise_after_load
 
 class PrepareSQLFromTabularData:
     def __init__(self, files_dir):
@@ -9,31 +10,31 @@ class PrepareSQLFromTabularData:
         self.files_directory = files_dir
         self.file_dir_list = os.listdir(files_dir)
         
-        db_path = APPCFG.stored_csv_xlsx_sqldb_directory
-        db_path = f"sqlite:///{db_path}"
-        self.engine = create_engine(db_path)
+        self.db_path = APPCFG.stored_csv_xlsx_sqldb_directory
+        self.engine = create_engine(f"sqlite:///{self.db_path}")
         
         print("Number of files:", len(self.file_dir_list))
 
     def _prepare_db(self):
+        files = []
         for file in self.file_dir_list:
             full_file_path = os.path.join(self.files_directory, file)
             file_name, file_extension = os.path.splitext(file)
             
-            if file_extension == ".csv":
-                print(f"Processing CSV file: {file}")
-                # Process the CSV file in chunks
-                for chunk in pd.read_csv(full_file_path, chunksize=50000):  # Adjust chunk size if needed
-                    chunk.to_sql(file_name, self.engine, index=False, if_exists='append')
-                print(f"Completed processing of {file}")
-            elif file_extension == ".xlsx":
-                print(f"Processing XLSX file: {file}")
-                df = pd.read_excel(full_file_path)
-                df.to_sql(file_name, self.engine, index=False)
+            if file_extension in (".csv", ".xlsx"):
+                files.append((full_file_path, file_name))
             else:
                 print(f"Unsupported file type: {file_extension}")
                 continue
 
+        # Files and chunks of large CSVs are parsed in parallel, one writer inserts them
+        for progress in ingest_files(files, self.db_path, if_exists="replace"):
+            if progress.error is None:
+                print(f"Completed processing of {os.path.basename(progress.file_path)} ({progress.rows} rows)")
+            else:
+                print(f"Failed processing of {os.path.basename(progress.file_path)}: {progress.error}")
+        advise_after_load(self.db_path)
+
         print("==============================")
         print("All supported files are saved into the SQL database.")
 
@@ -0,0 +1,410 @@
+import os
+import re
+import time
+import logging
+import sqlite3
+import threading
+from collections import Counter, namedtuple
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import event
+
+from bulk_loader import connect_for_bulk_load, create_indexes, key_columns, quote_identifier
+from query_cache import file_signature
+
+logger = logging.getLogger(__name__)
+
+# Rows sampled per table to profile its columns
+PROFILE_ROWS = int(os.getenv("SQL_PROFILE_ROWS", 100_000))
+# Tables smaller than this are scanned fast enough without indexes
+MIN_INDEX_ROWS = int(os.getenv("SQL_MIN_INDEX_ROWS", 10_000))
+# Indexes added per table from profiling alone
+MAX_PROFILE_INDEXES = int(os.getenv("SQL_MAX_PROFILE_INDEXES", 4))
+# Times a predicate on a fully scanned column must be executed before it gets an index
+MIN_PREDICATE_COUNT = int(os.getenv("SQL_MIN_PREDICATE_COUNT", 3))
+# Statements faster than this, in milliseconds, are not worth an index
+SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", 20))
+# Text columns with at most this many distinct values are treated as categories
+MAX_CATEGORY_VALUES = 1000
+# Distinct SELECT statements remembered per database
+MAX_TRACKED_STATEMENTS = 500
+# Index builds remembered per database, to tell them apart from other writes
+MAX_TRACKED_WRITES = 100
+
+ColumnProfile = namedtuple("ColumnProfile", ["column", "declared_type", "sampled", "non_null", "distinct"])
+IndexAdvice = namedtuple("IndexAdvice", ["table", "column", "reason"])
+
+_DATE_VALUE = re.compile(r"^\d{4}-\d{2}-\d{2}")
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NAME = r'("[^"]+"|\w+)'
+# column <op> ... and ... = column, optionally qualified by a table or alias
+_PREDICATE = re.compile(rf"(?:{_NAME}\s*\.\s*)?{_NAME}\s*(?:==?|!=|<>|<=|>=|<|>|\bNOT\s+IN\b|\bIN\b|\bNOT\s+LIKE\b|\bLIKE\b|\bBETWEEN\b|\bIS\b)",
+                        re.IGNORECASE)
+_JOIN_RHS = re.compile(rf"==?\s*(?:{_NAME}\s*\.\s*)?{_NAME}", re.IGNORECASE)
+_TABLE_REF = re.compile(rf"\b(?:FROM|JOIN)\s+{_NAME}(?:\s+(?:AS\s+)?(?!(?:WHERE|JOIN|ON|INNER|LEFT|RIGHT|CROSS|NATURAL|FULL|"
+                        rf"OUTER|GROUP|ORDER|LIMIT|UNION|USING|HAVING|WINDOW|EXCEPT|INTERSECT)\b)(\w+))?", re.IGNORECASE)
+_FULL_SCAN = re.compile(r"^SCAN (\S+)")
+
+
+def _unquote(name: str) -> str:
+    return name[1:-1].replace('""', '"') if name and name.startswith('"') else name
+
+
+def table_names(conn: sqlite3.Connection) -> List[str]:
+    return [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+
+
+def table_columns(conn: sqlite3.Connection, table: str) -> List[Tuple[str, str]]:
+    """(name, declared type) of each column of a table."""
+    return [(row[1], row[2]) for row in conn.execute(f"PRAGMA table_info({quote_identifier(table)})")]
+
+
+def indexed_columns(conn: sqlite3.Connection, table: str) -> Set[str]:
+    """Lower-cased names of the columns that lead an index of the table, so lookups on them already use it."""
+    leading = set()
+    for index in conn.execute(f"PRAGMA index_list({quote_identifier(table)})").fetchall():
+        first = conn.execute(f"PRAGMA index_info({quote_identifier(index[1])})").fetchone()
+        if first is not None and first[2] is not None:
+            leading.add(first[2].lower())
+    return leading
+
+
+def profile_table(conn: sqlite3.Connection, table: str, sample_rows: int = PROFILE_ROWS) -> List[ColumnProfile]:
+    """
+    Profile the columns of a table on its first sample_rows rows, in one pass.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the database.
+        table (str): Table to profile.
+        sample_rows (int): Rows to sample.
+
+    Returns:
+        List[ColumnProfile]: Declared type, non-null and distinct counts in the sample, per column.
+    """
+    columns = table_columns(conn, table)
+    if not columns:
+        return []
+    aggregates = ", ".join(f"COUNT({quote_identifier(name)}), COUNT(DISTINCT {quote_identifier(name)})" for name, _ in columns)
+    counts = conn.execute(f"SELECT COUNT(*), {aggregates} FROM (SELECT * FROM {quote_identifier(table)} LIMIT ?)",
+                          (sample_rows,)).fetchone()
+    return [ColumnProfile(name, declared_type.upper(), counts[0], counts[1 + 2 * i], counts[2 + 2 * i])
+            for i, (name, declared_type) in enumerate(columns)]
+
+
+def _looks_like_dates(conn: sqlite3.Connection, table: str, column: str) -> bool:
+    values = [row[0] for row in conn.execute(
+        f"SELECT {quote_identifier(column)} FROM {quote_identifier(table)} WHERE {quote_identifier(column)} IS NOT NULL LIMIT 100")]
+    return bool(values) and all(isinstance(value, str) and _DATE_VALUE.match(value) for value in values)
+
+
+def recommend_indexes(conn: sqlite3.Connection, tables: Optional[List[str]] = None) -> List[IndexAdvice]:
+    """
+    Columns likely to be filtered, joined or grouped on, from their profiles.
+
+    In order of priority, up to MAX_PROFILE_INDEXES per table: key-like columns
+    (id, *_id), columns sharing their name with a column of another table (join
+    keys), date columns (range filters) and low-cardinality text columns
+    (equality filters and GROUP BY, answered from a covering index). Columns
+    that are mostly empty, constant, or already lead an index are skipped, as
+    are tables under MIN_INDEX_ROWS rows.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the database.
+        tables (Optional[List[str]]): Tables to advise on; all tables if None.
+
+    Returns:
+        List[IndexAdvice]: (table, column, reason) for each index to create.
+    """
+    all_tables = table_names(conn)
+    columns_by_table = {table: {name.lower() for name, _ in table_columns(conn, table)} for table in all_tables}
+    advice = []
+    for table in tables if tables is not None else all_tables:
+        if table not in columns_by_table:
+            continue
+        row_count = conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {quote_identifier(table)}").fetchone()[0]
+        if row_count < MIN_INDEX_ROWS:
+            continue
+        indexed = indexed_columns(conn, table)
+        keys = {column.lower() for column in key_columns(sorted(columns_by_table[table]))}
+        candidates = []
+        for profile in profile_table(conn, table):
+            name = profile.column.lower()
+            if name in indexed or profile.distinct <= 1 or profile.non_null < profile.sampled / 10:
+                continue
+            shared_with = [other for other, columns in columns_by_table.items() if other != table and name in columns]
+            if name in keys:
+                candidates.append((0, IndexAdvice(table, profile.column, "key column")))
+            elif shared_with and profile.distinct >= profile.non_null / 100:
+                candidates.append((1, IndexAdvice(table, profile.column, f"join key shared with {', '.join(shared_with)}")))
+            elif profile.declared_type in ("TIMESTAMP", "DATE", "DATETIME") or (
+                    profile.declared_type == "TEXT" and _looks_like_dates(conn, table, profile.column)):
+                candidates.append((2, IndexAdvice(table, profile.column, "date column")))
+            elif profile.declared_type == "TEXT" and profile.distinct <= MAX_CATEGORY_VALUES:
+                candidates.append((3, IndexAdvice(table, profile.column, f"category column ({profile.distinct} values)")))
+        advice.extend(item for _, item in sorted(candidates, key=lambda candidate: candidate[0])[:MAX_PROFILE_INDEXES])
+    return advice
+
+
+def advise_after_load(db_path: str, tables: Optional[List[str]] = None) -> List[IndexAdvice]:
+    """
+    Profile freshly loaded tables, index their likely filter and join columns, and ANALYZE them.
+
+    ANALYZE gives the query planner the selectivity of each index, so it only
+    uses the low-selectivity ones (e.g. categories) where they pay off.
+
+    Args:
+        db_path (str): Path to the SQLite database file.
+        tables (Optional[List[str]]): Tables that were loaded; all tables if None.
+
+    Returns:
+        List[IndexAdvice]: The indexes created.
+    """
+    conn = connect_for_bulk_load(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            advice = recommend_indexes(conn, tables)
+            for item in advice:
+                create_indexes(conn, item.table, [item.column])
+                print(f"Indexed {item.table}.{item.column}: {item.reason}")
+            for table in tables if tables is not None else table_names(conn):
+                conn.execute(f"ANALYZE {quote_identifier(table)}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+    return advice
+
+
+def query_plan(conn: sqlite3.Connection, statement: str, parameters=()) -> List[str]:
+    """The detail lines of EXPLAIN QUERY PLAN for a statement."""
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {statement}", parameters or ())]
+
+
+def predicate_columns(statement: str) -> List[Tuple[Optional[str], str]]:
+    """(qualifier or None, column) for each comparison and join operand in a SELECT statement."""
+    statement = _STRING_LITERAL.sub("''", statement)
+    found = []
+    for pattern in (_PREDICATE, _JOIN_RHS):
+        for qualifier, column in pattern.findall(statement):
+            found.append((_unquote(qualifier) or None, _unquote(column)))
+    return found
+
+
+def table_aliases(statement: str) -> Dict[str, str]:
+    """Lower-cased alias (and table name) to table name for each table referenced in FROM and JOIN clauses."""
+    aliases = {}
+    for table, alias in _TABLE_REF.findall(_STRING_LITERAL.sub("''", statement)):
+        table = _unquote(table)
+        aliases[table.lower()] = table
+        if alias:
+            aliases[alias.lower()] = table
+    return aliases
+
+
+class QueryIndexAdvisor:
+    """
+    Learns which columns the SQL agent filters and joins on, and indexes the recurring ones.
+
+    Attached to an engine, it records every SELECT the agent executes that takes
+    longer than SLOW_QUERY_MS. apply() replays the recorded statements through
+    EXPLAIN QUERY PLAN; a column that is compared or joined on in a table the
+    plan scans in full, in at least MIN_PREDICATE_COUNT slow executions, gets an
+    index, and the plans before and after are printed as evidence.
+
+    apply_in_background() runs apply() on the advisor's one worker thread, and
+    only once some column has been compared on in min_count more slow
+    executions since it was last considered, so a chat message does not
+    replay the recorded plans when nothing new could qualify.
+
+    The file signature before and after each index build is remembered, so
+    SQLSessionRegistry can tell the advisor's own writes, which change no
+    query result, from new data (see wrote()). One advisor is kept per
+    database file (see index_advisor_for), so what it learned survives SQL
+    session rebuilds.
+    """
+
+    def __init__(self, db_path: str, min_count: int = MIN_PREDICATE_COUNT):
+        self.db_path = db_path
+        self.min_count = min_count
+        self._statements: Dict[str, list] = {}
+        self._writes: List[Tuple[Tuple, Tuple]] = []
+        # Slow executions comparing on each (lower-cased) column name, and the count when apply() last considered it
+        self._column_counts: Counter = Counter()
+        self._considered: Dict[str, int] = {}
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._applying = threading.Lock()
+
+    def attach(self, engine) -> None:
+        """Record the slow SELECT statements executed through a SQLAlchemy engine."""
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("index_advisor_start", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info["index_advisor_start"].pop()) * 1000
+        if elapsed_ms >= SLOW_QUERY_MS and not executemany and statement.lstrip()[:6].upper().startswith(("SELECT", "WITH")):
+            self.observe(statement, parameters)
+
+    def observe(self, statement: str, parameters=()) -> None:
+        """Count one execution of a statement."""
+        with self._lock:
+            entry = self._statements.get(statement)
+            if entry is None:
+                if len(self._statements) >= MAX_TRACKED_STATEMENTS:
+                    # Forget the least executed statement
+                    del self._statements[min(self._statements, key=lambda known: self._statements[known][0])]
+                entry = self._statements[statement] = [0, parameters]
+            entry[0] += 1
+            self._column_counts.update({column.lower() for _, column in predicate_columns(statement)})
+
+    def has_candidates(self) -> bool:
+        """Whether some column was compared on in min_count slow executions since apply() last considered it."""
+        with self._lock:
+            return any(count - self._considered.get(column, 0) >= self.min_count
+                       for column, count in self._column_counts.items())
+
+    def _scanned_predicates(self, conn: sqlite3.Connection):
+        """Executions per (table, column) compared on in a full table scan, with one statement using each."""
+        with self._lock:
+            statements = [(statement, count, parameters) for statement, (count, parameters) in self._statements.items()]
+        columns_by_table = {table.lower(): {name.lower(): name for name, _ in table_columns(conn, table)}
+                            for table in table_names(conn)}
+        counts, examples = Counter(), {}
+        for statement, count, parameters in statements:
+            try:
+                plan = query_plan(conn, statement, parameters)
+            except sqlite3.Error:
+                # Statements that failed for the agent fail here too
+                continue
+            aliases = table_aliases(statement)
+            scanned = set()
+            for line in plan:
+                match = _FULL_SCAN.match(line)
+                if match and "USING" not in line:
+                    name = _unquote(match.group(1)).lower()
+                    table = aliases.get(name, name)
+                    if table.lower() in columns_by_table:
+                        scanned.add(table.lower())
+            for qualifier, column in set(predicate_columns(statement)):
+                if qualifier is not None:
+                    tables = [aliases.get(qualifier.lower(), qualifier).lower()]
+                else:
+                    tables = [table for table in scanned if column.lower() in columns_by_table[table]]
+                for table in tables:
+                    if table in scanned and column.lower() in columns_by_table[table]:
+                        key = (table, columns_by_table[table][column.lower()])
+                        counts[key] += count
+                        examples.setdefault(key, (statement, parameters, plan))
+        return counts, examples
+
+    def apply(self) -> List[IndexAdvice]:
+        """
+        Index the columns of recurring predicates that are still answered by full table scans.
+
+        Returns at once, doing nothing, if another apply() is running.
+
+        Returns:
+            List[IndexAdvice]: The indexes created.
+        """
+        if not self._applying.acquire(blocking=False):
+            return []
+        with self._lock:
+            self._considered.update(self._column_counts)
+        try:
+            conn = connect_for_bulk_load(self.db_path)
+            try:
+                counts, examples = self._scanned_predicates(conn)
+                table_by_lower = {table.lower(): table for table in table_names(conn)}
+                created = []
+                for (table, column), count in counts.most_common():
+                    if count < self.min_count:
+                        break
+                    table = table_by_lower[table]
+                    if column.lower() in indexed_columns(conn, table):
+                        continue
+                    conn.execute("BEGIN IMMEDIATE")
+                    try:
+                        before = file_signature(self.db_path)
+                        create_indexes(conn, table, [column])
+                        conn.execute(f"ANALYZE {quote_identifier(table)}")
+                        conn.execute("COMMIT")
+                    except BaseException:
+                        conn.execute("ROLLBACK")
+                        raise
+                    self._record_write(before, file_signature(self.db_path))
+                    statement, parameters, plan = examples[(table.lower(), column)]
+                    print(f"Indexed {table}.{column}: compared on in {count} executions scanning {table}\n"
+                          f"  query: {' '.join(statement.split())}\n"
+                          f"  plan before: {' | '.join(plan)}\n"
+                          f"  plan after:  {' | '.join(query_plan(conn, statement, parameters))}")
+                    created.append(IndexAdvice(table, column, f"predicate in {count} executions"))
+                return created
+            finally:
+                conn.close()
+        finally:
+            self._applying.release()
+
+    def _record_write(self, before: Tuple, after: Tuple) -> None:
+        with self._lock:
+            self._writes.append((before, after))
+            del self._writes[:-MAX_TRACKED_WRITES]
+
+    def wrote(self, signature: Tuple, current: Tuple) -> bool:
+        """
+        Whether the database file went from signature to current through this advisor's index builds alone.
+
+        Args:
+            signature (Tuple): An earlier file signature (see query_cache.file_signature).
+            current (Tuple): The file's signature now.
+
+        Returns:
+            bool: True if every change in between was an index build of this advisor.
+        """
+        with self._lock:
+            for before, after in self._writes:
+                if signature == before:
+                    signature = after
+        return signature == current
+
+    def apply_in_background(self) -> bool:
+        """
+        Run apply() on the advisor's worker thread, so index builds do not delay the caller.
+
+        Does nothing while the worker is still running or if there are no new
+        candidates (see has_candidates).
+
+        Returns:
+            bool: True if the worker was started.
+        """
+        if not self.has_candidates():
+            return False
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return False
+            self._worker = threading.Thread(target=self._apply_logged, name="index-advisor", daemon=True)
+            self._worker.start()
+        return True
+
+    def _apply_logged(self) -> None:
+        try:
+            self.apply()
+        except Exception:
+            logger.exception(f"Index advisor failed for {self.db_path}")
+
+
+_ADVISORS: Dict[str, QueryIndexAdvisor] = {}
+_ADVISORS_LOCK = threading.Lock()
+
+
+def index_advisor_for(db_path: str) -> QueryIndexAdvisor:
+    """The process-wide QueryIndexAdvisor of a database file."""
+    db_path = os.path.abspath(db_path)
+    with _ADVISORS_LOCK:
+        return _ADVISORS.setdefault(db_path, QueryIndexAdvisor(db_path))
@@ -3,8 +3,9 @@ from dotenv import load_dotenv
 import yaml
 from pyprojroot import here
 import shutil
-import sqlite3
-import pandas as pd
+from bulk_loader import load_table
+from index_advisor import advise_after_load
+from sql_session import SQL_SESSIONS
 
 # Load environment variables
 load_dotenv()
@@ -36,22 +37,18 @@ class LoadConfig:
         """
         Convert a CSV or Excel file into an SQL database.
 
+        The file is streamed into the table in chunks (see bulk_loader.load_table),
+        then its likely filter and join columns are indexed.
+
         Parameters:
             file_path (str): Path to the input file (CSV or Excel).
             table_name (str): Name of the table to store in the SQL database.
         """
         try:
-            # Determine file type
-            if file_path.endswith(".csv"):
-                df = pd.read_csv(file_path)
-            elif file_path.endswith((".xls", ".xlsx")):
-                df = pd.read_excel(file_path)
-            else:
-                raise ValueError("Unsupported file format. Please provide a CSV or Excel file.")
-
-            # Save to SQL database
-            with sqlite3.connect(self.sqldb_directory) as conn:
-                df.to_sql(table_name, conn, if_exists="replace", index=False)
-                print(f"Table '{table_name}' successfully created in {self.sqldb_directory}")
+            load_table(file_path, self.sqldb_directory, table_name, if_exists="replace")
+            advise_after_load(self.sqldb_directory, [table_name])
+            # Cached query results and question SQL may describe the old table
+            SQL_SESSIONS.invalidate(self.sqldb_directory)
+            print(f"Table '{table_name}' successfully created in {self.sqldb_directory}")
         except Exception as e:
             print(f"Error converting file to SQL: {e}")
@@ -0,0 +1,283 @@
+import io
+import os
+import time
+import queue
+import sqlite3
+import threading
+import multiprocessing
+from collections import deque, namedtuple
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Iterator, List, Tuple
+
+import pandas as pd
+
+from bulk_loader import (
+    CHUNK_ROWS,
+    INFER_ROWS,
+    SUPPORTED_EXTENSIONS,
+    check_if_exists,
+    connect_for_bulk_load,
+    create_indexes,
+    excel_chunks,
+    insert_statement,
+    key_columns,
+    prepare_table,
+    reader_dtypes,
+    table_schema,
+    to_rows,
+)
+
+# Large CSVs are split into parts of about this many bytes, parsed in parallel
+PART_BYTES = int(os.getenv("SQL_LOAD_PART_BYTES", 16 * 2**20))
+# Parsing processes; SQLite takes one writer at a time, so a core is left for it
+LOAD_WORKERS = int(os.getenv("SQL_LOAD_WORKERS", max(1, (os.cpu_count() or 1) - 1)))
+
+# How often a producer waiting on a full batch queue checks the writer is still alive
+WRITER_POLL_SECONDS = 1.0
+
+IngestProgress = namedtuple("IngestProgress", ["file_path", "table_name", "rows", "seconds", "error"])
+IngestProgress.__doc__ = "A file finished loading into table_name (error is None) or failed with error."
+
+FilePlan = namedtuple("FilePlan", ["file_path", "table_name", "columns", "schema", "dtypes", "parts"])
+
+
+def csv_parts(file_path: str, part_bytes: int) -> List[Tuple[int, int]]:
+    """Byte ranges of a CSV's data rows, cut at line ends into parts of about part_bytes."""
+    size = os.path.getsize(file_path)
+    with open(file_path, "rb") as f:
+        f.readline()
+        start = f.tell()
+        parts = []
+        while start < size:
+            f.seek(min(start + part_bytes, size))
+            f.readline()
+            parts.append((start, f.tell()))
+            start = f.tell()
+    return parts or [(start, start)]
+
+
+def plan_file(file_path: str, table_name: str, part_bytes: int = PART_BYTES) -> FilePlan:
+    """
+    Decide how a file is parsed: column types from a sample and, for CSVs, the parts to parse in parallel.
+
+    A CSV is only split when no sampled value spans lines, since a cut inside a
+    quoted multi-line field would misalign the parts. Excel workbooks are one
+    part, streamed by the writer; their schema is taken from the first chunk.
+
+    Args:
+        file_path (str): Path to the CSV or Excel file.
+        table_name (str): Table to load it into.
+        part_bytes (int): Approximate size of a CSV part.
+
+    Returns:
+        FilePlan: The file's columns, SQLite schema, read_csv dtypes and parts.
+    """
+    file_path = os.fspath(file_path)
+    if not file_path.endswith(SUPPORTED_EXTENSIONS):
+        raise ValueError("Unsupported file format. Please provide a CSV or Excel file.")
+    if not file_path.endswith(".csv"):
+        return FilePlan(file_path, table_name, None, None, None, [None])
+
+    sample = pd.read_csv(file_path, nrows=INFER_ROWS)
+    text_columns = [column for column, series in sample.items() if series.dtype == object or pd.api.types.is_string_dtype(series)]
+    multiline = any(sample[column].astype(str).str.contains("[\r\n]").any() for column in text_columns)
+    parts = csv_parts(file_path, os.path.getsize(file_path) if multiline else part_bytes)
+    return FilePlan(file_path, table_name, list(sample.columns), table_schema(sample), reader_dtypes(sample), parts)
+
+
+def parse_part(plan: FilePlan, part: Tuple[int, int]) -> pd.DataFrame:
+    """
+    Parse one part of a CSV; runs in a worker process.
+
+    A part whose values do not fit the sampled types (see
+    bulk_loader.load_table) is re-parsed with types inferred from the part.
+    """
+    start, end = part
+    with open(plan.file_path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    if not data.strip():
+        return pd.DataFrame(columns=plan.columns)
+    try:
+        return pd.read_csv(io.BytesIO(data), header=None, names=plan.columns, dtype=plan.dtypes)
+    except ValueError:
+        return pd.read_csv(io.BytesIO(data), header=None, names=plan.columns)
+
+
+def _rollback(conn) -> None:
+    if conn.in_transaction:
+        try:
+            conn.execute("ROLLBACK")
+        except sqlite3.Error:
+            # The connection is unusable; closing it discards the transaction
+            pass
+
+
+def _write_batches(conn, if_exists: str, batches: queue.Queue, progress: queue.Queue) -> None:
+    """Writer thread: load each file's parts, in order, in one transaction per file."""
+    try:
+        while True:
+            item = batches.get()
+            if item is None:
+                break
+            plan, part_index, result = item
+            if part_index == 0:
+                start, rows, error, insert_sql = time.perf_counter(), 0, None, None
+                try:
+                    conn.execute("BEGIN IMMEDIATE")
+                except Exception as e:
+                    error = e
+            if error is None:
+                try:
+                    if isinstance(result, BaseException):
+                        raise result
+                    # A CSV part arrives parsed, an Excel workbook as a stream of chunks
+                    for chunk in [result] if isinstance(result, pd.DataFrame) else result:
+                        if insert_sql is None:
+                            prepare_table(conn, plan.table_name, plan.schema or table_schema(chunk), if_exists)
+                            insert_sql, columns = insert_statement(plan.table_name, len(chunk.columns)), list(chunk.columns)
+                        conn.executemany(insert_sql, to_rows(chunk))
+                        rows += len(chunk)
+                    if insert_sql is None:
+                        raise ValueError(f"{plan.file_path} has no data rows")
+                except Exception as e:
+                    error = e
+                    _rollback(conn)
+            if part_index == len(plan.parts) - 1:
+                if error is None:
+                    try:
+                        create_indexes(conn, plan.table_name, key_columns(columns))
+                        conn.execute("COMMIT")
+                    except Exception as e:
+                        error = e
+                        _rollback(conn)
+                progress.put(IngestProgress(plan.file_path, plan.table_name, rows if error is None else 0,
+                                            time.perf_counter() - start, error))
+    finally:
+        conn.close()
+        progress.put(None)
+
+
+def _parsed_parts(tasks, executor, window: int):
+    """
+    (plan, part index, parsed part or the exception raised) for each task, in task order.
+
+    CSV parts are parsed on the executor; an Excel workbook is handed on as a
+    lazy stream of chunks (see bulk_loader.excel_chunks) that the writer reads
+    as it inserts, so a workbook never sits in memory whole.
+    """
+    pending = deque()
+    for plan, part_index, part in tasks:
+        if len(pending) == window:
+            yield _result(*pending.popleft())
+        if part is None:
+            pending.append((plan, part_index, excel_chunks(plan.file_path, CHUNK_ROWS)))
+        elif executor is None:
+            try:
+                pending.append((plan, part_index, parse_part(plan, part)))
+            except Exception as e:
+                pending.append((plan, part_index, e))
+        else:
+            pending.append((plan, part_index, executor.submit(parse_part, plan, part)))
+    while pending:
+        yield _result(*pending.popleft())
+
+
+def _result(plan: FilePlan, part_index: int, parsed):
+    if not isinstance(parsed, Future):
+        return plan, part_index, parsed
+    try:
+        return plan, part_index, parsed.result()
+    except Exception as e:
+        return plan, part_index, e
+
+
+def _put(batches: queue.Queue, item, writer: threading.Thread) -> None:
+    """Hand an item to the writer thread, failing rather than blocking forever if it died."""
+    while True:
+        try:
+            batches.put(item, timeout=WRITER_POLL_SECONDS)
+            return
+        except queue.Full:
+            if not writer.is_alive():
+                raise RuntimeError("The SQLite writer thread stopped unexpectedly")
+
+
+def _drain(progress: queue.Queue, block: bool = False) -> Iterator[IngestProgress]:
+    while True:
+        try:
+            event = progress.get(block=block)
+        except queue.Empty:
+            return
+        if event is None:
+            return
+        yield event
+
+
+def ingest_files(files: List[Tuple[str, str]], db_path: str, if_exists: str = "replace",
+                 max_workers: int = LOAD_WORKERS, part_bytes: int = PART_BYTES) -> Iterator[IngestProgress]:
+    """
+    Load several CSV/Excel files into SQLite, parsing them on a process pool.
+
+    CSV files, and parts of large ones, are parsed in worker processes while a
+    single writer thread inserts the parsed batches (SQLite serializes writers
+    anyway), so parsing scales with cores and the writer is never idle. Excel
+    workbooks are streamed chunk by chunk by the writer itself. Parts are written
+    in file order, one transaction per file on a bulk-load connection (see
+    bulk_loader.connect_for_bulk_load), with key-like columns indexed before the
+    commit. A file that fails is rolled back and reported; the others still load.
+
+    At most 2 * max_workers parsed parts are held in memory at a time. If the
+    writer thread dies, RuntimeError is raised instead of waiting on it forever.
+
+    Args:
+        files (List[Tuple[str, str]]): (file path, table name) pairs.
+        db_path (str): Path to the SQLite database file.
+        if_exists (str): "replace", "append" or "fail", as in DataFrame.to_sql.
+        max_workers (int): Parsing processes; 1 parses in the calling thread.
+        part_bytes (int): Approximate size of a CSV part.
+
+    Yields:
+        IngestProgress: One event per file, as it is committed or fails.
+    """
+    check_if_exists(if_exists)
+    plans = []
+    for file_path, table_name in files:
+        try:
+            plans.append(plan_file(file_path, table_name, part_bytes))
+        except Exception as e:
+            yield IngestProgress(os.fspath(file_path), table_name, 0, 0.0, e)
+    tasks = [(plan, part_index, part) for plan in plans for part_index, part in enumerate(plan.parts)]
+    if not tasks:
+        return
+
+    # Opened here so a bad path fails the call rather than the writer thread
+    conn = connect_for_bulk_load(db_path, check_same_thread=False)
+    batches, progress = queue.Queue(maxsize=max_workers), queue.Queue()
+    writer = threading.Thread(target=_write_batches, args=(conn, if_exists, batches, progress),
+                              name="sqlite-writer", daemon=True)
+    writer.start()
+
+    executor = None
+    csv_tasks = sum(part is not None for _, _, part in tasks)
+    if max_workers > 1 and csv_tasks > 1:
+        # The caller may be multi-threaded (Gradio, the writer), where fork is unsafe
+        executor = ProcessPoolExecutor(min(max_workers, csv_tasks), mp_context=multiprocessing.get_context("spawn"))
+    finished = False
+    try:
+        for parsed in _parsed_parts(tasks, executor, max_workers):
+            _put(batches, parsed, writer)
+            yield from _drain(progress)
+        _put(batches, None, writer)
+        finished = True
+        yield from _drain(progress, block=True)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        if not finished and writer.is_alive():
+            # Stopped early: the writer rolls back the file in progress
+            try:
+                _put(batches, None, writer)
+            except RuntimeError:
+                pass
+        writer.join()
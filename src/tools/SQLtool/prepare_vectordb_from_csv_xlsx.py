@@ -1,8 +1,16 @@
 import os
+import sys
 import pandas as pd
+from pyprojroot import here
 from load_config import LoadConfig
 import pandas as pd
 
+# The embedding cache is shared with the PDF retrieval tool
+sys.path.append(str(here("src/tools/Retrevaltool")))
+from embedding_cache import EMBEDDING_CACHE_PATH, EmbeddingCache
+
+EMBEDDING_BATCH_SIZE = 100
+
 
 class PrepareVectorDBFromTabularData:
     """
@@ -24,6 +32,7 @@ class PrepareVectorDBFromTabularData:
         """
         self.APPCFG = LoadConfig()
         self.file_directory = file_directory
+        self.embedding_cache = EmbeddingCache(EMBEDDING_CACHE_PATH)
         
         
     def run_pipeline(self):
@@ -95,20 +104,31 @@ class PrepareVectorDBFromTabularData:
         docs = []
         metadatas = []
         ids = []
-        embeddings = []
         for index, row in df.iterrows():
             output_str = ""
             # Treat each row as a separate chunk
             for col in df.columns:
                 output_str += f"{col}: {row[col]},\n"
-            response = self.APPCFG.azure_openai_client.embeddings.create(
-                input = output_str,
-                model= self.APPCFG.embedding_model_name
-            )
-            embeddings.append(response.data[0].embedding)
             docs.append(output_str)
             metadatas.append({"source": file_name})
             ids.append(f"id{index}")
+
+        # Only rows missing from the embedding cache are sent to the API, in batches
+        model = self.APPCFG.embedding_model_name
+        embeddings = self.embedding_cache.get_many(model, docs)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        for start in range(0, len(missing), EMBEDDING_BATCH_SIZE):
+            batch = missing[start:start + EMBEDDING_BATCH_SIZE]
+            response = self.APPCFG.azure_openai_client.embeddings.create(
+                input = [docs[i] for i in batch],
+                model= model
+            )
+            batch_embeddings = [item.embedding for item in response.data]
+            self.embedding_cache.put_many(model, [docs[i] for i in batch], batch_embeddings)
+            for i, embedding in zip(batch, batch_embeddings):
+                embeddings[i] = embedding
+        embeddings = [list(map(float, embedding)) for embedding in embeddings]
+        print(f"Embedding cache: {self.embedding_cache.stats()}")
         return docs, metadatas, ids, embeddings
         
 
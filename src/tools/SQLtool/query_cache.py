@@ -0,0 +1,141 @@
+import os
+import re
+import sys
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+# Result sets kept in memory, in bytes, across all databases
+SQL_RESULT_CACHE_BYTES = int(os.getenv("SQL_RESULT_CACHE_BYTES", 64 * 2**20))
+# Questions whose validated SQL is remembered, across all databases
+SQL_QUESTION_CACHE_SIZE = int(os.getenv("SQL_QUESTION_CACHE_SIZE", 1000))
+
+# String literals and quoted identifiers, whitespace, everything else
+_SQL_TOKEN = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")|(\s+)|([^'\"\s]+)")
+_READ_ONLY = re.compile(r"^(select|with|values)\b")
+_NOT_CACHEABLE = re.compile(r"\b(insert|update|delete|replace|create|drop|alter|attach|detach|pragma|vacuum|reindex|"
+                            r"random|randomblob|changes|total_changes|last_insert_rowid|"
+                            r"current_date|current_time|current_timestamp)\b")
+
+
+def file_signature(db_path: str) -> Tuple:
+    """
+    Identify the current contents of a SQLite database file.
+
+    Covers the write-ahead log as well, since in WAL mode committed writes only
+    reach the main file at the next checkpoint.
+
+    Args:
+        db_path (str): Path to the SQLite database file.
+
+    Returns:
+        Tuple: (mtime_ns, size) of the database file and of its -wal file, if any.
+    """
+    signature = []
+    for path in (db_path, f"{db_path}-wal"):
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def normalize_sql(sql: str) -> str:
+    """SQL text with whitespace collapsed, keywords and names lower-cased, and no trailing semicolon; literals are kept as is."""
+    parts = []
+    for quoted, space, other in _SQL_TOKEN.findall(sql.strip().rstrip(";").strip()):
+        if quoted:
+            parts.append(quoted)
+        elif space:
+            parts.append(" ")
+        else:
+            parts.append(other.lower())
+    return "".join(parts)
+
+
+def is_cacheable(normalized_sql: str) -> bool:
+    """Whether a normalized statement only reads, and returns the same rows for the same database contents."""
+    unquoted = _SQL_TOKEN.sub(lambda match: "''" if match.group(1) else match.group(0), normalized_sql)
+    return (bool(_READ_ONLY.match(unquoted)) and not _NOT_CACHEABLE.search(unquoted)
+            and "'now'" not in normalized_sql.lower())
+
+
+def normalize_question(question: str) -> str:
+    """Question text in Unicode NFC, case-folded, with whitespace collapsed and trailing punctuation dropped."""
+    question = " ".join(unicodedata.normalize("NFC", question).casefold().split())
+    return question.rstrip(" ?.!")
+
+
+class LRUCache:
+    """
+    Thread-safe least-recently-used cache bounded by the total size of its values.
+
+    sizeof(value) gives an entry's size; the default counts entries. Keys are
+    tuples starting with the database path, so invalidate() can drop every entry
+    of one database.
+    """
+
+    def __init__(self, max_size: int, sizeof: Callable[[Any], int] = lambda value: 1):
+        self.max_size = max_size
+        self.sizeof = sizeof
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        size = self.sizeof(value)
+        if size > self.max_size // 8:
+            # One huge result would flush everything else
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self._entries[key] = (value, size)
+            self.size += size
+            while self.size > self.max_size:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def remove(self, key: Hashable) -> None:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.size -= entry[1]
+
+    def invalidate(self, db_path: str) -> None:
+        """Drop every entry of a database."""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == db_path]:
+                self.size -= self._entries.pop(key)[1]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# (db path, db version, normalized SQL, fetch, include_columns, parameters) -> result of SQLDatabase.run
+SQL_RESULT_CACHE = LRUCache(SQL_RESULT_CACHE_BYTES, sizeof=sys.getsizeof)
+# (db path, db version, normalized question) -> the one SQL query that answered it
+SQL_QUESTION_CACHE = LRUCache(SQL_QUESTION_CACHE_SIZE)
+
+
+def invalidate_query_caches(db_path: str) -> None:
+    """Forget the cached results and question SQL of a database, e.g. after its tables were rewritten."""
+    SQL_RESULT_CACHE.invalidate(db_path)
+    SQL_QUESTION_CACHE.invalidate(db_path)
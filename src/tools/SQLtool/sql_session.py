@@ -0,0 +1,229 @@
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import MetaData, create_engine
+from langchain_community.utilities import SQLDatabase
+from langchain_community.agent_toolkits import create_sql_agent
+
+from index_advisor import index_advisor_for
+from query_cache import (
+    SQL_QUESTION_CACHE,
+    SQL_RESULT_CACHE,
+    file_signature,
+    invalidate_query_caches,
+    is_cacheable,
+    normalize_question,
+    normalize_sql,
+)
+
+ANSWER_PROMPT = """Answer the user's question using the result of the SQL query that answers it.
+
+Question: {question}
+SQL query: {query}
+SQL result: {result}
+
+Answer:"""
+
+
+class CachedSQLDatabase(SQLDatabase):
+    """
+    SQLDatabase that serves repeated read-only queries from SQL_RESULT_CACHE.
+
+    Results are keyed on the normalized SQL text and the version (file
+    signature) of the database they were read from, so a rewritten database
+    never serves stale rows.
+    """
+
+    def __init__(self, *args, db_path: str, version: Tuple, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.db_path = db_path
+        self.version = version
+
+    def run(self, command, fetch="all", include_columns=False, *, parameters=None, execution_options=None):
+        if not isinstance(command, str) or fetch == "cursor":
+            return super().run(command, fetch, include_columns, parameters=parameters, execution_options=execution_options)
+        sql = normalize_sql(command)
+        if not is_cacheable(sql):
+            return super().run(command, fetch, include_columns, parameters=parameters, execution_options=execution_options)
+
+        key = (self.db_path, self.version, sql, fetch, include_columns, repr(sorted((parameters or {}).items())))
+        result = SQL_RESULT_CACHE.get(key)
+        if result is None:
+            result = super().run(command, fetch, include_columns, parameters=parameters, execution_options=execution_options)
+            SQL_RESULT_CACHE.put(key, result)
+        return result
+
+
+def validated_sql(intermediate_steps) -> Optional[str]:
+    """
+    The SQL that answered a question, from the agent's intermediate steps.
+
+    Only an answer backed by exactly one successful sql_db_query call is
+    reusable on its own; answers combining several queries are not cached.
+    """
+    queries = []
+    for action, observation in intermediate_steps:
+        if action.tool != "sql_db_query" or str(observation).startswith("Error:"):
+            continue
+        tool_input = action.tool_input
+        queries.append(tool_input.get("query") if isinstance(tool_input, dict) else tool_input)
+    return queries[0] if len(queries) == 1 and queries[0] else None
+
+
+class SQLSession:
+    """
+    Engine, reflected SQLDatabase and SQL agent for one database file.
+
+    The schema is reflected once, and the table descriptions the agent reads
+    (CREATE TABLE statements with sample rows) are computed once and passed to
+    SQLDatabase as custom table info, so agent calls do not re-query them.
+    The statements the agent runs are recorded by the database's
+    QueryIndexAdvisor (see index_advisor), and their results are cached (see
+    CachedSQLDatabase). ask() also remembers the SQL that answered each
+    question, so a repeated question skips the agent.
+    """
+
+    def __init__(self, db_path: str, llm, sample_rows: int = 3) -> None:
+        """
+        Build the session.
+
+        Args:
+            db_path (str): Path to the SQLite database file.
+            llm: LangChain chat model driving the SQL agent.
+            sample_rows (int): Sample rows included in each table description.
+        """
+        self.db_path = db_path
+        self.llm = llm
+        # signature follows the file through the index advisor's own writes (new
+        # indexes and statistics leave every result unchanged); version keys the
+        # caches and stays put
+        self.signature = self.version = file_signature(db_path)
+        # Pooled connections are handed to whichever Gradio worker thread asks
+        self.engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+        self.index_advisor = index_advisor_for(db_path)
+        self.index_advisor.attach(self.engine)
+
+        metadata = MetaData()
+        metadata.reflect(bind=self.engine)
+        reflected = SQLDatabase(self.engine, metadata=metadata, lazy_table_reflection=True,
+                                sample_rows_in_table_info=sample_rows)
+        self.table_names = sorted(reflected.get_usable_table_names())
+        self.table_info = {table: reflected.get_table_info([table]) for table in self.table_names}
+
+        self.db = CachedSQLDatabase(self.engine, metadata=metadata, lazy_table_reflection=True,
+                                    custom_table_info=self.table_info, db_path=db_path, version=self.version)
+        self.agent_executor = create_sql_agent(llm, db=self.db, agent_type="openai-tools", verbose=True,
+                                               agent_executor_kwargs={"return_intermediate_steps": True})
+
+    def ask(self, question: str) -> str:
+        """
+        Answer a question about the database.
+
+        A question asked before against the same database version reruns the
+        SQL that answered it (usually a result cache hit) and makes a single LLM
+        call to phrase the answer, instead of the agent's round trips for
+        listing tables, reading schemas, and writing and checking the query.
+
+        Args:
+            question (str): The user's question.
+
+        Returns:
+            str: The answer.
+        """
+        key = (self.db_path, self.version, normalize_question(question))
+        sql = SQL_QUESTION_CACHE.get(key)
+        if sql is not None:
+            result = self.db.run_no_throw(sql)
+            if not str(result).startswith("Error:"):
+                print(f"Reusing the SQL of a previous identical question: {sql}")
+                response = self.llm.invoke(ANSWER_PROMPT.format(question=question, query=sql, result=result))
+                return response.content
+            SQL_QUESTION_CACHE.remove(key)
+
+        response = self.agent_executor.invoke({"input": question})
+        sql = validated_sql(response.get("intermediate_steps", []))
+        if sql is not None:
+            SQL_QUESTION_CACHE.put(key, sql)
+        return response["output"]
+
+    def close(self) -> None:
+        """Close the pooled connections."""
+        self.engine.dispose()
+
+
+class SQLSessionRegistry:
+    """
+    Process-wide cache of SQLSessions, one per database file.
+
+    A session is reused until the database file changes on disk (or invalidate()
+    is called), then rebuilt on the next request. Changes made by the database's
+    own index advisor only add indexes and statistics, so they keep the session
+    and its cached results. Lookups cost one stat() per file; building is
+    serialized per database, so concurrent requests for the same file share one
+    build.
+    """
+
+    def __init__(self) -> None:
+        self._sessions: Dict[str, SQLSession] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _db_lock(self, db_path: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(db_path, threading.Lock())
+
+    def get(self, db_path: str, llm) -> SQLSession:
+        """
+        Return the session for a database, building it if it is missing or stale.
+
+        Args:
+            db_path (str): Path to the SQLite database file.
+            llm: LangChain chat model for the SQL agent, used when a session is built.
+
+        Returns:
+            SQLSession: The session for the current contents of the file.
+        """
+        db_path = os.path.abspath(db_path)
+        session = self._sessions.get(db_path)
+        if session is not None and self._is_current(session):
+            return session
+
+        with self._db_lock(db_path):
+            session = self._sessions.get(db_path)
+            if session is not None and self._is_current(session):
+                return session
+            if session is not None:
+                print(f"Database {db_path} changed, rebuilding its SQL session")
+                session.close()
+                invalidate_query_caches(db_path)
+            session = SQLSession(db_path, llm)
+            self._sessions[db_path] = session
+            return session
+
+    @staticmethod
+    def _is_current(session: SQLSession) -> bool:
+        signature = file_signature(session.db_path)
+        if session.signature == signature:
+            return True
+        if session.index_advisor.wrote(session.signature, signature):
+            session.signature = signature
+            return True
+        return False
+
+    def invalidate(self, db_path: str) -> None:
+        """
+        Drop the session and cached query results of a database, e.g. after its tables were rewritten.
+
+        Args:
+            db_path (str): Path to the SQLite database file.
+        """
+        db_path = os.path.abspath(db_path)
+        with self._db_lock(db_path):
+            session = self._sessions.pop(db_path, None)
+            invalidate_query_caches(db_path)
+        if session is not None:
+            session.close()
+
+
+SQL_SESSIONS = SQLSessionRegistry()
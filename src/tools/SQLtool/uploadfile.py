@@ -1,8 +1,10 @@
 import os
-from typing import List, Tuple
+from typing import Iterator, List, Tuple
 from load_config import LoadConfig
 from sqlalchemy import create_engine, inspect
-import pandas as pd
+from parallel_loader import ingest_files
+from index_advisor import advise_after_load
+from sql_session import SQL_SESSIONS
 APPCFG = LoadConfig()
 
 
@@ -10,8 +12,8 @@ class ProcessFiles:
     """
     A class to process uploaded files, converting them to a SQL database format.
 
-    This class handles both CSV and XLSX files, reading them into pandas DataFrames and
-    storing each as a separate table in the SQL database specified by the application configuration.
+    This class handles both CSV and XLSX files, parsing them in parallel and storing each
+    as a separate table in the SQL database specified by the application configuration.
     """
     def __init__(self, files_dir: List, chatbot: List) -> None:
         """
@@ -24,34 +26,51 @@ class ProcessFiles:
         APPCFG = LoadConfig()
         self.files_dir = files_dir
         self.chatbot = chatbot
-        db_path = APPCFG.uploaded_files_sqldb_directory
-        db_path = f"sqlite:///{db_path}"
-        self.engine = create_engine(db_path)
+        self.db_path = APPCFG.uploaded_files_sqldb_directory
+        self.engine = create_engine(f"sqlite:///{self.db_path}")
         print("Number of uploaded files:", len(self.files_dir))
 
-    def _process_uploaded_files(self) -> Tuple:
+    def _process_uploaded_files(self) -> Iterator[Tuple]:
         """
         Private method to process the uploaded files and store them into the SQL database.
 
-        Returns:
+        Files are parsed on a process pool and written by a single writer (see
+        parallel_loader.ingest_files); a message is added to the chatbot as each
+        file is loaded or fails. The loaded tables are then profiled and indexed
+        on their likely filter and join columns.
+
+        Yields:
             Tuple[str, List]: A tuple containing an empty string and the updated chatbot conversation list.
         """
+        files = []
         for file_dir in self.files_dir:
             file_names_with_extensions = os.path.basename(file_dir)
             file_name, file_extension = os.path.splitext(
                 file_names_with_extensions)
-            if file_extension == ".csv":
-                df = pd.read_csv(file_dir)
-            elif file_extension == ".xlsx":
-                df = pd.read_excel(file_dir)
-            else:
+            if file_extension not in (".csv", ".xlsx"):
                 raise ValueError("The selected file type is not supported")
-            df.to_sql(file_name, self.engine, index=False)
+            files.append((file_dir, file_name))
+
+        loaded_tables = []
+        for progress in ingest_files(files, self.db_path, if_exists="fail"):
+            file_name = os.path.basename(progress.file_path)
+            if progress.error is None:
+                loaded_tables.append(progress.table_name)
+                message = f"Loaded {file_name} into table '{progress.table_name}' ({progress.rows} rows, {progress.seconds:.1f}s)"
+            else:
+                message = f"Could not load {file_name}: {progress.error}"
+            print(message)
+            self.chatbot.append((" ", message))
+            yield "", self.chatbot
+        if loaded_tables:
+            advise_after_load(self.db_path, loaded_tables)
+            # Cached query results and question SQL may describe the old tables
+            SQL_SESSIONS.invalidate(self.db_path)
         print("==============================")
         print("All csv/xlsx files are saved into the sql database.")
         self.chatbot.append(
             (" ", "Uploaded files are ready. Please ask your question"))
-        return "", self.chatbot
+        yield "", self.chatbot
 
     def _validate_db(self):
         """
@@ -63,6 +82,16 @@ class ProcessFiles:
         print("Available table nasmes in created SQL DB:", table_names)
         print("==============================")
 
+    def run_stream(self) -> Iterator[Tuple]:
+        """
+        public method to execute the file processing pipeline, yielding the chatbot after each loaded file.
+
+        Yields:
+            Tuple[str, List]: A tuple containing an empty string and the updated chatbot conversation list.
+        """
+        yield from self._process_uploaded_files()
+        self._validate_db()
+
     def run(self):
         """
         public method to execute the file processing pipeline.
@@ -72,8 +101,8 @@ class ProcessFiles:
         Returns:
             Tuple[str, List]: A tuple containing an empty string and the updated chatbot conversation list.
         """
-        input_txt, chatbot = self._process_uploaded_files()
-        self._validate_db()
+        for input_txt, chatbot in self.run_stream():
+            pass
         return input_txt, chatbot
 
 
@@ -87,18 +116,19 @@ class UploadFile:
         """
         Run the appropriate pipeline based on chatbot functionality.
 
+        A generator, so Gradio shows each file's progress message as it is loaded.
+
         Args:
             files_dir (List): List of paths to uploaded files.
             chatbot (List): The current state of the chatbot's dialogue.
             chatbot_functionality (str): A string specifying the chatbot's current functionality.
 
-        Returns:
-            Tuple: A tuple of an empty string and the updated chatbot list, or None if functionality not matched.
+        Yields:
+            Tuple: A tuple of an empty string and the updated chatbot list; nothing if functionality not matched.
         """
         if chatbot_functionality == "Process files":
             pipeline_instance = ProcessFiles(
                 files_dir=files_dir, chatbot=chatbot)
-            input_txt, chatbot = pipeline_instance.run()
-            return input_txt, chatbot
+            yield from pipeline_instance.run_stream()
         else:
-            pass # Other functionalities can be implemented here.
\ No newline at end of file
+            pass # Other functionalities can be implemented here.
@@ -0,0 +1,119 @@
+import os
+import sys
+import zlib
+import tempfile
+
+import numpy as np
+import pytest
+
+TOOL_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "src", "tools", "Retrevaltool"))
+sys.path.insert(0, TOOL_DIR)
+
+# Set before embedding.py is imported: its module-level cache is bound to this path, and
+# the chat models it pulls in want a key even though the tests never call them
+os.environ.setdefault("EMBEDDING_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "embedding_cache.sqlite"))
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+
+class FakeEmbeddings:
+    """Deterministic bag-of-words vectors, so similar texts land close together."""
+
+    def __init__(self, dim=32, model="fake-embeddings"):
+        self.dim = dim
+        self.model = model
+        self.calls = 0
+        self.query_batches = 0
+        self.embedded = []
+        self.fail_on_call = None
+
+    def _vector(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in text.lower().split():
+            vector[zlib.crc32(word.encode("utf-8")) % self.dim] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        if self.calls == self.fail_on_call:
+            raise RuntimeError("embedding request failed")
+        self.embedded.extend(texts)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+    def embed_queries(self, texts):
+        self.query_batches += 1
+        return [self._vector(text) for text in texts]
+
+    async def aembed_query(self, text):
+        return self._vector(text)
+
+
+@pytest.fixture
+def fake_embeddings(monkeypatch):
+    """Replace the embedding backend of the retrieval modules with FakeEmbeddings."""
+    import embedding
+    import retriver
+
+    fake = FakeEmbeddings()
+    monkeypatch.setattr(embedding, "embeddings", fake)
+    monkeypatch.setattr(retriver, "embeddings", fake)
+    return fake
+
+
+@pytest.fixture
+def write_pdf():
+    """Function writing a PDF with one page per text."""
+    import fitz
+
+    def write(path, pages):
+        doc = fitz.open()
+        for text in pages:
+            doc.new_page().insert_text((72, 72), text)
+        doc.save(str(path))
+        doc.close()
+        return str(path)
+
+    return write
+
+
+@pytest.fixture
+def retrieval_tool(tmp_path, fake_embeddings):
+    """RetrievalTool reading PDFs from tmp_path/input and writing its index under tmp_path/output."""
+    import retriver
+
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    output = tmp_path / "output"
+    tool = retriver.RetrievalTool(
+        input_dir=str(input_dir),
+        index_path=str(output / "faiss_index.index"),
+        doc_store_path=str(output / "docstore.sqlite"),
+        manifest_path=str(output / "manifest.json"),
+        lexical_index_path=str(output / "lexical_index.bin"),
+    )
+    yield tool
+    if tool._service is not None:
+        tool._service.close()
+
+
+ANSWER = "Solar panels convert sunlight [Source: solar.pdf (page 1)]."
+
+
+@pytest.fixture
+def answer_chain(monkeypatch):
+    """Replace the citation chain with a fake chat model that answers ANSWER, streamed word by word; returns the inputs it was given."""
+    import itertools
+
+    from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+    from langchain_core.messages import AIMessage
+    from langchain_core.runnables import RunnableLambda
+
+    import citation
+
+    inputs = []
+    model = GenericFakeChatModel(messages=itertools.repeat(AIMessage(ANSWER)))
+    monkeypatch.setattr(citation, "chain", RunnableLambda(lambda chain_inputs: inputs.append(chain_inputs) or "prompt") | model)
+    return inputs
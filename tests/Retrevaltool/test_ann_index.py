@@ -0,0 +1,65 @@
+import faiss
+import numpy as np
+import pytest
+
+from ann_index import build_index, index_type_of, ivf_nlist, maybe_rebuild, select_index_type
+
+
+def random_vectors(n, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.standard_normal((n, dim)).astype(np.float32), np.arange(n, dtype=np.int64)
+
+
+def flat_index(vectors, ids):
+    index = faiss.IndexIDMap(faiss.IndexFlatL2(vectors.shape[1]))
+    index.add_with_ids(vectors, ids)
+    return index
+
+
+@pytest.mark.parametrize("index_type, expected", [("ivf_pq", "sq8"), ("ivf_sq8", "sq8"), ("ivf_flat", "flat")])
+def test_too_few_vectors_fall_back_to_untrained_type(index_type, expected):
+    vectors, ids = random_vectors(12)
+
+    index = build_index(index_type, vectors, ids)
+
+    assert index_type_of(index) == expected
+    assert index.ntotal == 12
+
+
+def test_pq_needs_a_full_codebook_of_training_vectors():
+    vectors, ids = random_vectors(200)
+    assert 39 * ivf_nlist(200) <= 200
+
+    assert index_type_of(build_index("ivf_pq", vectors, ids)) == "sq8"
+    assert index_type_of(build_index("ivf_flat", vectors, ids)) == "ivf_flat"
+
+
+def test_pq_is_built_once_there_are_enough_vectors():
+    vectors, ids = random_vectors(2000)
+
+    index = build_index("ivf_pq", vectors, ids)
+
+    assert index_type_of(index) == "ivf_pq"
+    assert index.ntotal == 2000
+
+
+def test_tight_memory_budget_on_a_small_corpus_does_not_crash():
+    vectors, ids = random_vectors(12)
+    assert select_index_type(12, 16, memory_budget_bytes=1) == "ivf_pq"
+
+    index = maybe_rebuild(flat_index(vectors, ids), "auto", memory_budget_bytes=1)
+
+    assert index_type_of(index) == "sq8"
+    # Already the fallback type, so a second pass leaves it alone
+    assert maybe_rebuild(index, "auto", memory_budget_bytes=1) is index
+
+
+def test_rebuilt_index_keeps_ids_searchable():
+    vectors, ids = random_vectors(3000)
+
+    index = maybe_rebuild(flat_index(vectors, ids), "ivf_flat")
+    faiss.extract_index_ivf(index.index).nprobe = ivf_nlist(3000)
+    _, found = index.search(vectors[:5], 1)
+
+    assert index_type_of(index) == "ivf_flat"
+    assert found[:, 0].tolist() == ids[:5].tolist()
@@ -0,0 +1,76 @@
+import asyncio
+import threading
+
+
+def test_concurrent_queries_overlap_their_embedding_calls(retrieval_tool, fake_embeddings, write_pdf, answer_chain, monkeypatch):
+    write_pdf(f"{retrieval_tool.input_dir}/solar.pdf", ["solar panels convert sunlight"])
+    write_pdf(f"{retrieval_tool.input_dir}/wind.pdf", ["wind turbines spin in storms"])
+    in_flight, peak = 0, 0
+    embed = fake_embeddings.aembed_query
+
+    async def slow_embed(text):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.1)
+        in_flight -= 1
+        return await embed(text)
+
+    monkeypatch.setattr(fake_embeddings, "aembed_query", slow_embed)
+    queries = ["solar panels", "wind turbines", "sunlight", "storms"]
+
+    async def run_all():
+        return await asyncio.gather(*(retrieval_tool._arun(query) for query in queries))
+
+    answers = asyncio.run(run_all())
+
+    assert peak > 1
+    assert [answer["query"] for answer in answers] == queries
+    assert len(answer_chain) == len(queries)
+    assert [answer["sources"][0]["file"] for answer in answers] == ["solar.pdf", "wind.pdf", "solar.pdf", "wind.pdf"]
+
+
+def test_async_stream_matches_the_sync_answer(retrieval_tool, write_pdf, answer_chain):
+    write_pdf(f"{retrieval_tool.input_dir}/solar.pdf", ["solar panels convert sunlight"])
+    retrieval_tool.index_pdfs()
+
+    async def stream():
+        return [event async for event in retrieval_tool.astream_query_index("solar panels", mode="vector")]
+
+    events = asyncio.run(stream())
+    answered = retrieval_tool.query_index("solar panels", mode="vector")
+
+    assert "".join(event["content"] for event in events[:-1]) == events[-1]["response"]
+    assert answered == {key: value for key, value in events[-1].items() if key != "type"}
+    assert len(answer_chain) == 1
+
+
+def test_async_query_embedding_keeps_blocking_work_off_the_event_loop(tmp_path, fake_embeddings, monkeypatch):
+    import embedding
+    from embedding_cache import CachedEmbeddings, EmbeddingCache
+
+    blocking_threads = []
+
+    def load_backend(backend):
+        blocking_threads.append(threading.get_ident())
+        return fake_embeddings
+
+    class RecordingCache(EmbeddingCache):
+        def get_many(self, model, texts):
+            blocking_threads.append(threading.get_ident())
+            return super().get_many(model, texts)
+
+        def put_many(self, model, texts, vectors):
+            blocking_threads.append(threading.get_ident())
+            super().put_many(model, texts, vectors)
+
+    monkeypatch.setattr(embedding, "load_embedding_backend", load_backend)
+    embeddings = CachedEmbeddings(embedding.DeferredEmbeddings("openai"), RecordingCache(str(tmp_path / "cache.sqlite")),
+                                  model="fake-embeddings")
+
+    vector = asyncio.run(embeddings.aembed_query("solar panels"))
+
+    assert vector == fake_embeddings.embed_query("solar panels")
+    # the cache read, the backend load and the cache write all ran on worker threads
+    assert len(blocking_threads) == 3
+    assert threading.get_ident() not in blocking_threads
@@ -0,0 +1,35 @@
+from embedding import load_index, query_embeddings, query_embeddings_batch
+
+TOPICS = ["solar panels convert sunlight", "wind turbines spin in storms", "rivers carve deep canyons",
+          "glaciers move slowly downhill", "volcanoes erupt molten rock"]
+
+
+def test_batch_matches_single_queries_with_one_query_embedding_call(retrieval_tool, fake_embeddings, write_pdf):
+    for i, topic in enumerate(TOPICS):
+        write_pdf(f"{retrieval_tool.input_dir}/doc{i}.pdf", [topic])
+    retrieval_tool.index_pdfs()
+    index, docstore = load_index(retrieval_tool.index_path, retrieval_tool.doc_store_path)
+    queries = ["sunlight panels", "canyons rivers", "molten rock", "no words in common"]
+    try:
+        calls = fake_embeddings.calls
+        batch = query_embeddings_batch(index, queries, docstore, top_k=2)
+
+        assert fake_embeddings.query_batches == 1
+        assert fake_embeddings.calls == calls
+        assert len(batch) == len(queries)
+        assert batch.all_results() == [query_embeddings(index, query, docstore, top_k=2) for query in queries]
+        assert [results[0].text.strip() for results in batch.all_results()[:3]] == [TOPICS[0], TOPICS[2], TOPICS[4]]
+    finally:
+        docstore.close()
+
+
+def test_batch_pads_missing_hits(retrieval_tool, write_pdf):
+    write_pdf(f"{retrieval_tool.input_dir}/only.pdf", [TOPICS[0]])
+    retrieval_tool.index_pdfs()
+    index, docstore = load_index(retrieval_tool.index_path, retrieval_tool.doc_store_path)
+    try:
+        results = query_embeddings_batch(index, ["sunlight"], docstore, top_k=3).results(0)
+
+        assert [result.text is None for result in results] == [False, True, True]
+    finally:
+        docstore.close()
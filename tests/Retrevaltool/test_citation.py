@@ -0,0 +1,42 @@
+from citation import build_citation_inputs, resolve_citations, retrieve_information_citation
+from context_builder import ContextBlock
+from embedding import SearchResult
+
+
+def block(*sources):
+    return ContextBlock("x", None, "text", [source["doc_id"] for source in sources], list(sources), 0, 1)
+
+
+def source(doc_id, file=None, page=None, char_start=None, char_end=None):
+    return {"doc_id": doc_id, "file": file, "page": page, "char_start": char_start, "char_end": char_end}
+
+
+def test_citations_come_from_chunk_metadata():
+    blocks = [block(source("a.pdf_page2_7", "a.pdf", 2, 10, 60), source("a.pdf_page2_8", "a.pdf", 2, 50, 120)),
+              block(source("b.pdf_page5_9", "b.pdf", 5))]
+
+    citation_text, sources = resolve_citations(blocks)
+
+    assert citation_text == "a.pdf (page 2)\nb.pdf (page 5)"
+    assert [(s["doc_id"], s["char_start"], s["char_end"]) for s in sources] == [
+        ("a.pdf_page2_7", 10, 60), ("a.pdf_page2_8", 50, 120), ("b.pdf_page5_9", None, None)]
+
+
+def test_chunks_without_a_page_are_cited_by_file():
+    citation_text, _ = resolve_citations([block(source("notes", "notes"))])
+
+    assert citation_text == "notes"
+
+
+def test_answer_carries_the_sources_sent_in_the_prompt(answer_chain):
+    results = [SearchResult("solar panels convert sunlight", "solar.pdf_page1_0", 0.1,
+                            {"vector_id": 0, "file": "solar.pdf", "page": 1, "char_start": 0, "char_end": 29}),
+               SearchResult(None, None, None)]
+
+    inputs, _, _ = build_citation_inputs("solar", results)
+    answer = retrieve_information_citation("solar", results)
+
+    assert answer_chain == [inputs]
+    assert "[Source: solar.pdf (page 1)]\nsolar panels convert sunlight" in inputs["results"]
+    assert answer["citations"] == inputs["citation"] == "solar.pdf (page 1)"
+    assert answer["sources"] == [source("solar.pdf_page1_0", "solar.pdf", 1, 0, 29)]
@@ -0,0 +1,65 @@
+import pytest
+
+import context_builder
+from context_builder import build_context, build_context_blocks, overlap_length, parse_doc_id
+from embedding import SearchResult
+
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    monkeypatch.setattr(context_builder, "_count_tokens", lambda text: len(text.split()))
+
+
+def hit(text, vector_id, file="a.pdf", page=1, score=0.0):
+    return SearchResult(text, f"{file}_page{page}_{vector_id}", score,
+                        {"vector_id": vector_id, "file": file, "page": page, "char_start": None, "char_end": None})
+
+
+def test_parse_doc_id():
+    assert parse_doc_id("report_v2.pdf_page12_345") == ("report_v2.pdf", 12, 345)
+    assert parse_doc_id("legacy-id") == ("legacy-id", None, None)
+
+
+def test_overlap_length():
+    assert overlap_length("alpha beta gamma", "beta gamma delta") == len("beta gamma")
+    assert overlap_length("alpha", "omega") == 0
+
+
+def test_adjacent_chunks_merge_without_repeating_their_overlap():
+    results = [hit("pumps need oil every month", 8), hit("the manual says pumps need oil", 7)]
+
+    [block] = build_context_blocks(results)
+
+    assert block.text == "the manual says pumps need oil every month"
+    assert block.doc_ids == ["a.pdf_page1_7", "a.pdf_page1_8"]
+    assert block.rank == 0
+
+
+def test_duplicates_contained_chunks_and_empty_results_are_dropped():
+    results = [hit("pumps need oil every month", 3), hit("need oil", 9), hit("pumps need oil every month", 3),
+               SearchResult(None, None, None), hit("valves", 4, page=2)]
+
+    blocks = build_context_blocks(results)
+
+    assert [(block.page, block.text) for block in blocks] == [(1, "pumps need oil every month"), (2, "valves")]
+    assert blocks[0].doc_ids == ["a.pdf_page1_3", "a.pdf_page1_9"]
+
+
+def test_blocks_are_packed_best_first_within_the_budget():
+    results = [hit("one two three", 1, page=1), hit("four five six seven", 2, page=2), hit("eight", 3, page=3)]
+
+    blocks = build_context_blocks(results, max_tokens=4)
+
+    assert [block.text for block in blocks] == ["one two three", "eight"]
+
+
+def test_an_oversized_best_block_is_truncated_at_a_word():
+    blocks = build_context_blocks([hit("one two three four five", 1)], max_tokens=3)
+
+    assert [(block.text, block.tokens) for block in blocks] == [("one two three", 3)]
+
+
+def test_context_names_each_source():
+    context, _ = build_context([hit("first", 1, "a.pdf", 2), hit("second", 5, "b.pdf", 7)])
+
+    assert context == "[Source: a.pdf (page 2)]\nfirst\n\n[Source: b.pdf (page 7)]\nsecond"
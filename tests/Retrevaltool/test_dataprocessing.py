@@ -0,0 +1,82 @@
+import os
+
+import dataprocessing
+
+
+def test_stream_yields_page_batches_in_file_and_page_order(tmp_path, write_pdf):
+    first = write_pdf(tmp_path / "first.pdf", [f"first page {n}" for n in range(1, 6)])
+    second = write_pdf(tmp_path / "second.pdf", ["second page 1", "second page 2"])
+
+    batches = list(dataprocessing.stream_pdf_chunks([first, second], num_workers=2, pages_per_task=2, max_pending=2))
+
+    assert [(file_path, [m["page"] for m in metadata]) for file_path, _, metadata, _, _ in batches] == [
+        (first, [1, 2]), (first, [3, 4]), (first, [5]), (second, [1, 2])]
+    assert [chunk.strip() for _, chunks, _, _, _ in batches for chunk in chunks] == (
+        [f"first page {n}" for n in range(1, 6)] + ["second page 1", "second page 2"])
+
+
+def test_stream_skips_unreadable_files(tmp_path, write_pdf):
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"not a pdf")
+    good = write_pdf(tmp_path / "good.pdf", ["readable"])
+
+    batches = list(dataprocessing.stream_pdf_chunks([str(broken), good], num_workers=1))
+
+    assert [file_path for file_path, _, _, _, _ in batches] == [good]
+
+
+def test_worker_pool_is_reused_across_runs(tmp_path, write_pdf):
+    pdf = write_pdf(tmp_path / "doc.pdf", ["some text"])
+
+    dataprocessing.extract_pdf(pdf, num_workers=2)
+    pool = dataprocessing.get_worker_pool(2)
+    dataprocessing.extract_pdf(pdf, num_workers=2)
+
+    assert dataprocessing.get_worker_pool(2) is pool
+    assert dataprocessing.get_worker_pool(1) is not pool
+
+
+def test_open_document_reopens_an_edited_file(tmp_path, write_pdf):
+    path = write_pdf(tmp_path / "doc.pdf", ["old text"])
+    doc = dataprocessing.open_document(path)
+    assert dataprocessing.open_document(path) is doc
+
+    write_pdf(path, ["new text"])
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 10**9))
+
+    assert dataprocessing.open_document(path).load_page(0).get_text().strip() == "new text"
+
+
+def test_extract_pages_chunks_text_pages_and_lists_image_pages(tmp_path, write_pdf):
+    path = write_pdf(tmp_path / "mixed.pdf", ["intro text", "", "closing text"])
+
+    chunks, metadata, image_pages, error = dataprocessing.extract_pages((path, [0, 1, 2]))
+
+    assert [chunk.strip() for chunk in chunks] == ["intro text", "closing text"]
+    assert [(m["file"], m["page"]) for m in metadata] == [("mixed.pdf", 1), ("mixed.pdf", 3)]
+    assert image_pages == [1]
+    assert error is None
+    for m in metadata:
+        page_text = dataprocessing.open_document(path).load_page(m["page"] - 1).get_text()
+        assert page_text[m["char_start"]:m["char_end"]] == m["text"]
+
+
+def test_chunk_offsets_follow_overlapping_chunks():
+    text = "abc abc abc"
+
+    assert dataprocessing.chunk_offsets(text, ["abc", "abc", "rewritten", "abc"]) == [0, 4, None, 8]
+
+
+def test_extract_pages_reports_a_failed_batch_without_its_chunks(tmp_path, write_pdf, monkeypatch):
+    path = write_pdf(tmp_path / "damaged.pdf", ["readable text", "damaged page"])
+    doc = dataprocessing.open_document(path)
+
+    class DamagedDocument:
+        def load_page(self, page_num):
+            if page_num == 1:
+                raise RuntimeError("damaged page")
+            return doc.load_page(page_num)
+
+    monkeypatch.setattr(dataprocessing, "open_document", lambda file_path: DamagedDocument())
+
+    assert dataprocessing.extract_pages((path, [0, 1])) == ([], [], [], "RuntimeError: damaged page")
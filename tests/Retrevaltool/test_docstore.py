@@ -0,0 +1,70 @@
+import glob
+import os
+
+import numpy as np
+
+from docstore import DocumentStore, SearchFilter
+
+
+def chunk(text, file="a.pdf", page=1, **extra):
+    return {"text": text, "file": file, "page": page, **extra}
+
+
+def blobs(store_path):
+    return sorted(os.path.basename(path) for path in glob.glob(f"{os.path.splitext(store_path)[0]}.*text"))
+
+
+def test_round_trip_survives_reopen(tmp_path):
+    path = str(tmp_path / "docstore.sqlite")
+    store = DocumentStore(path)
+    store.add([(0, "a_page1_0", chunk("héllo wörld", char_start=3, char_end=14)), (1, "b_page2_1", chunk("second", "b.pdf", 2))])
+    store.commit()
+    store.close()
+
+    reopened = DocumentStore(path)
+    documents = reopened.get([1, 0, 99])
+
+    assert set(documents) == {0, 1}
+    assert documents[0]["text"] == "héllo wörld"
+    assert (documents[0]["char_start"], documents[0]["char_end"]) == (3, 14)
+    assert (documents[1]["file"], documents[1]["page"], documents[1]["doc_id"]) == ("b.pdf", 2, "b_page2_1")
+    assert reopened.max_id() == 1 and len(reopened) == 2
+
+
+def test_compaction_drops_dead_text_and_keeps_readers_working(tmp_path):
+    path = str(tmp_path / "docstore.sqlite")
+    writer = DocumentStore(path)
+    writer.add((i, f"doc{i}", chunk(f"chunk number {i} " * 20)) for i in range(100))
+    writer.commit()
+    reader = DocumentStore(path)
+    assert reader.get([5])[5]["text"].startswith("chunk number 5 ")
+
+    writer.delete(list(range(50)))
+    writer.commit()
+    assert writer.dead_bytes() > 0
+    writer.compact()
+
+    assert writer.dead_bytes() == 0
+    assert writer.get([75])[75]["text"] == "chunk number 75 " * 20
+    # The reader opened before the compaction follows it to the new blob
+    assert reader.get([60, 10]) == {60: writer.get([60])[60]}
+    # The replaced blob is kept for such readers until the next open
+    assert blobs(path) == ["docstore.1.text", "docstore.text"]
+    reader.close()
+    DocumentStore(path).close()
+    assert blobs(path) == ["docstore.1.text"]
+
+
+def test_search_filter_matches_files_pages_and_ingestion_time(tmp_path):
+    store = DocumentStore(str(tmp_path / "docstore.sqlite"))
+    store.add([
+        (0, "d0", chunk("x", "a.pdf", 1, ingested_at=100.0)),
+        (1, "d1", chunk("x", "a.pdf", 5, ingested_at=200.0)),
+        (2, "d2", chunk("x", "b.pdf", 2, ingested_at=300.0)),
+    ])
+
+    assert store.matching_ids(SearchFilter(files="a.pdf")).tolist() == [0, 1]
+    assert store.matching_ids(SearchFilter(pages=(2, 5))).tolist() == [1, 2]
+    assert store.matching_ids(SearchFilter(ingested_after=150, ingested_before=300)).tolist() == [1]
+    assert np.array_equal(store.matching_ids(SearchFilter()), [0, 1, 2])
+    assert SearchFilter(files=["b.pdf", "a.pdf"]) == SearchFilter(files=("a.pdf", "b.pdf"))
@@ -0,0 +1,98 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from embedding_cache import PROJECT_ROOT, CachedEmbeddings, EmbeddingCache
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.requests = []
+
+    def embed_documents(self, texts):
+        self.requests.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        # a query embeds differently from the same text as a document
+        self.requests.append([text])
+        return [float(len(text)), 2.0]
+
+
+def test_vectors_round_trip_and_whitespace_variants_share_an_entry(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"))
+    cache.put_many("model-a", ["hello  world"], [np.array([1.0, 2.0])])
+
+    hit, miss, other_model = cache.get_many("model-a", ["hello world", "bye"]) + cache.get_many("model-b", ["hello world"])
+
+    assert hit.tolist() == [1.0, 2.0]
+    assert miss is None and other_model is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_cache_persists_and_evicts_least_recently_used(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = EmbeddingCache(path, max_entries=2)
+    cache.put_many("m", ["a"], [[1.0]])
+    cache.put_many("m", ["b"], [[2.0]])
+    cache.get_many("m", ["a"])
+    cache.put_many("m", ["c"], [[3.0]])
+    cache.close()
+
+    reopened = EmbeddingCache(path, max_entries=2)
+
+    assert len(reopened) == 2
+    assert [vector is not None for vector in reopened.get_many("m", ["a", "b", "c"])] == [True, False, True]
+
+
+def test_cached_embeddings_only_send_misses_once(tmp_path):
+    model = CountingEmbeddings()
+    embeddings = CachedEmbeddings(model, EmbeddingCache(str(tmp_path / "cache.sqlite")), model="counting")
+
+    first = embeddings.embed_documents(["alpha", "beta", "alpha"])
+    second = embeddings.embed_documents(["beta", "gamma"])
+
+    assert model.requests == [["alpha", "beta"], ["gamma"]]
+    assert first[0] == first[2] == [5.0, 1.0]
+    assert second == [[4.0, 1.0], [5.0, 1.0]]
+
+
+def test_query_vectors_are_cached_apart_from_documents(tmp_path):
+    model = CountingEmbeddings()
+    embeddings = CachedEmbeddings(model, EmbeddingCache(str(tmp_path / "cache.sqlite")), model="counting")
+    embeddings.embed_documents(["alpha"])
+
+    assert embeddings.embed_query("alpha") == [5.0, 2.0]
+    assert embeddings.embed_queries(["alpha", "beta", "beta"]) == [[5.0, 2.0], [4.0, 2.0], [4.0, 2.0]]
+    assert embeddings.embed_documents(["beta"]) == [[4.0, 1.0]]
+    assert model.requests == [["alpha"], ["alpha"], ["beta"], ["beta"]]
+
+
+def test_default_path_is_resolved_from_the_project_root(tmp_path):
+    env = {key: value for key, value in os.environ.items() if key != "EMBEDDING_CACHE_PATH"}
+    tool_dir = os.path.join(PROJECT_ROOT, "src", "tools", "Retrevaltool")
+    path = subprocess.run(
+        [sys.executable, "-c", f"import sys; sys.path.insert(0, {tool_dir!r}); "
+                               "from embedding_cache import EMBEDDING_CACHE_PATH; print(EMBEDDING_CACHE_PATH)"],
+        cwd=tmp_path, env=env, capture_output=True, text=True, check=True,
+    ).stdout.strip()
+
+    assert path == os.path.join(PROJECT_ROOT, "data", "output", "embedding_cache.sqlite")
+
+
+def test_importing_embedding_creates_no_cache_until_first_use(tmp_path):
+    path = tmp_path / "cache" / "embedding_cache.sqlite"
+    tool_dir = os.path.join(PROJECT_ROOT, "src", "tools", "Retrevaltool")
+    subprocess.run(
+        [sys.executable, "-c", f"import sys; sys.path.insert(0, {tool_dir!r}); import embedding"],
+        cwd=tmp_path, env=dict(os.environ, EMBEDDING_CACHE_PATH=str(path)), check=True,
+    )
+    assert not path.parent.exists()
+
+    cache = EmbeddingCache(str(path))
+    assert not path.parent.exists()
+    assert cache.get_many("m", ["a"]) == [None]
+    assert path.exists()
+    cache.close()
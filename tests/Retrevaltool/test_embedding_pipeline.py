@@ -0,0 +1,83 @@
+import threading
+
+import pytest
+
+import embedding_pipeline
+from embedding_pipeline import EmbeddingPipeline, load_token_counter
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+def fake_embed(texts):
+    return [[float(len(text)), 0.0] for text in texts]
+
+
+@pytest.fixture
+def offline_tiktoken(monkeypatch):
+    attempts = []
+
+    def get_encoding(name):
+        attempts.append(name)
+        raise ConnectionError("no network")
+
+    monkeypatch.setattr(embedding_pipeline.tiktoken, "get_encoding", get_encoding)
+    load_token_counter.cache_clear()
+    yield attempts
+    load_token_counter.cache_clear()
+
+
+def test_offline_tiktoken_is_tried_once_per_process(offline_tiktoken):
+    pipelines = [EmbeddingPipeline(fake_embed) for _ in range(3)]
+
+    assert offline_tiktoken == ["cl100k_base"]
+    assert pipelines[0].count_tokens("x" * 40) == 11
+
+
+def test_batches_are_bounded_by_tokens_and_size(offline_tiktoken):
+    pipeline = EmbeddingPipeline(fake_embed, max_batch_tokens=30, max_batch_size=3)
+    items = [("x" * 36, i) for i in range(7)]
+
+    batches = [[payload for _, payload, _ in batch] for batch in pipeline.pack_batches(items)]
+
+    # 10 estimated tokens per text: three fit under 30 tokens
+    assert batches == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_every_item_is_embedded_once_with_its_payload(offline_tiktoken):
+    pipeline = EmbeddingPipeline(fake_embed, max_in_flight=3, max_batch_size=2)
+    texts = [f"text {'x' * i}" for i in range(9)]
+
+    results = {payload: vector.tolist() for payloads, vectors in pipeline.run((text, i) for i, text in enumerate(texts))
+               for payload, vector in zip(payloads, vectors)}
+
+    assert results == {i: [float(len(text)), 0.0] for i, text in enumerate(texts)}
+    assert pipeline.stats()["chunks"] == 9 and pipeline.stats()["batches"] == 5
+
+
+def test_rate_limits_back_off_and_retry(offline_tiktoken):
+    calls = []
+    lock = threading.Lock()
+
+    def flaky_embed(texts):
+        with lock:
+            calls.append(list(texts))
+            if len(calls) <= 2:
+                raise RateLimitError("slow down")
+        return fake_embed(texts)
+
+    pipeline = EmbeddingPipeline(flaky_embed, max_in_flight=2, max_batch_size=1, base_delay=0.01, max_delay=0.02)
+    embedded = [payload for payloads, _ in pipeline.run((f"t{i}", i) for i in range(4)) for payload in payloads]
+
+    assert sorted(embedded) == [0, 1, 2, 3]
+    assert pipeline.rate_limited == 2
+    assert len(calls) == 6
+
+
+def test_other_errors_are_raised(offline_tiktoken):
+    def broken_embed(texts):
+        raise ValueError("bad input")
+
+    with pytest.raises(ValueError):
+        list(EmbeddingPipeline(broken_embed).run([("a", 0)]))
@@ -0,0 +1,82 @@
+import faiss
+import numpy as np
+import pytest
+
+from ann_index import mmr
+from docstore import DocumentStore, SearchFilter
+from embedding import query_embeddings
+from vector_store import VectorStore
+
+# Two near-duplicate chunks of a.pdf right next to the query, then one chunk of b.pdf and one of c.pdf further off
+VECTORS = np.array([[1.0, 0.0, 0.0], [0.99, 0.01, 0.0], [0.7, 0.7, 0.0], [0.0, 0.0, 1.0]], dtype=np.float32)
+FILES = ["a.pdf", "a.pdf", "b.pdf", "c.pdf"]
+QUERY = [1.0, 0.0, 0.3]
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    index = faiss.IndexIDMap(faiss.IndexFlatL2(3))
+    index.add_with_ids(VECTORS, np.arange(4, dtype=np.int64))
+    vector_store = VectorStore(str(tmp_path / "index.vectors"))
+    vector_store.add(list(range(4)), VECTORS)
+    vector_store.commit()
+    docstore = DocumentStore(str(tmp_path / "docstore.sqlite"))
+    docstore.add((i, f"doc{i}", {"text": f"chunk {i}", "file": file, "page": i + 1}) for i, file in enumerate(FILES))
+    docstore.commit()
+    yield index, vector_store, docstore
+    docstore.close()
+
+
+def result_ids(results):
+    return [result.metadata["vector_id"] for result in results if result.metadata]
+
+
+def test_plain_search_returns_the_near_duplicates(corpus):
+    index, vector_store, docstore = corpus
+
+    results = query_embeddings(index, None, docstore, top_k=2, query_vector=QUERY, vector_store=vector_store, mmr_lambda=1.0)
+
+    assert result_ids(results) == [0, 1]
+
+
+def test_mmr_swaps_a_near_duplicate_for_another_source(corpus):
+    index, vector_store, docstore = corpus
+
+    results = query_embeddings(index, None, docstore, top_k=2, query_vector=QUERY, vector_store=vector_store,
+                               mmr_lambda=0.5, mmr_candidates=4)
+
+    assert result_ids(results) == [0, 3]
+
+
+def test_filter_restricts_hits_and_pads_when_nothing_matches(corpus):
+    index, vector_store, docstore = corpus
+
+    filtered = query_embeddings(index, None, docstore, top_k=2, query_vector=QUERY, vector_store=vector_store,
+                                search_filter=SearchFilter(files=["b.pdf", "c.pdf"]), mmr_lambda=1.0)
+    empty = query_embeddings(index, None, docstore, top_k=2, query_vector=QUERY,
+                             search_filter=SearchFilter(files="missing.pdf"))
+
+    assert result_ids(filtered) == [2, 3]
+    assert [result.text for result in empty] == [None, None]
+
+
+def test_mmr_with_lambda_one_keeps_similarity_order():
+    assert mmr(np.array(QUERY), VECTORS, 3, lambda_mult=1.0) == [0, 1, 2]
+
+
+def test_filter_fields_combine_and_normalize(tmp_path):
+    from datetime import datetime, timezone
+
+    docstore = DocumentStore(str(tmp_path / "dated.sqlite"))
+    docstore.add([(0, "a0", {"text": "x", "file": "a.pdf", "page": 1, "ingested_at": 100.0}),
+                  (1, "a1", {"text": "x", "file": "a.pdf", "page": 5, "ingested_at": 200.0}),
+                  (2, "b0", {"text": "x", "file": "b.pdf", "page": 3, "ingested_at": 300.0})])
+    docstore.commit()
+    try:
+        assert docstore.matching_ids(SearchFilter(pages=(2, 5))).tolist() == [1, 2]
+        assert docstore.matching_ids(SearchFilter(files="a.pdf", pages=(2, 5))).tolist() == [1]
+        assert docstore.matching_ids(SearchFilter(ingested_after=datetime.fromtimestamp(200, timezone.utc),
+                                                  ingested_before=300)).tolist() == [1]
+        assert SearchFilter(files=["b.pdf", "a.pdf"]) == SearchFilter(files=("a.pdf", "b.pdf"))
+    finally:
+        docstore.close()
@@ -0,0 +1,85 @@
+import math
+
+import pytest
+
+from lexical_index import LexicalIndex, decode_varints, encode_varint, reciprocal_rank_fusion, tokenize
+
+DOCUMENTS = {
+    0: "error code AB-1234 raised by the pump controller",
+    1: "the pump controller manual",
+    2: "pump pump pump maintenance schedule",
+    3: "firmware version 4.2.1 release notes",
+}
+
+
+@pytest.fixture
+def lexical_index(tmp_path):
+    index = LexicalIndex(str(tmp_path / "lexical.bin"))
+    for vector_id, text in DOCUMENTS.items():
+        index.add(vector_id, text)
+    return index
+
+
+def test_tokenize_keeps_identifiers_whole_and_split():
+    assert tokenize("Error AB-1234 in v4.2") == ["error", "ab-1234", "ab", "1234", "in", "v4.2", "v4", "2"]
+
+
+def test_varints_round_trip():
+    encoded = bytearray()
+    values = [0, 1, 127, 128, 300, 2**31]
+    for value in values:
+        encode_varint(value, encoded)
+
+    assert decode_varints(bytes(encoded)).tolist() == values
+
+
+def test_rare_terms_and_higher_frequency_rank_first(lexical_index):
+    assert [vector_id for vector_id, _ in lexical_index.search("ab-1234", top_k=3)] == [0]
+    assert [vector_id for vector_id, _ in lexical_index.search("4.2.1", top_k=3)] == [3]
+    # "pump" is in three chunks, but three times in chunk 2
+    assert lexical_index.search("pump", top_k=3)[0][0] == 2
+    # "manual" is rarer than "controller", so chunk 1 wins over chunk 0
+    assert [vector_id for vector_id, _ in lexical_index.search("controller manual", top_k=2)] == [1, 0]
+
+
+def test_bm25_score_of_a_single_term(lexical_index):
+    [(vector_id, score)] = lexical_index.search("firmware", top_k=3)
+
+    average_length = lexical_index.total_length / len(lexical_index)
+    length = len(tokenize(DOCUMENTS[3]))
+    idf = math.log(1 + (4 - 1 + 0.5) / (1 + 0.5))
+    expected = idf * 1 * 2.2 / (1 + 1.2 * (1 - 0.75 + 0.75 * length / average_length))
+    assert vector_id == 3
+    assert score == pytest.approx(expected)
+
+
+def test_allowed_ids_and_no_match(lexical_index):
+    assert [vector_id for vector_id, _ in lexical_index.search("pump", top_k=3, allowed_ids=[0, 1])] == [1, 0]
+    assert lexical_index.search("turbine") == []
+
+
+def test_deleted_chunks_disappear_and_survive_compaction_and_reload(lexical_index):
+    lexical_index.delete([2, 3])
+    assert [vector_id for vector_id, _ in lexical_index.search("pump", top_k=3)] == [1, 0]
+
+    lexical_index.save()
+    reloaded = LexicalIndex.load(lexical_index.index_path)
+
+    assert reloaded.tombstones == 0
+    assert "firmware" not in reloaded.postings
+    assert len(reloaded) == 2
+    assert reloaded.search("pump", top_k=3) == lexical_index.search("pump", top_k=3)
+    reloaded.add(4, "new pump")
+    assert reloaded.search("new", top_k=3)[0][0] == 4
+
+
+def test_ids_must_increase(lexical_index):
+    with pytest.raises(ValueError):
+        lexical_index.add(3, "late chunk")
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1]], k=60)
+
+    assert [vector_id for vector_id, _ in fused] == [1, 3, 2]
+    assert fused[0][1] == pytest.approx(1 / 61 + 1 / 62)
@@ -0,0 +1,79 @@
+import queue
+import threading
+
+import numpy as np
+import pytest
+
+from embedding import DeferredEmbeddings, embedding_model_name
+from local_embeddings import LocalEmbeddings, model_name_for
+
+
+class LengthEmbeddings(LocalEmbeddings):
+    """LocalEmbeddings with the model swapped for one embedding a text as its length, recording each batch."""
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.batches = []
+        self.busy = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+        self._queries = queue.Queue()
+        self._worker = threading.Thread(target=self._serve_queries, daemon=True)
+        self._worker.start()
+
+    def _embed_batch(self, texts):
+        self.busy.set()
+        self.release.wait()
+        self.batches.append(list(texts))
+        return np.array([[float(len(text))] for text in texts], dtype=np.float32)
+
+
+def test_documents_are_batched_by_length_and_returned_in_input_order():
+    model = LengthEmbeddings(batch_size=2)
+    texts = ["ccc", "a", "dddd", "bb", "eeeee"]
+
+    vectors = model.embed_documents(texts)
+
+    assert vectors == [[3.0], [1.0], [4.0], [2.0], [5.0]]
+    assert model.batches == [["a", "bb"], ["ccc", "dddd"], ["eeeee"]]
+
+
+def test_waiting_queries_share_one_batch():
+    model = LengthEmbeddings(batch_size=8)
+    model.release.clear()
+    first = model._submit_query("blocking")
+    # The others queue up while the model works on the first query
+    assert model.busy.wait(timeout=5)
+    rest = [model._submit_query("q" * n) for n in range(1, 4)]
+    model.release.set()
+
+    assert first.result(timeout=5) == [8.0]
+    assert [future.result(timeout=5) for future in rest] == [[1.0], [2.0], [3.0]]
+    assert model.batches == [["blocking"], ["q", "qq", "qqq"]]
+
+
+def test_query_batches_go_through_the_query_batcher():
+    model = LengthEmbeddings(batch_size=8)
+    texts = ["ccc", "a", "bb"]
+
+    assert model.embed_queries(texts) == [model.embed_query(text) for text in texts] == [[3.0], [1.0], [2.0]]
+
+
+def test_unknown_quantization_is_rejected_before_loading_a_model():
+    with pytest.raises(ValueError):
+        LocalEmbeddings(quantize="fp4")
+
+
+def test_backend_names_and_deferred_loading(monkeypatch):
+    import embedding
+
+    monkeypatch.setattr(embedding, "LOCAL_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+    monkeypatch.setattr(embedding, "LOCAL_EMBEDDING_QUANTIZE", "int8")
+    assert embedding_model_name("local") == model_name_for("all-MiniLM-L6-v2", "int8") == "all-MiniLM-L6-v2:int8"
+    assert model_name_for("all-MiniLM-L6-v2") == "all-MiniLM-L6-v2"
+    with pytest.raises(ValueError):
+        embedding_model_name("gpu")
+
+    deferred = DeferredEmbeddings("local")
+    assert deferred.model == "all-MiniLM-L6-v2:int8"
+    assert deferred._embeddings is None
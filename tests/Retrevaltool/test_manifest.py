@@ -0,0 +1,151 @@
+import os
+
+from manifest import IngestionManifest, compress_ids, expand_ids
+
+
+def write(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+
+def ingest(manifest, paths):
+    """Record every added or changed file the way RetrievalTool does."""
+    changes = manifest.diff(paths)
+    for path in changes.removed:
+        manifest.forget(path)
+    for path in changes.to_index:
+        start, end = manifest.allocate_ids(2)
+        manifest.record(path, changes.stats[path], range(start, end))
+    return changes
+
+
+def test_id_ranges_round_trip():
+    assert compress_ids([5, 1, 2, 3, 9]) == [[1, 4], [5, 6], [9, 10]]
+    assert expand_ids(compress_ids([5, 1, 2, 3, 9])) == [1, 2, 3, 5, 9]
+
+
+def test_diff_reports_added_changed_and_removed_files(tmp_path):
+    a = write(tmp_path / "a.pdf", b"aaa")
+    b = write(tmp_path / "b.pdf", b"bbb")
+    c = write(tmp_path / "c.pdf", b"ccc")
+    manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+    assert manifest.diff([a, b]).added == [os.path.abspath(a), os.path.abspath(b)]
+    ingest(manifest, [a, b])
+    manifest.save()
+
+    write(tmp_path / "b.pdf", b"bbb, edited")
+    changes = IngestionManifest.load(manifest.manifest_path).diff([b, c])
+
+    assert changes.added == [os.path.abspath(c)]
+    assert changes.changed == [os.path.abspath(b)]
+    assert changes.removed == [os.path.abspath(a)]
+    assert changes.to_remove == [os.path.abspath(b), os.path.abspath(a)]
+
+
+def test_unchanged_files_are_not_rehashed_and_touched_files_are_refreshed(tmp_path):
+    a = write(tmp_path / "a.pdf", b"aaa")
+    manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+    ingest(manifest, [a])
+
+    assert not manifest.diff([a])
+    os.utime(a, (1, 1))
+    changes = manifest.diff([a])
+
+    assert not changes
+    assert changes.refreshed == [os.path.abspath(a)]
+    assert not manifest.diff([a])
+
+
+def test_vector_ids_and_next_id_survive_a_save(tmp_path):
+    paths = [write(tmp_path / f"{name}.pdf", name.encode()) for name in "abc"]
+    manifest = IngestionManifest(str(tmp_path / "manifest.json"), embedding_model="model", shards=2)
+    ingest(manifest, paths)
+    manifest.save()
+
+    loaded = IngestionManifest.load(manifest.manifest_path)
+
+    assert [loaded.vector_ids(path) for path in paths] == [[0, 1], [2, 3], [4, 5]]
+    assert (loaded.next_id, loaded.embedding_model, loaded.shards) == (6, "model", 2)
+    assert loaded.allocate_ids(3) == (6, 9)
+
+
+def test_manifest_of_another_version_is_ignored(tmp_path):
+    path = tmp_path / "manifest.json"
+    path.write_text('{"version": 0, "files": {"x": {}}, "next_id": 10}')
+
+    manifest = IngestionManifest.load(str(path))
+
+    assert manifest.files == {} and manifest.next_id == 0
+
+
+def test_reindexing_embeds_only_new_and_changed_files(tmp_path, fake_embeddings, write_pdf):
+    import retriver
+    from docstore import DocumentStore
+
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    write_pdf(input_dir / "a.pdf", ["alpha report"])
+    write_pdf(input_dir / "b.pdf", ["beta report"])
+    tool = retriver.RetrievalTool(input_dir=str(input_dir), index_path=str(tmp_path / "index.faiss"),
+                                  doc_store_path=str(tmp_path / "docstore.sqlite"),
+                                  manifest_path=str(tmp_path / "manifest.json"),
+                                  lexical_index_path=str(tmp_path / "lexical.bin"))
+    tool.index_pdfs()
+    assert sorted(text.strip() for text in fake_embeddings.embedded) == ["alpha report", "beta report"]
+
+    fake_embeddings.embedded.clear()
+    tool.index_pdfs()
+    assert fake_embeddings.embedded == []
+
+    write_pdf(input_dir / "b.pdf", ["beta report, second edition"])
+    os.remove(input_dir / "a.pdf")
+    tool.index_pdfs()
+
+    assert [text.strip() for text in fake_embeddings.embedded] == ["beta report, second edition"]
+    docstore = DocumentStore(tool.doc_store_path)
+    try:
+        assert [document["text"].strip() for _, document in docstore.items()] == ["beta report, second edition"]
+    finally:
+        docstore.close()
+
+
+def test_a_file_that_fails_to_parse_is_left_out_and_retried(tmp_path, fake_embeddings, write_pdf, monkeypatch):
+    import retriver
+    from docstore import DocumentStore
+
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    write_pdf(input_dir / "a.pdf", ["alpha report"])
+    broken = write_pdf(input_dir / "b.pdf", ["beta report"])
+    tool = retriver.RetrievalTool(input_dir=str(input_dir), index_path=str(tmp_path / "index.faiss"),
+                                  doc_store_path=str(tmp_path / "docstore.sqlite"),
+                                  manifest_path=str(tmp_path / "manifest.json"),
+                                  lexical_index_path=str(tmp_path / "lexical.bin"))
+
+    stream_pdf_chunks = retriver.stream_pdf_chunks
+
+    def failing_stream(pdf_files):
+        for batch in stream_pdf_chunks(pdf_files):
+            yield batch
+            if batch[0] == os.path.abspath(broken):
+                # a later page batch of the same file fails after the first one was parsed
+                yield batch[0], [], [], [], "RuntimeError: damaged page"
+
+    monkeypatch.setattr(retriver, "stream_pdf_chunks", failing_stream)
+    tool.index_pdfs()
+
+    manifest = IngestionManifest.load(tool.manifest_path)
+    assert list(manifest.files) == [os.path.abspath(input_dir / "a.pdf")]
+    docstore = DocumentStore(tool.doc_store_path)
+    try:
+        assert [document["text"].strip() for _, document in docstore.items()] == ["alpha report"]
+    finally:
+        docstore.close()
+
+    monkeypatch.setattr(retriver, "stream_pdf_chunks", stream_pdf_chunks)
+    fake_embeddings.embedded.clear()
+    tool.index_pdfs()
+
+    assert [text.strip() for text in fake_embeddings.embedded] == ["beta report"]
+    assert sorted(IngestionManifest.load(tool.manifest_path).files) == sorted(
+        os.path.abspath(input_dir / name) for name in ("a.pdf", "b.pdf"))
@@ -0,0 +1,128 @@
+import time
+
+from query_cache import QueryCache
+
+
+def cached_on(version, **options):
+    """QueryCache that has served a lookup for an index version, as RetrievalTool does before every put."""
+    cache = QueryCache(**options)
+    cache.lookup("", version=version)
+    cache.misses = 0
+    return cache
+
+
+def test_exact_tier_normalizes_the_query_and_skips_embedding():
+    cache = cached_on(1)
+    cache.put("What is  BM25?", "answer", "hybrid", version=1)
+    embedded = []
+
+    value, vector = cache.lookup("what is bm25?", "hybrid", 1, embed=lambda q: embedded.append(q) or [1.0, 0.0])
+
+    assert (value, vector) == ("answer", None)
+    assert embedded == []
+    assert cache.exact_hits == 1
+
+
+def test_semantic_tier_uses_the_similarity_threshold_and_namespace():
+    cache = cached_on(1, similarity_threshold=0.95)
+    cache.put("solar power", "solar answer", "vector", version=1, query_vector=[1.0, 0.0])
+
+    close, _ = cache.lookup("sun energy", "vector", 1, embed=lambda q: [0.99, 0.05])
+    far, vector = cache.lookup("wind power", "vector", 1, embed=lambda q: [0.6, 0.8])
+    other_mode, _ = cache.lookup("sun energy", "hybrid", 1, embed=lambda q: [0.99, 0.05])
+
+    assert close == "solar answer"
+    assert far is None and vector == [0.6, 0.8]
+    assert other_mode is None
+    assert (cache.semantic_hits, cache.misses) == (1, 2)
+
+
+def test_a_new_index_version_drops_every_answer():
+    cache = cached_on(1)
+    cache.put("query", "old answer", version=1, query_vector=[1.0])
+
+    assert cache.lookup("query", version=2, embed=lambda q: [1.0]) == (None, [1.0])
+    assert len(cache) == 0
+    assert cache.invalidations == 1
+
+
+def test_an_answer_put_after_a_version_change_is_dropped():
+    cache = cached_on(1)
+    # A query searched version 1, then version 2 was published and looked up by another query
+    cache.lookup("new query", version=2)
+    cache.put("new query", "new answer", version=2)
+
+    cache.put("old query", "old answer", version=1)
+
+    assert cache.version == 2
+    assert cache.lookup("new query", version=2)[0] == "new answer"
+    assert cache.lookup("old query", version=2)[0] is None
+    assert (cache.invalidations, cache.stale_puts) == (0, 1)
+
+
+def test_least_recently_used_answers_are_evicted():
+    cache = QueryCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.lookup("a")
+    cache.put("c", 3)
+
+    assert [cache.lookup(query)[0] for query in ("a", "b", "c")] == [1, None, 3]
+    assert cache.evictions == 1
+
+
+def test_answers_expire_after_the_ttl(monkeypatch):
+    cache = QueryCache(ttl=10)
+    cache.put("query", "answer", query_vector=[1.0])
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+
+    assert cache.lookup("query", embed=lambda q: [1.0]) == (None, [1.0])
+    assert cache.expirations == 1
+
+
+def test_retrieval_tool_answers_a_repeated_query_from_the_cache(retrieval_tool, write_pdf, monkeypatch):
+    import retriver
+
+    answers = []
+
+    def answer(query, results):
+        answers.append(query)
+        return {"content": f"answer to {query}", "citations": [], "sources": [r.doc_id for r in results if r.doc_id]}
+
+    monkeypatch.setattr(retriver, "retrieve_information_citation", answer)
+    write_pdf(f"{retrieval_tool.input_dir}/solar.pdf", ["solar panels convert sunlight"])
+    retrieval_tool.index_pdfs()
+
+    first = retrieval_tool.query_index("solar panels", mode="vector")
+    second = retrieval_tool.query_index("  Solar Panels ", mode="vector")
+
+    assert answers == ["solar panels"]
+    assert second == {**first, "query": "  Solar Panels "}
+
+
+def test_an_answer_generated_while_a_new_version_is_published_is_not_cached(retrieval_tool, write_pdf, monkeypatch):
+    import retriver
+
+    answers = []
+
+    def answer(query, results):
+        answers.append(query)
+        if len(answers) == 1:
+            # While the first answer is generated, a new version is published and another query answered on it
+            write_pdf(f"{retrieval_tool.input_dir}/wind.pdf", ["wind turbines spin in storms"])
+            retrieval_tool.index_pdfs()
+            retrieval_tool.query_index("wind turbines", mode="vector")
+        return {"content": f"answer to {query}", "citations": [], "sources": []}
+
+    monkeypatch.setattr(retriver, "retrieve_information_citation", answer)
+    write_pdf(f"{retrieval_tool.input_dir}/solar.pdf", ["solar panels convert sunlight"])
+    retrieval_tool.index_pdfs()
+
+    retrieval_tool.query_index("solar panels", mode="vector")
+    retrieval_tool.query_index("wind turbines", mode="vector")
+    retrieval_tool.query_index("solar panels", mode="vector")
+
+    assert answers == ["solar panels", "wind turbines", "solar panels"]
+    assert retrieval_tool.query_cache.version == retrieval_tool.service.version
+    assert retrieval_tool.query_cache.stale_puts == 1
@@ -0,0 +1,55 @@
+import pytest
+
+from retrieval_service import RetrievalService
+
+
+def open_service(tool):
+    # Reloads are driven by the tests through refresh()
+    return RetrievalService(tool.index_path, tool.doc_store_path, tool.lexical_index_path, reload_interval=3600, mode="vector")
+
+
+def test_no_published_index(retrieval_tool):
+    service = open_service(retrieval_tool)
+    try:
+        assert service.version == 0
+        with pytest.raises(FileNotFoundError):
+            service.search("anything")
+    finally:
+        service.close()
+
+
+def test_refresh_swaps_in_a_newly_published_version(retrieval_tool, write_pdf):
+    write_pdf(f"{retrieval_tool.input_dir}/solar.pdf", ["solar panels convert sunlight"])
+    retrieval_tool.index_pdfs()
+    service = open_service(retrieval_tool)
+    try:
+        first_version = service.version
+        assert [result.text.strip() for result in service.search("sunlight", top_k=1)] == ["solar panels convert sunlight"]
+        assert service.refresh() is False
+
+        write_pdf(f"{retrieval_tool.input_dir}/wind.pdf", ["wind turbines spin in storms"])
+        retrieval_tool.index_pdfs()
+
+        assert service.refresh() is True
+        assert service.version > first_version
+        assert service.search("wind turbines spin", top_k=1)[0].text.strip() == "wind turbines spin in storms"
+    finally:
+        service.close()
+
+
+def test_pinned_snapshot_outlives_a_reload(retrieval_tool, write_pdf):
+    write_pdf(f"{retrieval_tool.input_dir}/solar.pdf", ["solar panels convert sunlight"])
+    retrieval_tool.index_pdfs()
+    service = open_service(retrieval_tool)
+    try:
+        with service.snapshot() as pinned:
+            write_pdf(f"{retrieval_tool.input_dir}/wind.pdf", ["wind turbines spin in storms"])
+            retrieval_tool.index_pdfs()
+            service.refresh()
+
+            # The old version's document store stays open until the query releases it
+            assert pinned.index.ntotal == 1
+            assert pinned.docstore.get([0])[0]["text"].strip() == "solar panels convert sunlight"
+        assert service._snapshot.index.ntotal == 2
+    finally:
+        service.close()
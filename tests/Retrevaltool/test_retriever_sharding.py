@@ -0,0 +1,78 @@
+import os
+
+import faiss
+import pytest
+
+import retriver
+from docstore import DocumentStore
+from sharded_index import shard_path
+
+
+@pytest.fixture
+def sharded_tool(tmp_path, monkeypatch, fake_embeddings, write_pdf):
+    monkeypatch.setattr(retriver, "FAISS_SHARDS", 3)
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    for i in range(6):
+        write_pdf(input_dir / f"f{i}.pdf", [f"file {i} page {page} about topic {i * page}" for page in range(3)])
+    output = tmp_path / "output"
+    return retriver.RetrievalTool(
+        input_dir=str(input_dir),
+        index_path=str(output / "faiss_index.index"),
+        doc_store_path=str(output / "docstore.sqlite"),
+        manifest_path=str(output / "manifest.json"),
+        lexical_index_path=str(output / "lexical_index.bin"),
+    )
+
+
+def shard_ids(tool):
+    ids = []
+    for shard in range(3):
+        path = shard_path(tool.index_path, shard, 3)
+        if os.path.exists(path):
+            index = faiss.read_index(path)
+            ids.extend(faiss.vector_to_array(index.id_map).tolist())
+    return ids
+
+
+def test_retry_after_failed_shard_does_not_reuse_ids(sharded_tool, fake_embeddings):
+    # Every file gets its own embedding call, so the second call fails in the second written shard
+    fake_embeddings.fail_on_call = 2
+    with pytest.raises(RuntimeError):
+        sharded_tool.index_pdfs()
+
+    sharded_tool.index_pdfs()
+
+    ids = shard_ids(sharded_tool)
+    assert len(ids) == len(set(ids)) == 18
+    docstore = DocumentStore(sharded_tool.doc_store_path)
+    try:
+        assert len(docstore) == 18
+        assert sorted(ids) == [vector_id for vector_id, _ in docstore.items()]
+    finally:
+        docstore.close()
+
+
+def test_fan_out_search_matches_one_unsharded_index():
+    from concurrent.futures import ThreadPoolExecutor
+
+    import numpy as np
+
+    from ann_index import build_index
+    from sharded_index import ShardedIndex
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((300, 8)).astype(np.float32)
+    ids = np.arange(300, dtype=np.int64)
+    queries = vectors[:10] + 0.01
+    shards = [(build_index("flat", vectors[ids % 3 == shard], ids[ids % 3 == shard]), None) for shard in range(3)]
+    shards.append((build_index("flat", vectors[:0], ids[:0]), None))
+
+    with ThreadPoolExecutor(3) as executor:
+        distances, vector_ids = ShardedIndex(shards, executor).search(queries, 5)
+    expected_distances, expected_ids = build_index("flat", vectors, ids).search(queries, 5)
+
+    assert np.array_equal(vector_ids, expected_ids)
+    assert np.allclose(distances, expected_distances)
+    _, allowed = ShardedIndex(shards).search(queries[:1], 2, allowed_ids=np.array([4, 5, 6]))
+    assert len(set(allowed[0].tolist())) == 2 and set(allowed[0].tolist()) <= {4, 5, 6}
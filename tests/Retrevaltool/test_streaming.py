@@ -0,0 +1,28 @@
+def index_solar(tool, write_pdf):
+    write_pdf(f"{tool.input_dir}/solar.pdf", ["solar panels convert sunlight"])
+    tool.index_pdfs()
+
+
+def test_stream_yields_tokens_then_the_full_answer(retrieval_tool, write_pdf, answer_chain):
+    index_solar(retrieval_tool, write_pdf)
+
+    events = list(retrieval_tool.stream_query_index("solar panels", mode="vector"))
+
+    tokens, final = events[:-1], events[-1]
+    assert len(tokens) > 1 and all(event["type"] == "token" for event in tokens)
+    assert final["type"] == "final"
+    assert final["response"] == "".join(event["content"] for event in tokens)
+    assert final["response"].startswith("Solar panels convert sunlight")
+    assert final["citations"] == "solar.pdf (page 1)"
+
+
+def test_streamed_answer_is_cached_for_query_index(retrieval_tool, write_pdf, answer_chain):
+    index_solar(retrieval_tool, write_pdf)
+    *_, streamed = retrieval_tool.stream_query_index("solar panels", mode="vector")
+
+    answered = retrieval_tool.query_index("solar panels", mode="vector")
+    cached_stream = list(retrieval_tool.stream_query_index("solar panels", mode="vector"))
+
+    assert len(answer_chain) == 1
+    assert answered == {key: value for key, value in streamed.items() if key != "type"}
+    assert cached_stream == [streamed]
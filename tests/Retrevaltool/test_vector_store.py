@@ -0,0 +1,79 @@
+import numpy as np
+
+from ann_index import build_index, search
+from vector_store import VectorStore
+
+
+def random_vectors(n=2000, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.standard_normal((n, dim)).astype(np.float32), np.arange(n, dtype=np.int64)
+
+
+def test_rows_are_found_by_id_after_reopening(tmp_path):
+    path = str(tmp_path / "index.vectors")
+    store = VectorStore(path)
+    store.add([10, 3], np.array([[1.0, 2.0], [3.0, 4.0]]))
+    store.commit()
+    store.add([7], np.array([[5.0, 6.0]]))
+    store.close()
+
+    reopened = VectorStore.open(path)
+    vectors, found = reopened.get([3, 7, 10])
+
+    # Rows added after the last commit are not visible
+    assert found.tolist() == [True, False, True]
+    assert vectors[[0, 2]].tolist() == [[3.0, 4.0], [1.0, 2.0]]
+
+
+def test_compaction_keeps_live_rows_and_open_readers(tmp_path):
+    path = str(tmp_path / "index.vectors")
+    store = VectorStore(path)
+    vectors, ids = random_vectors(100, 4)
+    store.add(ids, vectors)
+    store.commit()
+    reader = VectorStore.open(path)
+
+    store.compact(ids[ids % 2 == 0])
+
+    assert len(store) == 50
+    kept, found = store.get([0, 1, 98])
+    assert found.tolist() == [True, False, True]
+    assert np.array_equal(kept[[0, 2]], vectors[[0, 98]])
+    # A reader mapped before the compaction still sees its generation
+    assert reader.get([1])[1].all()
+
+
+def test_quantized_search_is_reranked_to_exact_order(tmp_path):
+    vectors, ids = random_vectors()
+    store = VectorStore(str(tmp_path / "index.vectors"))
+    store.add(ids, vectors)
+    store.commit()
+    queries = vectors[:20] + 0.05
+    exact = build_index("flat", vectors, ids)
+    quantized = build_index("sq8", vectors, ids)
+
+    _, expected = exact.search(queries, 10)
+    _, reranked = search(quantized, queries, 10, vector_store=store, rerank_factor=4)
+    _, approximate = search(quantized, queries, 10, vector_store=None)
+
+    assert np.array_equal(reranked, expected)
+    assert (approximate == expected).mean() <= (reranked == expected).mean()
+
+
+def test_memory_mapped_index_answers_like_the_loaded_one(tmp_path):
+    import faiss
+
+    from embedding import load_index
+
+    vectors, ids = random_vectors()
+    index_path = str(tmp_path / "index.faiss")
+    faiss.write_index(build_index("sq8", vectors, ids), index_path)
+    queries = vectors[:5] + 0.05
+
+    loaded, docstore = load_index(index_path, str(tmp_path / "docstore.sqlite"))
+    docstore.close()
+    mapped, docstore = load_index(index_path, str(tmp_path / "docstore.sqlite"), use_mmap=True)
+    docstore.close()
+
+    assert mapped.ntotal == loaded.ntotal == len(ids)
+    assert np.array_equal(mapped.search(queries, 10)[1], loaded.search(queries, 10)[1])
@@ -0,0 +1,63 @@
+import os
+import sys
+import sqlite3
+from typing import Any, List
+
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+TOOL_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "src", "tools", "SQLtool"))
+sys.path.insert(0, TOOL_DIR)
+
+# Both tools use flat imports and share some module names (query_cache, benchmarks);
+# drop the retrieval tool's copies so the SQL tests import this tool's modules
+for name, module in list(sys.modules.items()):
+    module_file = getattr(module, "__file__", None) or ""
+    if module_file.endswith(f"{name}.py") and os.path.dirname(os.path.abspath(module_file)) != TOOL_DIR \
+            and os.path.exists(os.path.join(TOOL_DIR, f"{name}.py")):
+        del sys.modules[name]
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Chat model replying with the given messages in turn; tool binding is a no-op."""
+
+    responses: List[Any]
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        response = self.responses[min(self.calls, len(self.responses) - 1)]
+        self.calls += 1
+        return ChatResult(generations=[ChatGeneration(message=response)])
+
+
+@pytest.fixture
+def sql_agent_llm():
+    """Function building a model for an agent that runs one query, then gives the answer to every later call."""
+
+    def script(query, answer):
+        return ScriptedChatModel(responses=[
+            AIMessage(content="", tool_calls=[{"name": "sql_db_query", "args": {"query": query}, "id": "call_1"}]),
+            AIMessage(content=answer),
+        ])
+
+    return script
+
+
+@pytest.fixture
+def orders_db(tmp_path):
+    """SQLite database with a 20,000-row orders table and no indexes."""
+    db_path = str(tmp_path / "orders.db")
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE orders (order_id INTEGER, customer_id INTEGER, category TEXT, amount REAL)")
+        conn.executemany("INSERT INTO orders VALUES (?, ?, ?, ?)",
+                         [(i, i % 100, ("books", "toys", "garden")[i % 3], i * 0.5) for i in range(20_000)])
+    return db_path
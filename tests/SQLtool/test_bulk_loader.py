@@ -0,0 +1,91 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import bulk_loader
+from bulk_loader import key_columns, load_table, sqlite_type
+
+
+def rows(db_path, sql):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute(sql).fetchall()
+
+
+def test_csv_is_loaded_in_chunks_with_inferred_types_and_key_indexes(tmp_path):
+    csv_path = tmp_path / "orders.csv"
+    pd.DataFrame({"order_id": range(10), "price": [i + 0.5 for i in range(10)], "customer": list("abcdefghij"),
+                  "placed": pd.date_range("2024-01-01", periods=10)}).to_csv(csv_path, index=False)
+    db_path = str(tmp_path / "db.sqlite")
+
+    assert load_table(csv_path, db_path, "orders", chunk_rows=3) == 10
+
+    columns = rows(db_path, "SELECT name, type FROM pragma_table_info('orders')")
+    assert columns == [("order_id", "INTEGER"), ("price", "REAL"), ("customer", "TEXT"), ("placed", "TEXT")]
+    assert rows(db_path, "SELECT COUNT(*), SUM(order_id), MAX(price) FROM orders") == [(10, 45, 9.5)]
+    assert rows(db_path, "SELECT name FROM sqlite_master WHERE type = 'index'") == [("ix_orders_order_id",)]
+
+
+def test_types_that_change_past_the_sample_fall_back_to_per_chunk_inference(tmp_path, monkeypatch):
+    monkeypatch.setattr(bulk_loader, "INFER_ROWS", 5)
+    csv_path = tmp_path / "mixed.csv"
+    # code looks numeric in the sample, then turns into text; qty gets a blank
+    pd.DataFrame({"code": [str(i) for i in range(8)] + ["X-9", "X-10"],
+                  "qty": [1, 2, 3, 4, 5, 6, 7, 8, None, 10]}).to_csv(csv_path, index=False)
+    db_path = str(tmp_path / "db.sqlite")
+
+    assert load_table(csv_path, db_path, "items", chunk_rows=4) == 10
+
+    assert rows(db_path, "SELECT COUNT(*) FROM items") == [(10,)]
+    assert rows(db_path, "SELECT code, qty FROM items WHERE rowid IN (1, 9, 10) ORDER BY rowid") == [
+        (0, 1), ("X-9", None), ("X-10", 10)]
+
+
+def test_if_exists_modes(tmp_path):
+    csv_path = tmp_path / "t.csv"
+    pd.DataFrame({"id": [1, 2]}).to_csv(csv_path, index=False)
+    db_path = str(tmp_path / "db.sqlite")
+    load_table(csv_path, db_path, "t")
+
+    load_table(csv_path, db_path, "t", if_exists="append")
+    assert rows(db_path, "SELECT COUNT(*) FROM t") == [(4,)]
+    load_table(csv_path, db_path, "t", if_exists="replace")
+    assert rows(db_path, "SELECT COUNT(*) FROM t") == [(2,)]
+    with pytest.raises(ValueError):
+        load_table(csv_path, db_path, "t", if_exists="fail")
+    with pytest.raises(ValueError):
+        load_table(csv_path, db_path, "t", if_exists="upsert")
+    assert rows(db_path, "SELECT COUNT(*) FROM t") == [(2,)]
+
+
+def test_failed_load_is_rolled_back(tmp_path, monkeypatch):
+    csv_path = tmp_path / "t.csv"
+    pd.DataFrame({"id": [1, 2]}).to_csv(csv_path, index=False)
+    db_path = str(tmp_path / "db.sqlite")
+    load_table(csv_path, db_path, "t")
+
+    def fail(conn, table_name, columns):
+        raise sqlite3.OperationalError("disk full")
+
+    monkeypatch.setattr(bulk_loader, "create_indexes", fail)
+    with pytest.raises(sqlite3.OperationalError):
+        load_table(csv_path, db_path, "t", if_exists="append")
+    assert rows(db_path, "SELECT COUNT(*) FROM t") == [(2,)]
+
+
+def test_xlsx_is_loaded_from_its_first_sheet(tmp_path):
+    xlsx_path = tmp_path / "sales.xlsx"
+    pd.DataFrame({"Region ID": [1, 2, 3], "total": [1.5, 2.5, 3.5]}).to_excel(xlsx_path, index=False)
+    db_path = str(tmp_path / "db.sqlite")
+
+    assert load_table(xlsx_path, db_path, "sales", chunk_rows=2) == 3
+
+    assert rows(db_path, 'SELECT SUM("Region ID"), SUM(total) FROM sales') == [(6, 7.5)]
+    with pytest.raises(ValueError):
+        load_table(tmp_path / "notes.txt", db_path, "notes")
+
+
+def test_column_helpers():
+    assert key_columns(["id", "customer_id", "Order ID", "identity", "valid"]) == ["id", "customer_id", "Order ID"]
+    assert sqlite_type(pd.Series([None, None], dtype=float)) == "TEXT"
+    assert sqlite_type(pd.Series([True, False])) == "INTEGER"
@@ -0,0 +1,130 @@
+import sqlite3
+
+from index_advisor import (
+    QueryIndexAdvisor,
+    advise_after_load,
+    indexed_columns,
+    predicate_columns,
+    query_plan,
+    recommend_indexes,
+    table_aliases,
+)
+
+
+def add_customers(db_path, num_rows):
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE customers (customer_id INTEGER, signup TEXT, notes TEXT)")
+        conn.executemany("INSERT INTO customers VALUES (?, ?, ?)",
+                         [(i, f"2024-01-{i % 28 + 1:02d}", None) for i in range(num_rows)])
+
+
+def test_profiling_picks_keys_dates_and_categories(orders_db):
+    add_customers(orders_db, 12_000)
+    with sqlite3.connect(orders_db) as conn:
+        advice = recommend_indexes(conn)
+
+    assert [(item.table, item.column, item.reason) for item in advice] == [
+        ("orders", "order_id", "key column"),
+        ("orders", "customer_id", "key column"),
+        ("orders", "category", "category column (3 values)"),
+        ("customers", "customer_id", "key column"),
+        ("customers", "signup", "date column"),
+    ]
+
+
+def test_small_tables_and_indexed_columns_are_skipped(orders_db):
+    add_customers(orders_db, 50)
+    with sqlite3.connect(orders_db) as conn:
+        conn.execute("CREATE INDEX ix_orders_customer ON orders (customer_id)")
+        advice = recommend_indexes(conn)
+
+    assert [(item.table, item.column) for item in advice] == [("orders", "order_id"), ("orders", "category")]
+
+
+def test_advise_after_load_indexes_and_analyzes_the_loaded_tables(orders_db):
+    add_customers(orders_db, 12_000)
+
+    created = advise_after_load(orders_db, tables=["orders"])
+
+    assert [item.column for item in created] == ["order_id", "customer_id", "category"]
+    with sqlite3.connect(orders_db) as conn:
+        assert indexed_columns(conn, "orders") == {"order_id", "customer_id", "category"}
+        assert indexed_columns(conn, "customers") == set()
+        assert [row[0] for row in conn.execute("SELECT DISTINCT tbl FROM sqlite_stat1")] == ["orders"]
+
+
+def test_predicates_and_aliases_are_parsed_outside_string_literals():
+    statement = ("SELECT o.amount FROM orders AS o JOIN customers c ON o.customer_id = c.customer_id "
+                 "WHERE o.category = 'amount > 3' AND \"signup\" >= '2024-01-01'")
+
+    assert set(predicate_columns(statement)) == {("o", "customer_id"), ("c", "customer_id"), ("o", "category"),
+                                                 (None, "signup")}
+    assert table_aliases(statement) == {"orders": "orders", "o": "orders", "customers": "customers", "c": "customers"}
+
+
+def test_recurring_scanned_predicates_get_an_index(orders_db):
+    advisor = QueryIndexAdvisor(orders_db, min_count=3)
+    recurring = "SELECT SUM(amount) FROM orders WHERE customer_id = 7"
+    once = "SELECT COUNT(*) FROM orders WHERE category = 'toys'"
+    for _ in range(3):
+        advisor.observe(recurring)
+    advisor.observe(once)
+    advisor.observe("SELECT * FROM missing_table WHERE x = 1")
+
+    created = advisor.apply()
+
+    assert [(item.table, item.column) for item in created] == [("orders", "customer_id")]
+    with sqlite3.connect(orders_db) as conn:
+        assert any("USING INDEX" in line for line in query_plan(conn, recurring))
+        assert indexed_columns(conn, "orders") == {"customer_id"}
+    assert advisor.apply() == []
+
+
+def test_background_runs_wait_for_new_candidates(orders_db):
+    advisor = QueryIndexAdvisor(orders_db, min_count=3)
+    statement = "SELECT SUM(amount) FROM orders WHERE customer_id = 7"
+    for _ in range(2):
+        advisor.observe(statement)
+    assert not advisor.has_candidates()
+
+    advisor.observe(statement)
+    assert advisor.has_candidates()
+    advisor.apply()
+    assert not advisor.has_candidates()
+
+    for _ in range(2):
+        advisor.observe("SELECT * FROM orders WHERE customer_id = 8")
+    assert not advisor.has_candidates()
+    advisor.observe("SELECT * FROM orders WHERE customer_id = 9")
+    assert advisor.has_candidates()
+
+
+def test_one_background_worker_per_advisor(orders_db, monkeypatch):
+    import threading
+
+    advisor = QueryIndexAdvisor(orders_db, min_count=1)
+    advisor.observe("SELECT * FROM orders WHERE category = 'toys'")
+    release, runs = threading.Event(), []
+    monkeypatch.setattr(advisor, "apply", lambda: runs.append(release.wait(5)))
+
+    assert advisor.apply_in_background() is True
+    assert advisor.apply_in_background() is False
+    release.set()
+    advisor._worker.join()
+
+    assert runs == [True]
+
+
+def test_background_failures_are_logged(orders_db, monkeypatch, caplog):
+    advisor = QueryIndexAdvisor(orders_db, min_count=1)
+    advisor.observe("SELECT * FROM orders WHERE category = 'toys'")
+
+    def fail():
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(advisor, "apply", fail)
+    with caplog.at_level("ERROR", logger="index_advisor"):
+        advisor.apply_in_background()
+        advisor._worker.join()
+
+    assert "Index advisor failed" in caplog.text and "database is locked" in caplog.text
@@ -0,0 +1,176 @@
+import sqlite3
+import threading
+
+import pandas as pd
+import pytest
+
+import parallel_loader
+from parallel_loader import ingest_files
+
+
+def write_csv(path, num_rows, offset=0):
+    pd.DataFrame({"order_id": range(offset, offset + num_rows), "amount": [i * 0.5 for i in range(num_rows)]}).to_csv(path, index=False)
+    return str(path)
+
+
+def collect(events, timeout=30):
+    """Consume an ingest_files generator on a thread, failing the test if it hangs."""
+    result = {}
+
+    def run():
+        try:
+            result["events"] = list(events)
+        except BaseException as e:
+            result["error"] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "ingest_files hung"
+    if "error" in result:
+        raise result["error"]
+    return result["events"]
+
+
+class FailingBeginConnection:
+    """sqlite3 connection whose nth BEGIN fails, as when another process holds the lock."""
+
+    def __init__(self, conn, fail_on):
+        self._conn = conn
+        self._fail_on = fail_on
+        self._begins = 0
+
+    def execute(self, sql, *args):
+        if sql.startswith("BEGIN"):
+            self._begins += 1
+            if self._begins == self._fail_on:
+                raise sqlite3.OperationalError("database is locked")
+        return self._conn.execute(sql, *args)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def table_rows(db_path, table_name):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute(f'SELECT COUNT(*) FROM "{table_name}"').fetchone()[0]
+
+
+def test_loads_csv_parts_in_order(tmp_path):
+    csv_path = write_csv(tmp_path / "orders.csv", 5000)
+    db_path = str(tmp_path / "db.sqlite")
+
+    events = collect(ingest_files([(csv_path, "orders")], db_path, max_workers=1, part_bytes=4096))
+
+    assert [(event.table_name, event.rows, event.error) for event in events] == [("orders", 5000, None)]
+    with sqlite3.connect(db_path) as conn:
+        assert [row[0] for row in conn.execute("SELECT order_id FROM orders ORDER BY rowid")] == list(range(5000))
+
+
+def test_failed_begin_fails_only_that_file(tmp_path, monkeypatch):
+    files = [(write_csv(tmp_path / f"t{i}.csv", 100), f"t{i}") for i in range(3)]
+    db_path = str(tmp_path / "db.sqlite")
+    connect = parallel_loader.connect_for_bulk_load
+    monkeypatch.setattr(parallel_loader, "connect_for_bulk_load",
+                        lambda *args, **kwargs: FailingBeginConnection(connect(*args, **kwargs), fail_on=2))
+
+    events = collect(ingest_files(files, db_path, max_workers=1))
+
+    assert [event.rows for event in events] == [100, 0, 100]
+    assert isinstance(events[1].error, sqlite3.OperationalError)
+    assert table_rows(db_path, "t0") == table_rows(db_path, "t2") == 100
+
+
+def test_dead_writer_raises_instead_of_hanging(tmp_path, monkeypatch):
+    files = [(write_csv(tmp_path / f"t{i}.csv", 10), f"t{i}") for i in range(6)]
+
+    def broken_progress(*args):
+        raise MemoryError("writer thread crashed")
+
+    monkeypatch.setattr(parallel_loader, "IngestProgress", broken_progress)
+    monkeypatch.setattr(parallel_loader, "WRITER_POLL_SECONDS", 0.05)
+    monkeypatch.setattr(threading, "excepthook", lambda args: None)
+
+    with pytest.raises(RuntimeError, match="writer thread"):
+        collect(ingest_files(files, str(tmp_path / "db.sqlite"), max_workers=1))
+
+
+def test_failed_file_is_rolled_back_and_others_load(tmp_path):
+    good = write_csv(tmp_path / "good.csv", 50)
+    bad = tmp_path / "bad.csv"
+    bad.write_text("a,b\n1,2\n")
+    db_path = str(tmp_path / "db.sqlite")
+    collect(ingest_files([(bad, "taken")], db_path, max_workers=1))
+
+    events = collect(ingest_files([(bad, "taken"), (good, "good")], db_path, if_exists="fail", max_workers=1))
+
+    assert isinstance(events[0].error, ValueError)
+    assert events[1].rows == 50 and events[1].error is None
+    assert table_rows(db_path, "taken") == 1
+
+
+def test_xlsx_is_streamed_in_chunks_by_the_writer(tmp_path, monkeypatch):
+    xlsx_path = tmp_path / "orders.xlsx"
+    pd.DataFrame({"order_id": range(250), "category": ["books", "toys"] * 125}).to_excel(xlsx_path, index=False)
+    chunk_sizes = []
+    excel_chunks = parallel_loader.excel_chunks
+
+    def recording_chunks(file_path, chunk_rows):
+        for chunk in excel_chunks(file_path, chunk_rows):
+            chunk_sizes.append(len(chunk))
+            yield chunk
+
+    monkeypatch.setattr(parallel_loader, "CHUNK_ROWS", 100)
+    monkeypatch.setattr(parallel_loader, "excel_chunks", recording_chunks)
+    db_path = str(tmp_path / "db.sqlite")
+
+    events = collect(ingest_files([(xlsx_path, "orders")], db_path, max_workers=2))
+
+    assert events[0].rows == 250 and events[0].error is None
+    assert chunk_sizes == [100, 100, 50]
+    assert table_rows(db_path, "orders") == 250
+
+
+def test_parts_parsed_on_the_process_pool_load_in_order(tmp_path):
+    files = [(write_csv(tmp_path / f"t{i}.csv", 3000, offset=i * 3000), f"t{i}") for i in range(2)]
+    db_path = str(tmp_path / "db.sqlite")
+
+    events = collect(ingest_files(files, db_path, max_workers=2, part_bytes=8192), timeout=120)
+
+    assert [(event.table_name, event.rows, event.error) for event in events] == [("t0", 3000, None), ("t1", 3000, None)]
+    with sqlite3.connect(db_path) as conn:
+        assert [row[0] for row in conn.execute("SELECT order_id FROM t1 ORDER BY rowid")] == list(range(3000, 6000))
+        assert conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 't0'").fetchall() == [
+            ("ix_t0_order_id",)]
+
+
+def test_unreadable_files_are_reported_without_stopping_the_others(tmp_path):
+    good = write_csv(tmp_path / "good.csv", 20)
+    notes = tmp_path / "notes.txt"
+    notes.write_text("not a table")
+    db_path = str(tmp_path / "db.sqlite")
+
+    events = collect(ingest_files([(notes, "notes"), (tmp_path / "missing.csv", "missing"), (good, "good")],
+                                  db_path, max_workers=1))
+
+    assert [(event.table_name, event.rows) for event in events] == [("notes", 0), ("missing", 0), ("good", 20)]
+    assert isinstance(events[0].error, ValueError)
+    assert isinstance(events[1].error, FileNotFoundError)
+    assert events[2].error is None
+    with pytest.raises(ValueError):
+        next(ingest_files([(good, "good")], db_path, if_exists="merge"))
+
+
+def test_stopping_early_loads_no_further_files(tmp_path):
+    files = [(write_csv(tmp_path / f"t{i}.csv", 100), f"t{i}") for i in range(3)]
+    db_path = str(tmp_path / "db.sqlite")
+
+    events = ingest_files(files, db_path, max_workers=1)
+    first = next(events)
+    events.close()
+
+    assert first.table_name == "t0" and first.error is None
+    with sqlite3.connect(db_path) as conn:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert "t0" in tables
+    assert "t2" not in tables
@@ -0,0 +1,86 @@
+import pytest
+from sqlalchemy import event
+
+from query_cache import LRUCache, SQL_QUESTION_CACHE, is_cacheable, normalize_question, normalize_sql
+from sql_session import SQLSessionRegistry
+
+QUERY = "SELECT COUNT(*) FROM orders WHERE customer_id = 7"
+QUESTION = "How many orders has customer 7 placed?"
+
+
+def test_normalize_sql_keeps_literals():
+    assert normalize_sql("  SELECT  Name\n FROM \"Users\" WHERE city = 'New  York' ;") == \
+        "select name from \"Users\" where city = 'New  York'"
+
+
+@pytest.mark.parametrize("sql, cacheable", [
+    ("SELECT * FROM orders", True),
+    ("WITH t AS (SELECT 1) SELECT * FROM t", True),
+    ("SELECT * FROM logs WHERE message = 'delete me'", True),
+    ("SELECT random()", False),
+    ("SELECT * FROM orders WHERE placed > date('now')", False),
+    ("SELECT current_timestamp", False),
+    ("DELETE FROM orders", False),
+    ("PRAGMA table_info(orders)", False),
+    ("SELECT 1; DROP TABLE orders", False),
+])
+def test_is_cacheable(sql, cacheable):
+    assert is_cacheable(normalize_sql(sql)) is cacheable
+
+
+def test_normalize_question():
+    assert normalize_question("  How many   ORDERS?? ") == normalize_question("how many orders") == "how many orders"
+
+
+def test_lru_cache_evicts_least_recently_used_by_size():
+    cache = LRUCache(max_size=16, sizeof=len)
+    cache.put(("a.db", 1), "xx")
+    cache.put(("a.db", 2), "xx")
+    cache.get(("a.db", 1))
+    for key in range(3, 10):
+        cache.put(("b.db", key), "yy")
+
+    assert cache.get(("a.db", 1)) == "xx"
+    assert cache.get(("a.db", 2)) is None
+    assert (cache.size, cache.evictions) == (16, 1)
+
+    cache.invalidate("b.db")
+    assert len(cache) == 1 and cache.size == 2
+
+
+def test_lru_cache_skips_values_over_an_eighth_of_its_size():
+    cache = LRUCache(max_size=16, sizeof=len)
+    cache.put(("a.db", 1), "xx")
+    cache.put(("a.db", 2), "xxx")
+
+    assert cache.get(("a.db", 1)) == "xx"
+    assert cache.get(("a.db", 2)) is None
+    assert len(cache) == 1
+
+
+def test_repeated_reads_are_served_from_the_result_cache(orders_db, sql_agent_llm):
+    session = SQLSessionRegistry().get(orders_db, sql_agent_llm(QUERY, "200"))
+    executed = []
+    event.listen(session.engine, "before_cursor_execute", lambda *args: executed.append(args[2]))
+
+    first = session.db.run(QUERY)
+    second = session.db.run("select count(*)  from orders where customer_id = 7;")
+    session.db.run("SELECT random()")
+    session.db.run("SELECT random()")
+
+    assert first == second == "[(200,)]"
+    assert executed.count(QUERY) == 1
+    assert len([statement for statement in executed if "random" in statement]) == 2
+
+
+def test_repeated_questions_skip_the_agent(orders_db, sql_agent_llm):
+    llm = sql_agent_llm(QUERY, "Customer 7 placed 200 orders.")
+    session = SQLSessionRegistry().get(orders_db, llm)
+
+    session.ask(QUESTION)
+    calls = llm.calls
+    answer = session.ask("  how many ORDERS has customer 7 placed ")
+
+    assert answer == "Customer 7 placed 200 orders."
+    assert llm.calls == calls + 1
+    assert SQL_QUESTION_CACHE.get((session.db_path, session.version, normalize_question(QUESTION))) == QUERY
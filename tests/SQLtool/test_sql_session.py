@@ -0,0 +1,77 @@
+import sqlite3
+
+from query_cache import SQL_QUESTION_CACHE, file_signature
+from sql_session import SQLSessionRegistry
+
+QUERY = "SELECT COUNT(*) FROM orders WHERE customer_id = 7"
+QUESTION = "How many orders has customer 7 placed?"
+
+
+def test_index_advisor_writes_keep_the_session_and_its_caches(orders_db, sql_agent_llm):
+    registry = SQLSessionRegistry()
+    llm = sql_agent_llm(QUERY, "Customer 7 placed 200 orders.")
+    session = registry.get(orders_db, llm)
+    assert session.ask(QUESTION) == "Customer 7 placed 200 orders."
+    for _ in range(3):
+        session.index_advisor.observe(QUERY)
+    signature = file_signature(orders_db)
+
+    created = session.index_advisor.apply()
+
+    assert [(advice.table, advice.column) for advice in created] == [("orders", "customer_id")]
+    assert file_signature(orders_db) != signature
+    assert registry.get(orders_db, llm) is session
+    assert SQL_QUESTION_CACHE.get((session.db_path, session.version, "how many orders has customer 7 placed")) == QUERY
+    calls = llm.calls
+    assert session.ask(QUESTION) == "Customer 7 placed 200 orders."
+    # Answered from the question cache: one call to phrase the answer, no agent round trips
+    assert llm.calls == calls + 1
+
+
+def test_other_writes_rebuild_the_session(orders_db, sql_agent_llm):
+    registry = SQLSessionRegistry()
+    llm = sql_agent_llm(QUERY, "Customer 7 placed 200 orders.")
+    session = registry.get(orders_db, llm)
+    session.index_advisor.observe(QUERY)
+    session.index_advisor.apply()
+
+    with sqlite3.connect(orders_db) as conn:
+        conn.execute("INSERT INTO orders VALUES (20000, 7, 'books', 1.0)")
+
+    rebuilt = registry.get(orders_db, llm)
+    assert rebuilt is not session
+    assert rebuilt.version == file_signature(orders_db)
+
+
+def test_sessions_are_reused_per_file_and_built_once(orders_db, sql_agent_llm, monkeypatch):
+    import os
+    import threading
+
+    import sql_session
+
+    builds = []
+
+    class CountingSession(sql_session.SQLSession):
+        def __init__(self, *args, **kwargs):
+            builds.append(args[0])
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(sql_session, "SQLSession", CountingSession)
+    registry = SQLSessionRegistry()
+    llm = sql_agent_llm(QUERY, "Customer 7 placed 200 orders.")
+    sessions = []
+    threads = [threading.Thread(target=lambda: sessions.append(registry.get(orders_db, llm))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(builds) == 1 and len({id(session) for session in sessions}) == 1
+    assert registry.get(os.path.relpath(orders_db), llm) is sessions[0]
+    assert sessions[0].table_names == ["orders"]
+    assert "CREATE TABLE orders" in sessions[0].table_info["orders"]
+
+    registry.invalidate(orders_db)
+    assert registry.get(orders_db, llm) is not sessions[0]
+    assert len(builds) == 2
+